@@ -0,0 +1,66 @@
+"""
+Synthetic Cloud Run project used by the fake gcloud, fake cloud endpoint and benchmarks.
+"""
+from typing import Any, Dict, List
+
+PROJECT = "bench-project"
+REGION_POOL = [
+    "us-central1", "us-east1", "us-east4", "us-west1", "us-west2", "europe-west1", "europe-west2",
+    "europe-west3", "europe-west4", "europe-north1", "asia-east1", "asia-northeast1", "asia-south1",
+    "asia-southeast1", "australia-southeast1", "southamerica-east1", "northamerica-northeast1",
+    "me-west1", "africa-south1", "us-south1",
+]
+
+
+def regions(count: int) -> List[str]:
+    pool = list(REGION_POOL)
+    i = 0
+    while len(pool) < count:
+        pool.append(f"bench-region{i}")
+        i += 1
+    return pool[:count]
+
+
+def build(services: int = 10, region_count: int = 4, secrets: int = 5, sql_instances: int = 1) -> Dict[str, Any]:
+    """
+    Builds a project with `services` services spread round-robin over `region_count` regions.
+    Every service references `secrets` secrets and `sql_instances` Cloud SQL instances.
+    """
+    region_list = regions(region_count)
+    data: Dict[str, Any] = {"project": PROJECT, "regions": region_list, "services": {}, "secrets": {}, "images": {}}
+
+    for s in range(secrets):
+        data["secrets"][f"secret-{s}"] = f"value-{s}-" + "x" * 32
+
+    instances = [f"{PROJECT}:{region_list[0]}:db-{i}" for i in range(sql_instances)]
+    for i in range(services):
+        name = f"svc-{i}"
+        region = region_list[i % len(region_list)]
+        image = f"{region}-docker.pkg.dev/{PROJECT}/apps/{name}:release"
+        data["images"][image] = {"org.opencontainers.image.revision": f"{i:07x}abcdef"}
+        env = [{"name": f"PLAIN_{k}", "value": str(k)} for k in range(5)]
+        env += [
+            {"name": f"SECRET_{s}", "valueFrom": {"secretKeyRef": {"name": f"secret-{s}", "key": "latest"}}}
+            for s in range(secrets)
+        ]
+        data["services"][name] = {
+            "apiVersion": "serving.knative.dev/v1",
+            "kind": "Service",
+            "metadata": {
+                "name": name,
+                "namespace": PROJECT,
+                "resourceVersion": f"rv-{i}-1",
+                "labels": {"cloud.googleapis.com/location": region},
+                "annotations": {"run.googleapis.com/cloudsql-instances": ",".join(instances)} if instances else {},
+            },
+            "spec": {"template": {"spec": {"containers": [{"image": image, "env": env, "ports": [{"containerPort": 8080}]}]}}},
+            "status": {"latestReadyRevisionName": f"{name}-00001-abc"},
+        }
+    return data
+
+
+def services_in(data: Dict[str, Any], region: str = "") -> List[Dict[str, Any]]:
+    return [
+        svc for svc in data["services"].values()
+        if not region or svc["metadata"]["labels"]["cloud.googleapis.com/location"] == region
+    ]
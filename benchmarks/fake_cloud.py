@@ -0,0 +1,151 @@
+"""
+Local stand-in for the Cloud Run Admin API, the container registry and Secret Manager (REST).
+Point ground-control at it with AG_RUN_API_ENDPOINT and AG_SECRET_MANAGER_ENDPOINT.
+"""
+from typing import Any, Dict, Optional
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import base64
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+
+from . import dataset
+
+ROUTES = [
+    ("locations", re.compile(r"^/v1/projects/[^/]+/locations$")),
+    ("services", re.compile(r"^(?:/regions/(?P<region>[^/]+))?/apis/serving\.knative\.dev/v1/namespaces/[^/]+/services$")),
+    ("service", re.compile(r"^/regions/(?P<region>[^/]+)/apis/serving\.knative\.dev/v1/namespaces/[^/]+/services/(?P<name>[^/]+)$")),
+    ("revision", re.compile(r"^/regions/(?P<region>[^/]+)/apis/serving\.knative\.dev/v1/namespaces/[^/]+/revisions/(?P<name>[^/]+)$")),
+    ("manifest", re.compile(r"^/registry/(?P<image>.+)/manifests/(?P<ref>[^/]+)$")),
+    ("blob", re.compile(r"^/registry/(?P<image>.+)/blobs/(?P<digest>[^/]+)$")),
+    ("secret", re.compile(r"^/v1/projects/[^/]+/secrets/(?P<secret>[^/]+)/versions/(?P<version>[^/:]+):access$")),
+]
+
+
+class FakeCloud:
+    """
+    Threaded HTTP server with configurable per-request latency (plus jitter) and failure rate.
+    Failures are answered with HTTP 503.
+    """
+
+    def __init__(self, data: Dict[str, Any], latency: float = 0.02, jitter: float = 0.005, failure_rate: float = 0.0, seed: Optional[int] = None):
+        self.data = data
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self) -> "FakeCloud":
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                status, body = fake.dispatch(self.path.split("?", 1)[0])
+                # Objects with a resourceVersion carry it as their ETag, and honour If-None-Match
+                version = body.get("metadata", {}).get("resourceVersion") if status == 200 else None
+                etag = f'"{version}"' if version else None
+                if etag and self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                if etag:
+                    self.send_header("ETag", etag)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        class Server(ThreadingHTTPServer):
+            # The default backlog of 5 drops SYNs under concurrent fetches, adding 1s retransmits
+            request_queue_size = 128
+
+        self._server = Server(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def dispatch(self, path: str):
+        with self._lock:
+            self.requests += 1
+            delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+            fail = self.random.random() < self.failure_rate
+        time.sleep(delay)
+        if fail:
+            return 503, {"error": {"code": 503, "message": "injected failure"}}
+
+        for route, pattern in ROUTES:
+            match = pattern.match(path)
+            if match:
+                return getattr(self, f"_{route}")(**match.groupdict())
+        return 404, {"error": {"code": 404, "message": f"no route for {path}"}}
+
+    def _locations(self):
+        return 200, {"locations": [{"locationId": r} for r in self.data["regions"]]}
+
+    def _services(self, region: Optional[str] = None):
+        return 200, {"items": dataset.services_in(self.data, region or "")}
+
+    def _service(self, region: str, name: str):
+        svc = self.data["services"].get(name)
+        if not svc or svc["metadata"]["labels"]["cloud.googleapis.com/location"] != region:
+            return 404, {"error": {"code": 404, "message": "not found"}}
+        return 200, svc
+
+    def _revision(self, region: str, name: str):
+        for svc in dataset.services_in(self.data, region):
+            if svc["status"]["latestReadyRevisionName"] == name:
+                image = svc["spec"]["template"]["spec"]["containers"][0]["image"]
+                digest = "sha256:" + hashlib.sha256(image.encode("utf-8")).hexdigest()
+                return 200, {"metadata": {"name": name}, "status": {"imageDigest": f"{image.rsplit(':', 1)[0]}@{digest}"}}
+        return 404, {"error": {"code": 404, "message": "not found"}}
+
+    def _image_key(self, image: str) -> Optional[str]:
+        host, _, path = image.partition("/v2/")
+        for key in self.data["images"]:
+            if key.startswith(f"{host}/{path}:") or key.startswith(f"{host}/{path}@"):
+                return key
+        return None
+
+    def _manifest(self, image: str, ref: str):
+        key = self._image_key(image)
+        if not key:
+            return 404, {"errors": [{"code": "MANIFEST_UNKNOWN"}]}
+        digest = "sha256:" + hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return 200, {"schemaVersion": 2, "config": {"digest": digest}}
+
+    def _blob(self, image: str, digest: str):
+        key = self._image_key(image)
+        if not key:
+            return 404, {"errors": [{"code": "BLOB_UNKNOWN"}]}
+        return 200, {"config": {"Labels": self.data["images"][key]}}
+
+    def _secret(self, secret: str, version: str):
+        value = self.data["secrets"].get(secret)
+        if value is None:
+            return 404, {"error": {"code": 404, "message": "secret not found"}}
+        return 200, {"payload": {"data": base64.b64encode(value.encode("utf-8")).decode("ascii")}}
@@ -0,0 +1,338 @@
+"""
+Hermetic latency benchmarks for the pull path.
+
+Puts fake `gcloud` and `cloud-sql-proxy` executables on PATH, starts a local fake Cloud Run /
+registry / Secret Manager endpoint, and times `ag pull` plus the individual GCPProvider,
+SecretManager and ProxyManager operations over a grid of sizes. Runs fully offline.
+
+    python -m benchmarks.run                     # small grid, compare with baselines
+    python -m benchmarks.run --grid full
+    python -m benchmarks.run --update-baselines  # record the current numbers
+
+Exits with status 1 when a scenario's p95 regresses past its stored baseline.
+"""
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import argparse
+import itertools
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from rich.console import Console
+from rich.markup import escape
+from rich.table import Table
+
+from . import dataset
+from .fake_cloud import FakeCloud
+
+console = Console()
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FAKES_DIR = os.path.join(ROOT, "benchmarks", "fakes")
+BASELINES_PATH = os.path.join(ROOT, "benchmarks", "baselines.json")
+
+GRIDS = {
+    "small": {"regions": [1, 8], "services": [10], "secrets": [5, 30], "sql": [1, 3]},
+    "full": {"regions": [1, 8, 32], "services": [10, 100], "secrets": [5, 30, 60], "sql": [1, 3, 6]},
+}
+
+
+# --- Environment ---
+
+class Environment:
+    """
+    Owns the fakes for one dataset: a data file for fake gcloud, the fake HTTP endpoint,
+    and the environment variables that point ground-control at them.
+    """
+
+    def __init__(self, data: Dict[str, Any], args: argparse.Namespace):
+        self.data = data
+        self.args = args
+        self.tmp = tempfile.mkdtemp(prefix="ag-bench-")
+        self.data_path = os.path.join(self.tmp, "dataset.json")
+        with open(self.data_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        self.cloud = FakeCloud(data, latency=args.api_latency, failure_rate=args.failure_rate, seed=0).start()
+        self.env = {
+            "PATH": FAKES_DIR + os.pathsep + os.environ.get("PATH", ""),
+            "FAKE_GCLOUD_DATA": self.data_path,
+            "FAKE_GCLOUD_LATENCY": str(args.gcloud_latency),
+            "FAKE_GCLOUD_FAILURE_RATE": str(args.failure_rate),
+            "FAKE_PROXY_LATENCY": str(args.proxy_latency),
+            "FAKE_PROXY_FAILURE_RATE": str(args.failure_rate),
+            "AG_RUN_API_ENDPOINT": self.cloud.url,
+            "AG_SECRET_MANAGER_ENDPOINT": self.cloud.url,
+            "AG_CACHE_DIR": os.path.join(self.tmp, "cache"),
+            "XDG_RUNTIME_DIR": os.path.join(self.tmp, "run"),
+            # Keep the developer's real credentials out of reach: with ADC present, the auth check
+            # would otherwise refresh a token against Google. Neither path exists, so ADC is
+            # unavailable and the fake gcloud answers.
+            "CLOUDSDK_CONFIG": os.path.join(self.tmp, "gcloud"),
+            "GOOGLE_APPLICATION_CREDENTIALS": os.path.join(self.tmp, "gcloud", "application_default_credentials.json"),
+            "SHELL": "/bin/true",
+            "PYTHONPATH": ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""),
+        }
+        self._saved: Dict[str, Optional[str]] = {}
+
+    def __enter__(self) -> "Environment":
+        for key, value in self.env.items():
+            self._saved[key] = os.environ.get(key)
+            os.environ[key] = value
+        return self
+
+    def __exit__(self, *exc) -> None:
+        for key, value in self._saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        self.cloud.stop()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def fresh_cache(self) -> None:
+        shutil.rmtree(self.env["AG_CACHE_DIR"], ignore_errors=True)
+
+
+# --- Scenarios ---
+# Each scenario takes the environment and grid point and returns a zero-argument callable to time
+# (setup happens outside the timed call).
+
+def scenario_discovery(backend: str):
+    def make(env: Environment, point: Dict[str, int]) -> Callable[[], Any]:
+        from ground_control.providers.gcp import create_provider
+        from ground_control.providers.discovery import ServiceDiscovery
+        provider = create_provider(dataset.PROJECT, backend, cache=False)
+        return lambda: ServiceDiscovery(provider, concurrency=8).all_services()
+    return make
+
+
+def scenario_find(env: Environment, point: Dict[str, int]) -> Callable[[], Any]:
+    from ground_control.providers.gcp import create_provider
+    from ground_control.providers.discovery import ServiceDiscovery
+    provider = create_provider(dataset.PROJECT, "api", cache=False)
+    return lambda: ServiceDiscovery(provider, concurrency=8).find("svc-0")
+
+
+def scenario_describe(backend: str):
+    def make(env: Environment, point: Dict[str, int]) -> Callable[[], Any]:
+        from ground_control.providers.gcp import create_provider
+        provider = create_provider(dataset.PROJECT, backend, cache=False)
+        region = env.data["regions"][0]
+        return lambda: provider.extract_metadata(provider.get_service_details("svc-0", region))
+    return make
+
+
+def scenario_commit(backend: str):
+    def make(env: Environment, point: Dict[str, int]) -> Callable[[], Any]:
+        from ground_control.providers.gcp import create_provider
+        provider = create_provider(dataset.PROJECT, backend, cache=False)
+        image = env.data["services"]["svc-0"]["spec"]["template"]["spec"]["containers"][0]["image"]
+        return lambda: provider.get_commit_sha(image)
+    return make
+
+
+def scenario_secrets(env: Environment, point: Dict[str, int]) -> Callable[[], Any]:
+    from ground_control.connectivity import SecretManager
+    secrets_map = {f"SECRET_{s}": {"secret": f"secret-{s}", "version": "latest"} for s in range(point["secrets"])}
+    return lambda: SecretManager(dataset.PROJECT).fetch_many(secrets_map)
+
+
+def scenario_proxies(env: Environment, point: Dict[str, int]) -> Callable[[], Any]:
+    from ground_control.connectivity import ProxyManager
+    from ground_control.ports import PortAllocator
+    instances = [f"{dataset.PROJECT}:r:db-{i}" for i in range(point["sql"])]
+
+    def run():
+        manager = ProxyManager(allocator=PortAllocator(persist=False))
+        try:
+            ports = manager.start_cloud_sql_proxy(instances, port_start=41000)
+            assert len(ports) == len(instances), ports
+        finally:
+            manager.stop()
+    return run
+
+
+def scenario_pull(warm: bool):
+    def make(env: Environment, point: Dict[str, int]) -> Callable[[], Any]:
+        cmd = [sys.executable, "-m", "ground_control.cli", "pull", dataset.PROJECT, "--service", "svc-0"]
+        if warm:
+            subprocess.run(cmd, env=os.environ.copy(), capture_output=True)
+        else:
+            env.fresh_cache()
+
+        def run():
+            result = subprocess.run(cmd, env=os.environ.copy(), capture_output=True, text=True)
+            if result.returncode != 0:
+                raise RuntimeError(result.stdout[-2000:] + result.stderr[-2000:])
+        return run
+    return make
+
+
+# name -> (factory, grid dimensions it varies over)
+SCENARIOS: Dict[str, Tuple[Callable, List[str]]] = {
+    "discovery.api": (scenario_discovery("api"), ["regions", "services"]),
+    "discovery.gcloud": (scenario_discovery("gcloud"), ["regions", "services"]),
+    "find.api": (scenario_find, ["regions", "services"]),
+    "describe.api": (scenario_describe("api"), ["services"]),
+    "describe.gcloud": (scenario_describe("gcloud"), ["services"]),
+    "commit.api": (scenario_commit("api"), []),
+    "commit.gcloud": (scenario_commit("gcloud"), []),
+    "secrets.fetch_many": (scenario_secrets, ["secrets"]),
+    "proxies.start": (scenario_proxies, ["sql"]),
+    "pull.cold": (scenario_pull(warm=False), ["regions", "secrets", "sql"]),
+    "pull.warm": (scenario_pull(warm=True), ["regions", "secrets", "sql"]),
+}
+
+
+# --- Harness ---
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    if len(ordered) == 1:
+        return ordered[0]
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def grid_points(grid: Dict[str, List[int]], dims: List[str]) -> Iterator[Dict[str, int]]:
+    defaults = {name: values[0] for name, values in grid.items()}
+    for combo in itertools.product(*(grid[d] for d in dims)):
+        yield {**defaults, **dict(zip(dims, combo))}
+
+
+def result_key(name: str, point: Dict[str, int], dims: List[str]) -> str:
+    if not dims:
+        return name
+    return f"{name}[{','.join(f'{d}={point[d]}' for d in dims)}]"
+
+
+def measure(fn: Callable[[], Any], repeat: int, warmup: int = 1) -> List[float]:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def run_benchmarks(args: argparse.Namespace) -> Dict[str, Dict[str, float]]:
+    grid = GRIDS[args.grid]
+    results: Dict[str, Dict[str, float]] = {}
+    for name, (factory, dims) in SCENARIOS.items():
+        if args.only and not any(o in name for o in args.only):
+            continue
+        for point in grid_points(grid, dims):
+            key = result_key(name, point, dims)
+            data = dataset.build(services=point["services"], region_count=point["regions"], secrets=point["secrets"], sql_instances=point["sql"])
+            with Environment(data, args) as env:
+                try:
+                    fn = factory(env, point)
+                    samples = measure(fn, args.repeat, warmup=0 if name == "pull.cold" else 1)
+                except Exception as e:
+                    console.print(f"[red]x {escape(key)} failed: {escape(str(e))}[/red]")
+                    results[key] = {"error": str(e)}
+                    continue
+            results[key] = {
+                "p50": percentile(samples, 50),
+                "p95": percentile(samples, 95),
+                "mean": statistics.fmean(samples),
+                "n": len(samples),
+            }
+            console.print(f"[gray]  {escape(key)}: p50={results[key]['p50'] * 1000:.1f}ms p95={results[key]['p95'] * 1000:.1f}ms[/gray]")
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]], baselines: Dict[str, Dict[str, float]], tolerance: float, slack: float) -> List[str]:
+    """
+    Returns the keys whose p95 exceeds baseline * (1 + tolerance) + slack, or that failed outright.
+    """
+    regressions = []
+    for key, result in results.items():
+        if "error" in result:
+            regressions.append(key)
+            continue
+        base = baselines.get(key)
+        if base and result["p95"] > base["p95"] * (1 + tolerance) + slack:
+            regressions.append(key)
+    return regressions
+
+
+def print_report(results: Dict[str, Dict[str, float]], baselines: Dict[str, Dict[str, float]], regressions: List[str]) -> None:
+    table = Table(title="Pull-path latency", header_style="bold")
+    table.add_column("Scenario", no_wrap=True)
+    table.add_column("p50", justify="right", no_wrap=True)
+    table.add_column("p95", justify="right", no_wrap=True)
+    table.add_column("base p95", justify="right", no_wrap=True)
+    table.add_column("")
+    for key, result in results.items():
+        if "error" in result:
+            table.add_row(escape(key), "-", "-", "-", "[red]error[/red]")
+            continue
+        base = baselines.get(key)
+        verdict = "[red]REGRESSED[/red]" if key in regressions else ("[green]ok[/green]" if base else "[gray]new[/gray]")
+        table.add_row(
+            escape(key), f"{result['p50'] * 1000:.1f}ms", f"{result['p95'] * 1000:.1f}ms",
+            f"{base['p95'] * 1000:.1f}ms" if base else "-", verdict,
+        )
+    console.print(table)
+
+
+def load_baselines(path: str) -> Dict[str, Dict[str, float]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--grid", choices=sorted(GRIDS), default="small")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed samples per scenario and grid point.")
+    parser.add_argument("--only", action="append", help="Only run scenarios whose name contains this (repeatable).")
+    parser.add_argument("--api-latency", type=float, default=0.02, help="Fake endpoint latency per request (s).")
+    parser.add_argument("--gcloud-latency", type=float, default=0.15, help="Fake gcloud startup latency per call (s).")
+    parser.add_argument("--proxy-latency", type=float, default=0.1, help="Fake proxy startup latency (s).")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Injected failure rate for all fakes (0-1).")
+    parser.add_argument("--baselines", default=BASELINES_PATH)
+    parser.add_argument("--update-baselines", action="store_true", help="Write these results as the new baselines.")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed relative p95 increase over baseline.")
+    parser.add_argument("--slack", type=float, default=0.05, help="Allowed absolute p95 increase over baseline (s).")
+    parser.add_argument("--json", dest="json_path", help="Also write the raw results to this file.")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args)
+    baselines = load_baselines(args.baselines)
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.update_baselines:
+        merged = {**baselines, **{k: {"p50": round(v["p50"], 4), "p95": round(v["p95"], 4)} for k, v in results.items() if "error" not in v}}
+        with open(args.baselines, "w", encoding="utf-8") as f:
+            json.dump(merged, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print_report(results, merged, [])
+        console.print(f"[green]✓[/green] Baselines written to {args.baselines}")
+        return 0
+
+    regressions = compare(results, baselines, args.tolerance, args.slack)
+    print_report(results, baselines, regressions)
+    if regressions:
+        console.print(f"[red]{len(regressions)} scenario(s) regressed past baseline.[/red]")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+CLI startup-time budget.
+
+Times `ag --version` and a bare `import ground_control.cli` in fresh interpreters, and checks that
+the CLI module does not drag in the provider, connectivity, cloud-client or MCP modules at import
+time. Exits with status 1 when a budget is exceeded, so import-time growth is caught early.
+The same checks run under pytest (tests/test_startup.py).
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --version-budget 0.08 --import-budget 0.12
+"""
+from typing import List, Optional
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seconds on top of a bare interpreter
+VERSION_BUDGET = 0.1
+IMPORT_BUDGET = 0.15
+
+# Modules that only the commands that need them may import
+HEAVY_MODULES = [
+    "ground_control.providers.gcp",
+    "ground_control.providers.gcp_api",
+    "ground_control.providers.cached",
+    "ground_control.connectivity",
+    "ground_control.daemon",
+    "ground_control.mcp_server",
+    "ground_control.pipeline",
+    "ground_control.schema",
+    "google",
+    "mcp",
+    "psycopg",
+    "psycopg2",
+    "docker",
+    "keyring",
+    "rich.console",
+    "rich.live",
+]
+
+
+def timed(cmd: List[str], repeat: int) -> float:
+    """Median wall time of `cmd` over `repeat` runs (after one warm-up run)."""
+    env = {**os.environ, "PYTHONPATH": ROOT + os.pathsep + os.environ.get("PYTHONPATH", "")}
+    subprocess.run(cmd, env=env, capture_output=True, check=True)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(cmd, env=env, capture_output=True, check=True)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def loaded_heavy_modules() -> List[str]:
+    code = "import json, sys, ground_control.cli; print(json.dumps(sorted(sys.modules)))"
+    env = {**os.environ, "PYTHONPATH": ROOT + os.pathsep + os.environ.get("PYTHONPATH", "")}
+    result = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+    modules = set(json.loads(result.stdout))
+    return [m for m in HEAVY_MODULES if m in modules]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.startup", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=9)
+    parser.add_argument("--version-budget", type=float, default=VERSION_BUDGET, help="Max seconds for `ag --version`, on top of a bare interpreter.")
+    parser.add_argument("--import-budget", type=float, default=IMPORT_BUDGET, help="Max seconds for `import ground_control.cli`, on top of a bare interpreter.")
+    args = parser.parse_args(argv)
+
+    bare = timed([sys.executable, "-c", "pass"], args.repeat)
+    checks = [
+        ("ag --version", timed([sys.executable, "-m", "ground_control", "--version"], args.repeat) - bare, args.version_budget),
+        ("import ground_control.cli", timed([sys.executable, "-c", "import ground_control.cli"], args.repeat) - bare, args.import_budget),
+    ]
+
+    failed = False
+    print(f"bare interpreter: {bare * 1000:.1f}ms")
+    for name, elapsed, budget in checks:
+        verdict = "ok" if elapsed <= budget else "OVER BUDGET"
+        failed |= elapsed > budget
+        print(f"{name}: +{elapsed * 1000:.1f}ms (budget {budget * 1000:.0f}ms) {verdict}")
+
+    heavy = loaded_heavy_modules()
+    if heavy:
+        failed = True
+        print(f"ground_control.cli imports heavy modules at load time: {', '.join(heavy)}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
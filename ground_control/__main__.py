@@ -0,0 +1,19 @@
+"""
+Console entry point for `ag` (and `python -m ground_control`).
+
+`ag --version` is answered before typer (and with it click) is imported.
+"""
+import sys
+
+
+def main() -> None:
+    if sys.argv[1:] == ["--version"]:
+        from . import __version__
+        print(f"ground-control {__version__}")
+        return
+    from .cli import app
+    app(prog_name="ag")
+
+
+if __name__ == "__main__":
+    main()
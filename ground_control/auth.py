@@ -1,32 +1,152 @@
+import calendar
+import configparser
+import os
 import subprocess
 import shutil
-from rich.console import Console
+import time
+from typing import Any, Dict, Optional
 
-console = Console()
+from .cache import DiskCache
+from .profiling import profiled, run_subprocess
+from .console import console
 
-def check_gcloud_auth() -> bool:
+
+CLOUD_PLATFORM_SCOPE = "https://www.googleapis.com/auth/cloud-platform"
+# Re-check this long before the cached token would expire
+EXPIRY_MARGIN = 5 * 60
+# gcloud does not report token expiry, so its result is treated as a token with this lifetime
+FALLBACK_TTL = 10 * 60
+
+
+def gcloud_config_dir() -> str:
+    return os.environ.get("CLOUDSDK_CONFIG") or os.path.join(os.path.expanduser("~"), ".config", "gcloud")
+
+
+def _active_config_path() -> str:
+    config_dir = gcloud_config_dir()
+    name = os.environ.get("CLOUDSDK_ACTIVE_CONFIG_NAME")
+    if not name:
+        try:
+            with open(os.path.join(config_dir, "active_config"), "r", encoding="utf-8") as f:
+                name = f.read().strip()
+        except OSError:
+            name = ""
+    return os.path.join(config_dir, "configurations", f"config_{name or 'default'}")
+
+
+def configured_account() -> Optional[str]:
+    """Reads the active gcloud account straight from its config file, without running gcloud."""
+    if os.environ.get("CLOUDSDK_CORE_ACCOUNT"):
+        return os.environ["CLOUDSDK_CORE_ACCOUNT"]
+    parser = configparser.ConfigParser()
+    try:
+        parser.read(_active_config_path(), encoding="utf-8")
+    except configparser.Error:
+        return None
+    return parser.get("core", "account", fallback=None)
+
+
+def _credentials_fingerprint() -> str:
     """
-    Checks if gcloud is installed and authenticated.
+    Identifies the credential sources in play. Logging in, switching account or configuration,
+    or pointing GOOGLE_APPLICATION_CREDENTIALS elsewhere changes it and invalidates the cache.
     """
-    if not shutil.which("gcloud"):
-        console.print("[bold red]❌ Error:[/bold red] 'gcloud' CLI not found. Please install the Google Cloud SDK.")
-        return False
+    parts = []
+    for path in (
+        os.environ.get("GOOGLE_APPLICATION_CREDENTIALS"),
+        os.path.join(gcloud_config_dir(), "application_default_credentials.json"),
+        os.path.join(gcloud_config_dir(), "active_config"),
+        _active_config_path(),
+        os.path.join(gcloud_config_dir(), "credentials.db"),
+    ):
+        if not path:
+            continue
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            mtime = None
+        parts.append(f"{path}:{mtime}")
+    parts.append(os.environ.get("CLOUDSDK_CORE_ACCOUNT", ""))
+    return "|".join(parts)
+
 
+def _adc_status() -> Optional[Dict[str, Any]]:
+    """
+    Loads Application Default Credentials and refreshes them in-process.
+    Returns {"account", "expires_at", "source"}, or None when ADC is unavailable.
+    """
     try:
-        # Check if we have active credentials
-        result = subprocess.run(
-            ["gcloud", "auth", "list", "--filter=status:ACTIVE", "--format=value(account)"],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        account = result.stdout.strip()
-        if account:
-            console.print(f"[bold green]✓[/bold green] Authenticated as: [cyan]{account}[/cyan]")
+        import google.auth
+        from google.auth.exceptions import GoogleAuthError
+        from google.auth.transport.requests import Request
+    except ImportError:
+        return None
+
+    try:
+        credentials, _ = google.auth.default(scopes=[CLOUD_PLATFORM_SCOPE])
+        credentials.refresh(Request())
+    except (GoogleAuthError, OSError, ValueError):
+        return None
+
+    account = getattr(credentials, "service_account_email", None)
+    if not account or account == "default":
+        account = configured_account() or "application default credentials"
+    expiry = getattr(credentials, "expiry", None)
+    # google-auth reports expiry as a naive UTC datetime
+    expires_at = calendar.timegm(expiry.utctimetuple()) if expiry else None
+    return {"account": account, "expires_at": expires_at, "source": "adc"}
+
+
+def _gcloud_status() -> Optional[Dict[str, Any]]:
+    """Asks the gcloud CLI for the active account. Returns None if there is none."""
+    result = run_subprocess(
+        ["gcloud", "auth", "list", "--filter=status:ACTIVE", "--format=value(account)"],
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    account = result.stdout.strip()
+    if not account:
+        return None
+    return {"account": account, "expires_at": time.time() + FALLBACK_TTL, "source": "gcloud"}
+
+
+@profiled()
+def check_gcloud_auth(refresh: bool = False, require_gcloud: bool = False) -> bool:
+    """
+    Checks that Google Cloud credentials are available.
+
+    Application Default Credentials are tried in-process first; the gcloud CLI is only a fallback.
+    With `require_gcloud` (the gcloud backend), only an installed, logged-in gcloud CLI passes.
+    The active account and token expiry (never the token itself) are cached, so later runs skip
+    the check until the token is close to expiring or the credential files change.
+    """
+    cache = DiskCache("auth")
+    fingerprint = _credentials_fingerprint()
+    if not refresh:
+        entry = cache.get_entry("status")
+        if entry and entry.get("validator") == fingerprint and (not require_gcloud or entry["value"]["source"] == "gcloud"):
+            console.print(f"[bold green]✓[/bold green] Authenticated as: [cyan]{entry['value']['account']}[/cyan] [gray](cached)[/gray]")
             return True
-        else:
+
+    status = None if require_gcloud else _adc_status()
+    if status is None:
+        if not shutil.which("gcloud"):
+            reason = "The gcloud backend needs the 'gcloud' CLI, which was not found." if require_gcloud else "No Application Default Credentials and 'gcloud' CLI not found."
+            console.print(f"[bold red]❌ Error:[/bold red] {reason} Please install the Google Cloud SDK.")
+            return False
+        try:
+            status = _gcloud_status()
+        except subprocess.CalledProcessError:
+            console.print("[bold red]❌ Error:[/bold red] Failed to check gcloud status.")
+            return False
+        if status is None:
             console.print("[bold yellow]⚠️ Warning:[/bold yellow] No active account found in gcloud. Please run 'gcloud auth login'.")
             return False
-    except subprocess.CalledProcessError:
-         console.print("[bold red]❌ Error:[/bold red] Failed to check gcloud status.")
-         return False
+
+    console.print(f"[bold green]✓[/bold green] Authenticated as: [cyan]{status['account']}[/cyan]")
+    if status["expires_at"]:
+        ttl = status["expires_at"] - time.time() - EXPIRY_MARGIN
+        if ttl > 0:
+            cache.set("status", {"account": status["account"], "expires_at": status["expires_at"], "source": status["source"]}, validator=fingerprint, ttl=ttl)
+    return True
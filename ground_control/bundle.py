@@ -0,0 +1,185 @@
+"""
+Local context bundles: everything `ag pull` learned about a set of services, saved so that the
+next pull can start from it.
+
+A bundle holds each service's region, validator (resourceVersion), metadata, resolved commit and
+image digest, plus the runtime info and proxy port layout. It never holds secret values. Those go
+to the OS keyring (through the optional `keyring` package), keyed by secret and version. Without
+a keyring backend, no secret is stored and an offline pull starts without secrets.
+
+`ag pull --offline` rebuilds the context from the bundle without any cloud call. A normal pull
+compares each service's validator with the cloud and only re-describes services that changed;
+secrets pinned to a version are reused from the keyring, and only new references and 'latest'
+versions are fetched again.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+import json
+import time
+
+from .cache import DiskCache
+
+KEYRING_SERVICE = "ground-control"
+FORMAT_VERSION = 1
+
+
+def secret_key(ref: Dict[str, str]) -> str:
+    return f"{ref['secret']}@{ref.get('version') or 'latest'}"
+
+
+def is_pinned(ref: Dict[str, str]) -> bool:
+    """Numbered secret versions are immutable; aliases such as 'latest' can move."""
+    return str(ref.get("version") or "latest").isdigit()
+
+
+class SecretVault:
+    """
+    Keyring-backed store for a bundle's secret values, one keyring entry per bundle.
+    Every method is a no-op when the keyring package or a usable backend is missing.
+    """
+
+    def __init__(self):
+        try:
+            import keyring
+            from keyring.errors import KeyringError
+        except ImportError:
+            keyring, KeyringError = None, Exception
+        self._keyring = keyring
+        self._error = KeyringError
+
+    @property
+    def available(self) -> bool:
+        if self._keyring is None:
+            return False
+        try:
+            from keyring.backends.fail import Keyring as FailKeyring
+            return not isinstance(self._keyring.get_keyring(), FailKeyring)
+        except ImportError:
+            return True
+
+    def load(self, key: str) -> Dict[str, str]:
+        if not self.available:
+            return {}
+        try:
+            raw = self._keyring.get_password(KEYRING_SERVICE, key)
+            return json.loads(raw) if raw else {}
+        except (self._error, ValueError):
+            return {}
+
+    def save(self, key: str, values: Dict[str, str]) -> bool:
+        if not self.available:
+            return False
+        try:
+            self._keyring.set_password(KEYRING_SERVICE, key, json.dumps(values))
+            return True
+        except self._error:
+            return False
+
+    def delete(self, key: str) -> None:
+        if not self.available:
+            return
+        try:
+            self._keyring.delete_password(KEYRING_SERVICE, key)
+        except self._error:
+            pass
+
+
+class BundleStore:
+    """
+    Saves and loads bundles, one per project and set of services, in the "bundles" cache namespace.
+    The last set pulled for each project is remembered so `--offline` can be used without `-s`.
+    """
+
+    def __init__(self, cache: Optional[DiskCache] = None, vault: Optional[SecretVault] = None):
+        self.cache = cache or DiskCache("bundles")
+        self.vault = vault or SecretVault()
+
+    def key(self, project_id: str, services: List[str]) -> str:
+        return f"bundle/{project_id}/{','.join(sorted(services))}"
+
+    def last_services(self, project_id: str) -> List[str]:
+        return self.cache.get(f"last/{project_id}") or []
+
+    def load(self, project_id: str, services: List[str]) -> Optional[Dict[str, Any]]:
+        """Returns the bundle for exactly these services (or a superset saved last), or None."""
+        bundle = self.cache.get(self.key(project_id, services))
+        if bundle is None:
+            last = self.last_services(project_id)
+            if set(services) <= set(last):
+                bundle = self.cache.get(self.key(project_id, last))
+        if not bundle or bundle.get("format") != FORMAT_VERSION:
+            return None
+        if not set(services) <= set(bundle["services"]):
+            return None
+        return bundle
+
+    def save(
+        self,
+        project_id: str,
+        services: Dict[str, Dict[str, Any]],
+        runtime: Dict[str, Any],
+        proxies: Dict[str, int],
+        secrets: Dict[str, str],
+    ) -> Dict[str, Any]:
+        """
+        Saves the bundle. `services` maps names to {"region", "validator", "metadata", "commit_sha",
+        "digest"}; `secrets` maps secret_key() to values and goes to the keyring only.
+        """
+        key = self.key(project_id, list(services))
+        bundle = {
+            "format": FORMAT_VERSION,
+            "project": project_id,
+            "saved_at": time.time(),
+            "services": services,
+            "runtime": runtime,
+            "proxies": proxies,
+            "secrets_in_keyring": self.vault.save(key, secrets) if secrets else False,
+        }
+        self.cache.set(key, bundle)
+        self.cache.set(f"last/{project_id}", list(services))
+        return bundle
+
+    def secrets(self, project_id: str, bundle: Dict[str, Any]) -> Dict[str, str]:
+        if not bundle.get("secrets_in_keyring"):
+            return {}
+        return self.vault.load(self.key(project_id, list(bundle["services"])))
+
+
+def reuse_secrets(secrets_map: Dict[str, Dict[str, str]], stored: Dict[str, str], offline: bool = False) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, str]]]:
+    """
+    Splits secret references into results answered from stored values and references still to
+    fetch. Online, only versions pinned by number are reused; offline, every stored value is.
+    Returns (results, to_fetch) in the shape of SecretManager.fetch_many's input and output.
+    """
+    results: Dict[str, Dict[str, Any]] = {}
+    to_fetch: Dict[str, Dict[str, str]] = {}
+    for env_name, ref in secrets_map.items():
+        value = stored.get(secret_key(ref))
+        if value is not None and (offline or is_pinned(ref)):
+            results[env_name] = {"value": value, "error": None}
+        elif offline:
+            results[env_name] = {"value": None, "error": "not stored in the local bundle"}
+        else:
+            to_fetch[env_name] = ref
+    return results, to_fetch
+
+
+def current_summaries(provider: Any, bundle: Dict[str, Any], names: List[str]) -> Dict[str, Tuple[str, Dict[str, Any]]]:
+    """
+    Lists, fresh from the cloud, only the regions the bundle says the services run in (one call
+    per region, concurrently). Returns {name: (region, summary)} for the services still found there.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    by_region: Dict[str, List[str]] = {}
+    for name in names:
+        by_region.setdefault(bundle["services"][name]["region"], []).append(name)
+    with ThreadPoolExecutor(max_workers=len(by_region) or 1) as pool:
+        listings = dict(zip(by_region, pool.map(lambda region: provider.list_services_in_region(region, refresh=True), by_region)))
+
+    found = {}
+    for region, region_names in by_region.items():
+        for summary in listings[region] or []:
+            name = summary.get("metadata", {}).get("name")
+            if name in region_names:
+                found[name] = (region, summary)
+    return found
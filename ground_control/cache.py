@@ -0,0 +1,158 @@
+import hashlib
+import itertools
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, Optional
+
+# A size-bounded namespace is pruned on its first write and then every this many writes, so
+# writing N entries costs O(N) directory scans / PRUNE_EVERY rather than one scan per entry
+PRUNE_EVERY = 64
+
+
+def cache_root() -> str:
+    """
+    Returns the base directory for Ground Control's on-disk caches.
+    Honours AG_CACHE_DIR, then XDG_CACHE_HOME, then ~/.cache.
+    """
+    override = os.environ.get("AG_CACHE_DIR")
+    if override:
+        return override
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "ground-control")
+
+
+def runtime_dir() -> str:
+    """
+    Returns the directory for sockets and other per-session runtime files.
+    Uses $XDG_RUNTIME_DIR/ground-control when available, else the cache root.
+    """
+    base = os.environ.get("XDG_RUNTIME_DIR")
+    return os.path.join(base, "ground-control") if base else cache_root()
+
+
+class DiskCache:
+    """
+    Small JSON key/value store on disk, one file per entry.
+    Entries carry an optional validator (e.g. a revision name) and expire after `ttl` seconds.
+    When the namespace grows past `max_bytes`, the least recently written entries are evicted
+    (checked every PRUNE_EVERY writes, so it can overshoot by that many entries in between).
+    Writes are atomic so concurrent readers never see a partial entry.
+    """
+
+    def __init__(self, namespace: str, ttl: Optional[float] = None, max_bytes: Optional[int] = None, root: Optional[str] = None):
+        self.directory = os.path.join(root or cache_root(), namespace)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._writes = itertools.count()
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def get_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the raw entry ({"key", "value", "validator", "stored_at", "expires_at"}) or None.
+        Expired entries are removed.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if entry.get("key") != key:
+            return None
+        expires_at = entry.get("expires_at")
+        if expires_at is not None and time.time() >= expires_at:
+            self.delete(key)
+            return None
+        return entry
+
+    def get(self, key: str, default: Any = None) -> Any:
+        entry = self.get_entry(key)
+        return entry["value"] if entry else default
+
+    def set(self, key: str, value: Any, validator: Optional[str] = None, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        entry = {
+            "key": key,
+            "value": value,
+            "validator": validator,
+            "stored_at": now,
+            "expires_at": now + ttl if ttl is not None else None,
+        }
+        tmp_path = None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._path(key))
+            tmp_path = None
+        except OSError:
+            # A cache that cannot be written is just a cold cache.
+            return
+        finally:
+            # Also reached when json.dump raises something else, e.g. for a value that is not JSON
+            if tmp_path:
+                self._remove(tmp_path)
+
+        if self.max_bytes is not None and next(self._writes) % PRUNE_EVERY == 0:
+            self.prune()
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def prune(self) -> None:
+        """
+        Drops expired entries, then evicts the oldest entries until the namespace fits in max_bytes.
+        """
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+
+        now = time.time()
+        files = []
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if self.ttl is not None and now - stat.st_mtime >= self.ttl:
+                self._remove(path)
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+
+        if self.max_bytes is None:
+            return
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self) -> None:
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            self._remove(os.path.join(self.directory, name))
+
+    def _remove(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
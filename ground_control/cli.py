@@ -1,167 +1,461 @@
 import typer
-from rich.console import Console
-from rich.panel import Panel
-from rich.prompt import Prompt
-from typing import Optional
+from typing import Any, Dict, List, Optional
+import json
 import os
+import re
 import subprocess
 import sys
-from .auth import check_gcloud_auth
-from .providers.gcp import GCPProvider
-from .connectivity import ProxyManager, SecretManager
+import threading
+import time
+# Keep module-level imports light: `ag --help`, `ag --version` and shell hooks import this
+# module, so providers, connectivity and cloud clients are imported inside the commands.
+from . import __version__
+from .console import console
+from .providers.discovery import DEFAULT_CONCURRENCY
 
 app = typer.Typer(
     name="ground-control",
     help="Ground Control: Teleport cloud context to your local environment.",
     add_completion=False,
 )
-console = Console()
+
+def _print_version(value: bool):
+    if value:
+        print(f"ground-control {__version__}")
+        raise typer.Exit()
+
+@app.callback()
+def main(
+    version: bool = typer.Option(False, "--version", callback=_print_version, is_eager=True, help="Show the version and exit."),
+):
+    """
+    Ground Control: Teleport cloud context to your local environment.
+    """
 
 @app.command()
 def pull(
     project_id: str = typer.Argument(..., help="The Cloud Project ID to pull from (e.g. 'my-gcp-project')."),
-    service: Optional[str] = typer.Option(None, "--service", "-s", help="Specific Cloud Run service to target."),
+    service: Optional[List[str]] = typer.Option(None, "--service", "-s", help="Cloud Run service to target. Repeat (or comma-separate) to pull several services at once."),
     write_env: bool = typer.Option(False, "--write-env", help="Write secrets to .env file instead of injecting into a subshell."),
     verbose: bool = typer.Option(False, "--verbose", "-v", help="Show verbose output."),
+    backend: str = typer.Option("api", "--backend", help="Provider backend: 'api' (in-process client) or 'gcloud' (CLI subprocesses)."),
+    refresh: bool = typer.Option(False, "--refresh", help="Bypass the local metadata cache and fetch everything from the cloud."),
+    regions: Optional[str] = typer.Option(None, "--regions", help="Comma-separated regions to search (default: all Cloud Run regions)."),
+    concurrency: int = typer.Option(DEFAULT_CONCURRENCY, "--concurrency", help="Maximum number of regions queried at once."),
+    use_daemon: bool = typer.Option(False, "--daemon", help="Attach to warm proxies owned by the background ag daemon (started on demand)."),
+    profile: bool = typer.Option(False, "--profile", help="Print a per-phase timing summary (wall time, subprocesses, RPCs, bytes)."),
+    trace_file: Optional[str] = typer.Option(None, "--trace-file", help="With --profile, also write a Chrome trace-event JSON file (chrome://tracing, Perfetto)."),
+    compose: bool = typer.Option(False, "--compose", help="Write a docker-compose.yml that runs the deployed image, pinned by digest, with Cloud SQL proxy sidecars."),
+    local_code: bool = typer.Option(False, "--local-code", help="With --compose, build the app from the working tree (BuildKit cache mounts) instead of running the deployed image."),
+    force: bool = typer.Option(False, "--force", help="With --compose, overwrite an existing docker-compose.yml / Dockerfile.ag that ag did not generate."),
+    deps: str = typer.Option("auto", "--deps", help="Dependency cache: 'auto' (link cached environments), 'install' (also build on a miss) or 'off'."),
+    offline: bool = typer.Option(False, "--offline", help="Start from the saved context bundle without contacting the cloud."),
+    watch: bool = typer.Option(False, "--watch", help="Poll for new revisions in the background and apply their changes to the live session."),
+    watch_interval: float = typer.Option(30.0, "--watch-interval", help="Seconds between --watch polls."),
+    env_file_on_disk: bool = typer.Option(False, "--env-file-on-disk", help="With --watch, keep the live env file (with secret values) even when the runtime directory is not memory-backed."),
 ):
     """
     Pull a cloud project's context to your local environment.
     """
+    from concurrent.futures import ThreadPoolExecutor
+    from rich.panel import Panel
+    from rich.prompt import Prompt
+    from .auth import check_gcloud_auth
+    from .providers.gcp import create_provider, BACKENDS
+    from .providers.discovery import ServiceDiscovery
+    from .providers.cached import service_validator
+    from .connectivity import ProxyManager, SecretManager, proxy_env
+    from .bundle import BundleStore, current_summaries, reuse_secrets, secret_key
+
     console.print(Panel(f"[bold green]Ground Control[/bold green]: Initiating sequence for [cyan]{project_id}[/cyan]...", title="🚀 Launch Sequence"))
 
     if verbose:
         console.log("Verbose mode enabled.")
 
-    if not check_gcloud_auth():
+    if profile or trace_file:
+        from .profiling import profiler
+        profiler.enable()
+
+    if deps not in ("auto", "install", "off"):
+        console.print(f"[red]Unknown --deps mode '{deps}'. Choose from: auto, install, off.[/red]")
         raise typer.Exit(code=1)
 
-    provider = GCPProvider(project_id)
-    
-    # --- Service Selection ---
-    if not service:
-        with console.status("[bold green]Scanning for services...[/bold green]"):
-            services_data = provider.list_services()
-            
-        if not services_data:
-            console.print("[red]No services found or access denied.[/red]")
+    if backend not in BACKENDS:
+        console.print(f"[red]Unknown backend '{backend}'. Choose from: {', '.join(BACKENDS)}.[/red]")
+        raise typer.Exit(code=1)
+
+    service_names = list(dict.fromkeys(n.strip() for s in (service or []) for n in s.split(",") if n.strip()))
+    if compose and len(service_names) > 1:
+        console.print("[red]--compose supports one service at a time.[/red]")
+        raise typer.Exit(code=1)
+    if watch and (offline or write_env):
+        console.print("[red]--watch needs a live session: it cannot be combined with --offline or --write-env.[/red]")
+        raise typer.Exit(code=1)
+
+    # --- Context Bundle ---
+    # The last pull's context, saved locally: --offline starts from it alone, and a normal pull
+    # reuses every service whose validator (resourceVersion) has not changed since.
+    bundles = BundleStore()
+    bundle = None
+    if offline:
+        service_names = service_names or bundles.last_services(project_id)
+        bundle = bundles.load(project_id, service_names) if service_names else None
+        if bundle is None:
+            console.print(f"[red]No saved context for {', '.join(service_names) or project_id}. Run an online pull first.[/red]")
             raise typer.Exit(code=1)
-            
-        service_names = [s.get("metadata", {}).get("name") for s in services_data]
-        
-        if not service_names:
-             console.print("[red]No managed services found.[/red]")
+        console.print(f"[bold blue]ℹ️[/bold blue]  Offline: using the context saved {time.strftime('%Y-%m-%d %H:%M', time.localtime(bundle['saved_at']))}.")
+    elif service_names and not refresh:
+        bundle = bundles.load(project_id, service_names)
+
+    provider = discovery = None
+    region_list = [r.strip() for r in regions.split(",") if r.strip()] if regions else None
+    if not offline:
+        if not check_gcloud_auth(refresh=refresh, require_gcloud=backend == "gcloud"):
+            raise typer.Exit(code=1)
+
+        provider = create_provider(project_id, backend, refresh=refresh)
+        discovery = ServiceDiscovery(provider, regions=region_list, concurrency=concurrency)
+
+    # --- Service Selection ---
+    if not service_names:
+        with console.status("[bold green]Scanning for services...[/bold green]") as status:
+            for region, region_services in discovery.iter_regions():
+                names = [s.get("metadata", {}).get("name") for s in region_services]
+                if names:
+                    console.print(f"[gray]   {region}: {', '.join(n for n in names if n)}[/gray]")
+                status.update(
+                    f"[bold green]Scanning for services... "
+                    f"{discovery.completed}/{discovery.total} regions, {len(discovery.index)} found[/bold green]"
+                )
+
+        available = discovery.index.names()
+
+        if not available:
+             console.print("[red]No services found or access denied.[/red]")
              raise typer.Exit(code=1)
              
-        service = Prompt.ask("Select a service to pull", choices=service_names)
+        service_names = [Prompt.ask("Select a service to pull", choices=available)]
 
-    console.print(f"[bold blue]ℹ️[/bold blue]  Targeting service: [yellow]{service}[/yellow]")
+    console.print(f"[bold blue]ℹ️[/bold blue]  Targeting service{'s' if len(service_names) > 1 else ''}: [yellow]{', '.join(service_names)}[/yellow]")
     
     # --- Analysis & Metadata ---
-    with console.status(f"[bold green]Analyzing {service}...[/bold green]"):
-        if 'services_data' not in locals():
-             services_data = provider.list_services()
-        
-        target_service_data = next((s for s in services_data if s["metadata"]["name"] == service), None)
-        if not target_service_data:
-             console.print(f"[red]Service {service} not found in project.[/red]")
+    with console.status(f"[bold green]Analyzing {', '.join(service_names)}...[/bold green]"):
+        if offline:
+            found = {name: (bundle["services"][name]["region"], {}) for name in service_names}
+        elif bundle:
+            # Only the regions the services ran in last time are listed, to compare validators
+            found = current_summaries(provider, bundle, service_names)
+            moved = [n for n in service_names if n not in found]
+            if moved:
+                found.update(discovery.find_many(moved))
+        else:
+            found = discovery.find_many(service_names)
+        if len(found) < len(service_names) and not refresh and not offline:
+            # Cached listings may predate a service; ask the cloud before giving up.
+            discovery = ServiceDiscovery(provider, regions=region_list, concurrency=concurrency, refresh=True)
+            found.update(discovery.find_many([n for n in service_names if n not in found]))
+        missing = [n for n in service_names if n not in found]
+        if missing:
+             console.print(f"[red]Service {', '.join(missing)} not found in project.[/red]")
              raise typer.Exit(code=1)
-             
-        region = target_service_data["metadata"]["labels"]["cloud.googleapis.com/location"]
-        
-        details = provider.get_service_details(service, region)
-        metadata = provider.extract_metadata(details)
-        
-    console.print(f"[green]✓[/green] Found image: [cyan]{metadata['image']}[/cyan]")
-    
-    if metadata['cloud_sql_instances']:
-         console.print(f"[green]✓[/green] Found Cloud SQL: [cyan]{metadata['cloud_sql_instances']}[/cyan]")
 
-    # --- Git Commit SHA ---
-    with console.status("[bold green]Tracing git commit...[/bold green]"):
-        commit_sha = provider.get_commit_sha(metadata['image'])
-        
-    if commit_sha:
-        console.print(f"[green]✓[/green] Identified commit: [magenta]{commit_sha}[/magenta]")
-        # TODO: Clone repo operation here
-    else:
-        console.print("[bold yellow]⚠️  Could not determine commit SHA from image tags.[/bold yellow]")
-        console.print("   [yellow]Falling back to HEAD. Be aware of potential drift![/yellow]")
-        commit_sha = "HEAD"
+        # One record per service: where it runs, its metadata and (later) its commit and environment
+        targets = {name: {"name": name, "region": found[name][0], "summary": found[name][1], "context_key": f"{project_id}/{found[name][0]}/{name}"} for name in service_names}
+        for name, target in targets.items():
+            saved = (bundle or {}).get("services", {}).get(name)
+            if saved and (offline or saved["validator"] == service_validator(target["summary"])):
+                target["bundled"] = saved
+        if bundle and not offline:
+            reused = sum(1 for t in targets.values() if t.get("bundled"))
+            console.print(f"[gray]   {reused}/{len(targets)} service(s) unchanged since the saved context[/gray]")
 
-    # --- Runtime Detection ---
+        daemon_client = None
+        if use_daemon:
+            from .daemon import DaemonClient, DaemonError
+            daemon_client = DaemonClient()
+            try:
+                daemon_client.ensure_running()
+                for target in targets.values():
+                    context = daemon_client.call("context.get", key=target["context_key"]).get("value")
+                    if context and not offline:
+                        # Compare against a listing of bounded age: the discovered one may be days old
+                        current = provider.current_summary(target["name"], target["region"])
+                        if current and context.get("validator") == service_validator(current):
+                            target["daemon_context"] = context
+            except DaemonError as e:
+                console.print(f"[yellow]⚠️ Daemon unavailable ({e}). Starting proxies locally.[/yellow]")
+                daemon_client = None
+
+        def describe(target):
+            if target.get("bundled"):
+                return target["bundled"]["metadata"]
+            if target.get("daemon_context"):
+                return target["daemon_context"]["metadata"]
+            details = provider.get_service_details(target["name"], target["region"], summary=target["summary"])
+            return provider.extract_metadata(details)
+
+        with ThreadPoolExecutor(max_workers=len(targets)) as pool:
+            for target, metadata in zip(targets.values(), pool.map(describe, targets.values())):
+                # A failed describe yields empty metadata, which must never be saved as the service's context
+                target["described"] = bool(metadata and metadata.get("image"))
+                target["metadata"] = metadata or {"image": "", "env_vars": {}, "secrets": {}, "cloud_sql_instances": []}
+
+    multi = len(targets) > 1
+    for target in targets.values():
+        label = f" for {target['name']}" if multi else ""
+        console.print(f"[green]✓[/green] Found image{label}: [cyan]{target['metadata']['image']}[/cyan]")
+        if target['metadata']['cloud_sql_instances']:
+             console.print(f"[green]✓[/green] Found Cloud SQL{label}: [cyan]{target['metadata']['cloud_sql_instances']}[/cyan]")
+
+    # --- Merged resources ---
+    # Services often share a database and secrets: each distinct Cloud SQL instance gets one
+    # proxy, and each distinct (secret, version) pair is fetched once (SecretManager.fetch_many).
+    instances = list(dict.fromkeys(i for t in targets.values() for i in t["metadata"].get("cloud_sql_instances", [])))
+    secrets_map = {f"{t['name']}/{env_name}": ref for t in targets.values() for env_name, ref in t["metadata"].get("secrets", {}).items()}
+
+    # --- Independent phases ---
+    # Once the metadata is known, commit tracing, runtime detection, proxy startup and
+    # secret fetching do not depend on each other, so they run concurrently.
     project_path = os.getcwd() # MVP: assumes running in project root
     from .detector import RuntimeSynthesizer
+    from .pipeline import Pipeline, DONE
     synthesizer = RuntimeSynthesizer()
-    runtime_info = synthesizer.detect(project_path)
-    
+    if daemon_client:
+        from .daemon import DaemonProxyManager
+        # With --write-env, tie the lease to the invoking shell so proxies outlive this command.
+        proxy_manager = DaemonProxyManager(daemon_client, pid=os.getppid() if write_env else os.getpid())
+    else:
+        proxy_manager = ProxyManager()
+    secret_manager = SecretManager(project_id)
+
+    pipeline = Pipeline()
+    for name, target in targets.items():
+        label = f" ({name})" if multi else ""
+        if target.get("bundled") and (offline or target["bundled"]["commit_sha"]):
+            pipeline.add(f"commit:{name}", lambda _, t=target: t["bundled"]["commit_sha"], label=f"Tracing git commit{label} (saved)")
+        elif target.get("daemon_context", {}).get("commit_sha"):
+            pipeline.add(f"commit:{name}", lambda _, t=target: t["daemon_context"]["commit_sha"], label=f"Tracing git commit{label} (daemon)")
+        else:
+            pipeline.add(f"commit:{name}", lambda _, t=target: provider.get_commit_sha(t["metadata"]['image']), label=f"Tracing git commit{label}")
+    pipeline.add("runtime", lambda _: synthesizer.detect(project_path), label="Detecting runtime")
+    if deps != "off":
+        # Needs the detected runtimes only, so it overlaps commit tracing, proxies and secrets
+        pipeline.add("deps", lambda r: _restore_dependencies(r["runtime"], project_path, install=deps == "install"), deps=["runtime"],
+                     label="Restoring dependencies")
+    if instances and offline:
+        # A proxy connects to Cloud SQL, so --offline does not start any
+        console.print(f"[yellow]⚠️  Offline: Cloud SQL proxies for {', '.join(instances)} are not started. Run an online pull to reach the database.[/yellow]")
+    elif instances:
+        pipeline.add("proxies", lambda _: proxy_manager.start_cloud_sql_proxy(instances), label="Connecting to Cloud SQL")
+    # Secrets pinned to a version are reused from the keyring; offline, every stored value is
+    # reused and nothing is fetched
+    saved_secrets, to_fetch = reuse_secrets(secrets_map, bundles.secrets(project_id, bundle) if bundle else {}, offline)
+    if to_fetch:
+        distinct = len({secret_key(ref) for ref in to_fetch.values()})
+        pipeline.add("secrets", lambda _: secret_manager.fetch_many(to_fetch), label=f"Fetching {distinct} secrets")
+    if compose:
+        (target,) = targets.values()
+        if target.get("bundled", {}).get("digest"):
+            pipeline.add("digest", lambda _: target["bundled"]["digest"], label="Resolving image digest (saved)")
+        elif offline:
+            pipeline.add("digest", lambda _: None, label="Resolving image digest (offline)")
+        else:
+            pipeline.add("digest", lambda _: provider.get_image_digest(target["metadata"]['image'], target["region"], target["metadata"].get('revision')), label="Resolving image digest")
+        if not local_code and not offline:
+            from .compose import ensure_image, pin_image
+            pipeline.add("image", lambda r: ensure_image(pin_image(target["metadata"]['image'], r["digest"])), deps=["digest"], label="Pulling image")
+    tasks = pipeline.run()
+
+    def task_result(name: str, default):
+        task = tasks.get(name)
+        if task is None:
+            return default
+        if task.status != DONE:
+            console.print(f"[red]{task.label} failed: {task.error}[/red]")
+            return default
+        return task.result
+
+    # --- Git Commit SHA ---
+    for name, target in targets.items():
+        commit_sha = task_result(f"commit:{name}", None)
+        label = f" for {name}" if multi else ""
+        if commit_sha:
+            console.print(f"[green]✓[/green] Identified commit{label}: [magenta]{commit_sha}[/magenta]")
+        else:
+            console.print(f"[bold yellow]⚠️  Could not determine commit SHA{label} from image tags.[/bold yellow]")
+            console.print("   [yellow]Falling back to HEAD. Be aware of potential drift![/yellow]")
+            commit_sha = "HEAD"
+        target["commit_sha"] = commit_sha
+
+        if daemon_client and not target.get("daemon_context") and target["described"] and not offline:
+            try:
+                daemon_client.call("context.put", key=target["context_key"], value={
+                    "validator": service_validator(target["summary"]),
+                    "metadata": target["metadata"],
+                    "commit_sha": commit_sha if commit_sha != "HEAD" else None,
+                })
+            except DaemonError:
+                pass
+
+    # --- Runtime Detection ---
+    runtime_info = task_result("runtime", {"language": "unknown", "dependency_file": None, "cmd": None})
     console.print(f"[bold blue]ℹ️[/bold blue]  Detected Runtime: [cyan]{runtime_info['language']}[/cyan]")
+    nested = [r for r in runtime_info.get("runtimes", []) if r["path"] != "."]
+    if nested:
+        console.print(f"[gray]   {len(nested)} more in subdirectories:[/gray]")
+        for r in nested:
+            console.print(f"[gray]   {r['path']}: {r['language']} ({r['lockfile'] or r['dependency_file']})[/gray]")
+    if runtime_info.get("runtimes_truncated"):
+        console.print("[gray]   Large tree: subdirectory discovery stopped early; run from the project root to see every service.[/gray]")
+
+    # --- Dependencies ---
+    deps_env, deps_notes = task_result("deps", ({}, []))
+    for note in deps_notes:
+        console.print(note)
 
     # --- Proxy & Connectivity ---
-    proxy_manager = ProxyManager()
-    active_proxies = {}
-    
-    if metadata.get('cloud_sql_instances'):
-        console.print(f"[bold blue]ℹ️[/bold blue]  Connecting to Cloud SQL instances...")
-        try:
-            active_proxies = proxy_manager.start_cloud_sql_proxy(metadata['cloud_sql_instances'])
-        except Exception as e:
-            console.print(f"[red]Proxy Error: {e}[/red]")
+    active_proxies = task_result("proxies", {})
+
+    # --- Compose ---
+    if compose:
+        (target,) = targets.values()
+        _write_compose(synthesizer, runtime_info, target["metadata"], target["name"], f"{project_id}/{target['region']}/{target['name']}",
+                       task_result("digest", None), active_proxies or (bundle or {}).get("proxies", {}), local_code, task_result("image", None), project_path, force)
 
     # --- Secrets & Environment ---
-    env_updates = {}
-    
-    # 1. Plain Env Vars
-    env_updates.update(metadata.get('env_vars', {}))
-    
-    # 2. Proxy Ports (Injection)
-    # Inject DB_HOST / DB_PORT based on proxy mapping? 
-    # For now, just exposing them might be enough, or user app expects specific names.
-    # Let's auto-inject recommended vars:
-    for instance, port in active_proxies.items():
-        # Heuristic: set DB_PORT if only one?
-        # Or just let the user know.
-        pass
+    # Each service gets its own environment: its plain env vars, then its secrets.
+    secret_results = {**saved_secrets, **task_result("secrets", {})}
+    for name, target in targets.items():
+        env_updates = {}
 
-    # 3. Fetch Secrets
-    secret_manager = SecretManager(project_id)
-    secrets_map = metadata.get('secrets', {})
-    
-    if secrets_map:
-        with console.status(f"[bold green]Fetching {len(secrets_map)} secrets from Secret Manager...[/bold green]"):
-            for env_name, secret_info in secrets_map.items():
-                secret_id = secret_info['secret']
-                version = secret_info['version']
-                # Clean up version if strictly 'latest' or numeric.
-                # Cloud Run 'key' often effectively means version.
-                
-                payload = secret_manager.fetch_secret(secret_id, version)
-                if payload:
-                    env_updates[env_name] = payload
-                    console.print(f"[gray]   + Injected {env_name}[/gray]")
-                else:
-                    console.print(f"[red]   x Failed to fetch {env_name}[/red]")
+        # 1. Plain Env Vars
+        env_updates.update(target["metadata"].get('env_vars', {}))
+
+        # 2. Secrets
+        prefix = f"{name}: " if multi else ""
+        for env_name, ref in target["metadata"].get("secrets", {}).items():
+            result = secret_results.get(f"{name}/{env_name}")
+            if result and result["value"] is not None:
+                env_updates[env_name] = result["value"]
+                console.print(f"[gray]   + Injected {prefix}{env_name}[/gray]")
+            else:
+                if result and result["error"]:
+                    console.print(f"[yellow]Could not access secret {ref['secret']}: {result['error']}[/yellow]")
+                console.print(f"[red]   x Failed to fetch {prefix}{env_name}[/red]")
+
+        # 3. Proxy Ports: last, so they win over a deployed DB_HOST from either of the above
+        instances = target["metadata"].get("cloud_sql_instances", [])
+        db_env = proxy_env(instances, active_proxies)
+        if db_env:
+            env_updates.update(db_env)
+            console.print(f"[gray]   + Injected {prefix}DB_HOST={db_env['DB_HOST']} DB_PORT={db_env['DB_PORT']} (proxy for {instances[0]})[/gray]")
+        elif len(set(instances)) > 1 and active_proxies:
+            mapped = ", ".join(f"{i} -> {active_proxies[i]}" for i in instances if i in active_proxies)
+            console.print(f"[gray]   {prefix}Several Cloud SQL instances, so DB_HOST / DB_PORT were left as deployed. Local ports: {mapped}[/gray]")
+        target["env"] = env_updates
+
+    # --- Save the context bundle ---
+    if not offline:
+        digest = task_result("digest", None) if compose else None
+        saved_values = {secret_key(ref): secret_results[key]["value"] for key, ref in secrets_map.items()
+                        if secret_results.get(key, {}).get("value") is not None}
+        # Only services that were actually described; the HEAD fallback is not a resolved commit
+        described = {
+            name: {
+                "region": target["region"],
+                "validator": service_validator(target["summary"]),
+                "metadata": target["metadata"],
+                "commit_sha": target["commit_sha"] if target["commit_sha"] != "HEAD" else None,
+                "digest": digest or target.get("bundled", {}).get("digest"),
+            }
+            for name, target in targets.items() if target["described"]
+        }
+        try:
+            if described:
+                saved = bundles.save(project_id, described, runtime_info, active_proxies, saved_values)
+                if saved_values and not saved["secrets_in_keyring"]:
+                    console.print("[gray]   Secrets were not saved for --offline (install the 'keyring' extra to keep them in the OS keyring).[/gray]")
+        except OSError:
+            pass
+
+    # --- Context Snapshot (for the MCP server) ---
+    # Secret values are never published, only which secret each variable comes from.
+    from .snapshot import SnapshotWriter, SnapshotError, default_snapshot_path
+    snapshot = SnapshotWriter(default_snapshot_path(project_path))
+    proxy_owner = os.getppid() if (daemon_client and write_env) else os.getpid()
+    def publish_context(targets: Dict[str, Dict[str, Any]], ports: Dict[str, int]) -> None:
+        summaries = {
+            name: {
+                "project": project_id,
+                "region": target["region"],
+                "service": name,
+                "image": target["metadata"]['image'],
+                "commit_sha": target["commit_sha"],
+                "runtime": runtime_info,
+                "env_vars": target["metadata"].get('env_vars', {}),
+                "secret_refs": {env_name: ref['secret'] for env_name, ref in target["metadata"].get('secrets', {}).items()},
+                "cloud_sql_instances": target["metadata"].get('cloud_sql_instances', []),
+            }
+            for name, target in targets.items()
+        }
+        snapshot.publish({
+            "service": summaries[service_names[0]],
+            "services": summaries,
+            "proxies": {"pid": proxy_owner, "ports": ports},
+        })
+
+    try:
+        publish_context(targets, active_proxies)
+    except (OSError, SnapshotError) as e:
+        console.print(f"[yellow]⚠️  Could not publish context snapshot: {e}[/yellow]")
+
+    if active_proxies:
+        schema_env = {**os.environ, **targets[service_names[0]]["env"]}
+        def publish_schema():
+            from .schema import summarize
+            try:
+                snapshot.publish({"schema": summarize(active_proxies, schema_env)})
+            except (OSError, SnapshotError):
+                pass
+        # Best effort, in the background: the shell should not wait on the database
+        threading.Thread(target=publish_schema, daemon=True).start()
+
+    if profile or trace_file:
+        profiler.print_summary()
+        if trace_file:
+            profiler.write_chrome_trace(trace_file)
+            console.print(f"[green]✓[/green] Trace written to [cyan]{trace_file}[/cyan]")
 
     # --- Execution Handover ---
     
     if write_env:
-        # Write to .env file
-        with open(".env", "w") as f:
-            for k, v in env_updates.items():
-                # Simple escaping
-                f.write(f"{k}={v}\n")
-        console.print("[bold green]✅ .env file generated.[/bold green]")
-        console.print("[yellow]⚠️  Warning: Secrets are now on disk. Delete .env when done.[/yellow]")
+        # Write to .env file (one per service when pulling several)
+        env_files = {}
+        for name, target in targets.items():
+            path = f".env.{name}" if multi else ".env"
+            with open(path, "w") as f:
+                for k, v in target["env"].items():
+                    # Simple escaping
+                    f.write(f"{k}={v}\n")
+            env_files[name] = path
+        console.print(f"[bold green]✅ {', '.join(env_files.values())} file{'s' if multi else ''} generated.[/bold green]")
+        console.print(f"[yellow]⚠️  Warning: Secrets are now on disk. Delete {', '.join(env_files.values())} when done.[/yellow]")
         
         # We still keep the proxy running?
         # If we write .env and exit, the proxy (subprocess) will likely die or be orphaned.
         # User requested robustness.
-        console.print("[bold red]🛑 proxies will stop when this command exits.[/bold red]")
-        console.print(Panel(f"Run:\n[bold white]source .env && {runtime_info['cmd'] or 'your-start-command'}[/bold white]", title="Manual Launch"))
+        if not daemon_client:
+            console.print("[bold red]🛑 proxies will stop when this command exits.[/bold red]")
+        launch = "\n".join(f"[bold white]source {path} && {runtime_info['cmd'] or 'your-start-command'}[/bold white]" for path in env_files.values())
+        console.print(Panel(f"Run:\n{launch}", title="Manual Launch"))
         
         # If we want to keep proxy alive, we must wait.
-        if active_proxies:
+        if active_proxies and daemon_client:
+            console.print("[bold green]Proxies are owned by the ag daemon and stay up while this shell is open.[/bold green]")
+        elif active_proxies:
             Prompt.ask("Press Enter to stop proxies and exit", show_default=False)
             proxy_manager.stop()
+            _unpublish_proxies(snapshot)
             
     else:
         # Memory-First: Spawn Subshell
@@ -169,7 +463,47 @@ def pull(
         console.print(Panel("Spawning shell with injected secrets...\n[bold white]You are entering the Wormhole.[/bold white]", title="🚀 Warp Speed"))
         
         target_env = os.environ.copy()
-        target_env.update(env_updates)
+        # Cached dependencies belong to the local shell, not to any service's context
+        target_env.update(deps_env)
+        if deps_env.get("VIRTUAL_ENV"):
+            target_env["PATH"] = os.pathsep.join([os.path.join(deps_env["VIRTUAL_ENV"], "bin"), target_env.get("PATH", "")])
+        if multi:
+            # Services may disagree on a variable, so each environment is kept whole, in memory,
+            # and applied per command with `ag exec <service> -- <cmd>`.
+            for name, target in targets.items():
+                target_env[service_env_var(name)] = json.dumps(target["env"])
+            target_env["AG_SERVICES"] = ",".join(service_names)
+            console.print(f"[bold blue]ℹ️[/bold blue]  Run a service with: [bold white]ag exec <service> -- {runtime_info['cmd'] or 'your-start-command'}[/bold white]")
+        else:
+            target_env.update(targets[service_names[0]]["env"])
+
+        watcher = None
+        if watch:
+            # The shell cannot be re-injected, so the live environment is kept in env files it can source
+            from .watch import ContextWatcher, env_dir, env_dir_in_memory, env_file_path
+
+            def republish(targets: Dict[str, Dict[str, Any]], ports: Dict[str, int]) -> None:
+                try:
+                    publish_context(targets, ports)
+                except (OSError, SnapshotError):
+                    pass
+
+            # The env file holds secret values: only in memory (tmpfs) unless explicitly allowed on disk
+            env_files = {}
+            if env_file_on_disk or env_dir_in_memory():
+                env_files = {name: env_file_path(project_id, name) for name in service_names}
+            watcher = ContextWatcher(provider, targets, proxy_manager, secret_manager, env_files, active_proxies,
+                                     interval=watch_interval, on_update=republish)
+            watcher.start()
+            if env_files:
+                target_env["AG_ENV_FILE"] = env_files[service_names[0]]
+                if multi:
+                    for name, path in env_files.items():
+                        target_env[service_env_file_var(name)] = path
+                console.print(f"[bold blue]👀[/bold blue] Watching for new revisions every {watch_interval:g}s. Apply changes with: [bold white]source \"$AG_ENV_FILE\"[/bold white]")
+            else:
+                console.print(f"[bold blue]👀[/bold blue] Watching for new revisions every {watch_interval:g}s (proxies and context only).")
+                console.print(f"[yellow]⚠️  {env_dir()} is not memory-backed, so changed env vars and secrets are not written anywhere. Pass --env-file-on-disk to keep them in a 0600 file there.[/yellow]")
         
         # Determine shell
         shell = os.environ.get("SHELL", "/bin/bash")
@@ -180,8 +514,180 @@ def pull(
         except Exception as e:
              console.print(f"[red]Shell error: {e}[/red]")
         finally:
+             if watcher:
+                 watcher.stop()
              console.print("\n[bold blue]ℹ️[/bold blue]  Exiting Wormhole. Stopping proxies...")
+             for row in proxy_manager.status():
+                 if row["failed"]:
+                     console.print(f"[red]Proxy for {row['instance']} kept crashing and was given up on during the session.[/red]")
+                 elif row["restarts"]:
+                     console.print(f"[yellow]⚠️  Proxy for {row['instance']} was restarted {row['restarts']} time(s) during the session.[/yellow]")
              proxy_manager.stop()
+             if not daemon_client:
+                 _unpublish_proxies(snapshot)
+
+def service_env_var(service: str) -> str:
+    """Name of the variable holding a service's environment (JSON) in a multi-service shell."""
+    return "AG_ENV_" + re.sub(r"[^A-Z0-9]", "_", service.upper())
+
+def service_env_file_var(service: str) -> str:
+    """Name of the variable pointing at a service's live env file in a multi-service `--watch` shell."""
+    return "AG_ENV_FILE_" + re.sub(r"[^A-Z0-9]", "_", service.upper())
+
+@app.command("exec", context_settings={"allow_extra_args": True, "ignore_unknown_options": True})
+def exec_(
+    ctx: typer.Context,
+    service: str = typer.Argument(..., help="Service whose environment to apply (from a multi-service `ag pull` shell)."),
+):
+    """
+    Run a command with one pulled service's environment: ag exec <service> -- <cmd>.
+    """
+    command = list(ctx.args)
+    if command[:1] == ["--"]:
+        command = command[1:]
+    raw = os.environ.get(service_env_var(service))
+    env_file = os.environ.get(service_env_file_var(service))
+    if raw is None:
+        pulled = os.environ.get("AG_SERVICES")
+        console.print(f"[red]No environment for '{service}'.[/red] " + (f"Pulled services: {pulled}." if pulled else "Run this inside an `ag pull -s a -s b` shell."))
+        raise typer.Exit(code=1)
+    if not command:
+        console.print("[red]No command given. Usage: ag exec <service> -- <cmd> [args...][/red]")
+        raise typer.Exit(code=1)
+    env = os.environ.copy()
+    if env_file and os.path.exists(env_file):
+        # A `--watch` session keeps the service's current environment in this file
+        from .watch import read_env_file
+        env.update(read_env_file(env_file))
+    else:
+        env.update(json.loads(raw))
+    try:
+        os.execvpe(command[0], command, env)
+    except OSError as e:
+        console.print(f"[red]Could not run {command[0]}: {e}[/red]")
+        raise typer.Exit(code=127)
+
+def _write_compose(synthesizer, runtime_info, metadata, service, source, digest, proxies, local_code, pulled, project_path, force=False):
+    from .compose import DOCKERFILE, ComposeError, render_compose, render_dockerfile, write_compose
+    if not digest and not local_code:
+        console.print("[yellow]⚠️  Could not resolve the image digest; the compose file uses the mutable tag.[/yellow]")
+    dockerfile_name, dockerfile = "Dockerfile", None
+    if local_code and not os.path.exists(os.path.join(project_path, "Dockerfile")):
+        dockerfile = render_dockerfile(runtime_info, metadata)
+        if dockerfile:
+            dockerfile_name = DOCKERFILE
+    content = render_compose(service, metadata, digest, proxies, local_code, dockerfile_name, source)
+    try:
+        written = write_compose(project_path, content, dockerfile, force=force)
+    except (OSError, ComposeError) as e:
+        console.print(f"[red]Could not write compose file: {e}[/red]")
+        return
+    for path in written:
+        console.print(f"[green]✓[/green] Wrote [cyan]{os.path.relpath(path, project_path)}[/cyan]")
+    if pulled is False:
+        console.print("[yellow]⚠️  Could not pull the image (is Docker running?); `docker compose up` will pull it.[/yellow]")
+
+def _restore_dependencies(runtime_info, project_path, install):
+    """
+    Links cached dependency environments for every detected runtime, building them on a miss
+    when `install` is set. Runs as a pipeline task, so it returns (env, notes) instead of printing:
+    env holds the variables to export for the root runtime, which go into the spawned shell only,
+    never into a service's context.
+    """
+    from .depcache import DependencyCache, DependencyCacheError
+    cache = DependencyCache()
+    env, notes = {}, []
+    for runtime in runtime_info.get("runtimes", []):
+        where = "" if runtime["path"] == "." else f" in {runtime['path']}"
+        try:
+            restored = cache.restore(runtime, project_path, install=install and not cache.lookup(runtime))
+        except DependencyCacheError as e:
+            notes.append(f"[yellow]⚠️  Could not install dependencies{where}: {e}[/yellow]")
+            continue
+        if restored is None:
+            if runtime["cmd"]:
+                notes.append(f"[gray]   No cached {runtime['language']} dependencies{where}; run '{runtime['cmd']}' or pull with --deps install.[/gray]")
+            continue
+        state = "Restored cached" if restored["hit"] else f"Installed ({runtime['cmd']}) and cached"
+        notes.append(f"[green]✓[/green] {state} {runtime['language']} dependencies{where}")
+        if not restored["linked"] and runtime["language"] != "go":
+            notes.append(f"[yellow]   An existing environment{where} was left in place; the cached one is at {restored['path']}[/yellow]")
+        if runtime["path"] == ".":
+            env.update(restored["env"])
+    return env, notes
+
+def _unpublish_proxies(snapshot):
+    try:
+        snapshot.publish({"proxies": {"pid": 0, "ports": {}}})
+    except Exception:
+        pass
+
+daemon_app = typer.Typer(help="Manage the background daemon that keeps proxies warm across sessions.")
+app.add_typer(daemon_app, name="daemon")
+
+@daemon_app.command("start")
+def daemon_start(
+    idle_timeout: float = typer.Option(15 * 60, "--idle-timeout", help="Seconds before unused proxies (and an idle daemon) are stopped."),
+):
+    """
+    Start the daemon in the background if it is not already running.
+    """
+    from .daemon import DaemonClient, DaemonError
+    client = DaemonClient()
+    try:
+        client.ensure_running(idle_timeout=idle_timeout)
+    except DaemonError as e:
+        console.print(f"[red]{e}[/red]")
+        raise typer.Exit(code=1)
+    console.print(f"[green]✓[/green] Daemon running (pid {client.call('status')['pid']}).")
+
+@daemon_app.command("status")
+def daemon_status():
+    """
+    Show daemon status.
+    """
+    from .daemon import DaemonClient, DaemonError
+    try:
+        status = DaemonClient().call("status")
+    except DaemonError:
+        console.print("[yellow]Daemon is not running.[/yellow]")
+        raise typer.Exit(code=1)
+    console.print(f"[green]✓[/green] Daemon pid {status['pid']}, up {status['uptime']:.0f}s, "
+                  f"{status['proxies']} proxies, {status['leases']} attached sessions.")
+    for key in status["contexts"]:
+        console.print(f"[gray]   context: {key}[/gray]")
+
+@daemon_app.command("list")
+def daemon_list():
+    """
+    List proxies owned by the daemon.
+    """
+    from .daemon import DaemonClient, DaemonError
+    try:
+        proxies = DaemonClient().call("list")["proxies"]
+    except DaemonError:
+        console.print("[yellow]Daemon is not running.[/yellow]")
+        raise typer.Exit(code=1)
+    if not proxies:
+        console.print("No proxies running.")
+    for row in proxies:
+        state = "[green]up[/green]" if row["alive"] else "[red]failed[/red]" if row.get("failed") else "[red]down[/red]"
+        console.print(f"{row['instance']} -> {row['port']}  {state}  sessions={row['refcount']}  restarts={row['restarts']}")
+
+@daemon_app.command("stop")
+def daemon_stop(
+    instance: Optional[str] = typer.Argument(None, help="Stop only this instance's proxy instead of the whole daemon."),
+):
+    """
+    Stop the daemon, or a single proxy it owns.
+    """
+    from .daemon import DaemonClient, DaemonError
+    try:
+        DaemonClient().call("stop", instance=instance)
+    except DaemonError:
+        console.print("[yellow]Daemon is not running.[/yellow]")
+        raise typer.Exit(code=1)
+    console.print(f"[green]✓[/green] Stopped {instance or 'daemon'}.")
 
 if __name__ == "__main__":
     app()
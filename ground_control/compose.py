@@ -0,0 +1,246 @@
+"""
+docker-compose generation for a pulled service.
+
+By default the app runs the exact image Cloud Run is serving, pinned by digest, so a local launch
+pulls it once into the local image cache instead of rebuilding. With `local_code`, the app is
+built from the working tree instead, and the generated Dockerfile keeps package-manager caches in
+BuildKit cache mounts.
+
+Plain env vars are written as values. Secrets are written only as `${NAME}` references that compose
+resolves from the environment of the shell it runs in (e.g. the `ag pull` shell), so no secret
+value ever reaches the file. Cloud SQL instances are served by one cloud-sql-proxy sidecar, each on
+the port the pull mapped. The sidecar owns the network namespace and the app joins it, so the app
+starts after its proxy and reaches it on 127.0.0.1 as in the pulled shell. The proxy image runs as
+a non-root user while gcloud's credentials file is mode 0600, so the sidecar runs as the uid/gid
+that generated the file.
+
+Existing files are never overwritten unless they were generated by `ag pull` themselves (or the
+caller forces it), so a hand-written docker-compose.yml survives a `--compose` pull.
+"""
+from typing import Any, Dict, List, Optional
+import json
+import os
+
+PROXY_IMAGE = "gcr.io/cloud-sql-connectors/cloud-sql-proxy:2"
+PROXY_SERVICE = "cloudsql"
+COMPOSE_FILE = "docker-compose.yml"
+DOCKERFILE = "Dockerfile.ag"
+# First line of every generated file; files that start with it may be regenerated
+GENERATED_MARKER = "Generated by `ag pull`"
+
+# language -> (base image, cache mount target, manifests copied before the dependency install)
+BUILD_PROFILES = {
+    "python": ("python:3.12-slim", "/root/.cache", ["requirements.txt", "pyproject.toml", "poetry.lock", "uv.lock", "pdm.lock", "Pipfile", "Pipfile.lock"]),
+    "node": ("node:20-slim", "/root/.npm", ["package.json", "package-lock.json", "pnpm-lock.yaml", "yarn.lock", "bun.lockb"]),
+    "go": ("golang:1.22", "/go/pkg/mod", ["go.mod", "go.sum"]),
+}
+
+
+class ComposeError(Exception):
+    """Raised when the compose files cannot be written, e.g. because hand-written ones exist."""
+
+
+def pin_image(image: str, digest: Optional[str]) -> str:
+    """Returns 'repo@digest' for a tagged image reference (the tag is dropped, the digest decides)."""
+    if not digest or "@" in image:
+        return image
+    name, _, tag = image.rpartition(":")
+    repo = name if name and "/" not in tag else image
+    return f"{repo}@{digest}"
+
+
+def _scalar(value: Any) -> str:
+    # JSON strings are valid double-quoted YAML scalars
+    return json.dumps(value) if isinstance(value, str) else json.dumps(str(value))
+
+
+def _env_value(value: str) -> str:
+    """Escapes '$' so compose passes literal values through without interpolation."""
+    return _scalar(value.replace("$", "$$"))
+
+
+def _host_user() -> Optional[str]:
+    """'uid:gid' of the current user, or None where there is no such thing (Windows)."""
+    if not hasattr(os, "getuid"):
+        return None
+    return f"{os.getuid()}:{os.getgid()}"
+
+
+def render_compose(
+    service: str,
+    metadata: Dict[str, Any],
+    image_digest: Optional[str] = None,
+    proxies: Optional[Dict[str, int]] = None,
+    local_code: bool = False,
+    dockerfile: Optional[str] = None,
+    source: Optional[str] = None,
+) -> str:
+    """
+    Returns docker-compose.yml content for the service.
+
+    `proxies` maps Cloud SQL instance connection names to the local ports the pull used; instances
+    without a mapping get consecutive ports from 5432. `dockerfile` is the file used with
+    `local_code` (the project's own Dockerfile, or a generated one).
+    """
+    port = int(metadata.get("port") or 8080)
+    image = pin_image(metadata.get("image", ""), image_digest)
+    proxies = dict(proxies or {})
+    instances = metadata.get("cloud_sql_instances") or []
+    next_port = 5432
+    for instance in instances:
+        if instance not in proxies:
+            while next_port in proxies.values():
+                next_port += 1
+            proxies[instance] = next_port
+
+    lines = [f"# {GENERATED_MARKER} for {source or service}."]
+    if not local_code:
+        lines.append(f"# Runs the deployed image{' (revision ' + metadata['revision'] + ')' if metadata.get('revision') else ''}, pinned by digest.")
+    lines.append("# Secrets are ${NAME} references resolved from the shell running `docker compose up`.")
+    lines += ["services:", "  app:"]
+    published = ["    ports:", f"      - {_scalar(f'{port}:{port}')}"]
+    if local_code:
+        lines += ["    build:", "      context: .", f"      dockerfile: {_scalar(dockerfile or 'Dockerfile')}"]
+        if image_digest:
+            # Reuse layers of the deployed image where the local build matches them
+            lines += ["      cache_from:", f"        - {_scalar(image)}"]
+        lines.append(f"    image: {_scalar('ag-local/' + service)}")
+    else:
+        lines.append(f"    image: {_scalar(image)}")
+        lines.append("    pull_policy: missing")
+    if metadata.get("command"):
+        lines.append(f"    entrypoint: {json.dumps(metadata['command'])}")
+    if metadata.get("args"):
+        lines.append(f"    command: {json.dumps(metadata['args'])}")
+    if instances:
+        # The proxy sidecar owns the network namespace (and publishes the app's port)
+        lines += [
+            f'    network_mode: "service:{PROXY_SERVICE}"',
+            "    depends_on:",
+            f"      - {PROXY_SERVICE}",
+        ]
+    else:
+        lines += published
+
+    lines += ["    environment:", f"      PORT: {_scalar(port)}"]
+    for name, value in sorted(metadata.get("env_vars", {}).items()):
+        if name != "PORT":
+            lines.append(f"      {name}: {_env_value(str(value))}")
+    for name in sorted(metadata.get("secrets", {})):
+        lines.append(f"      {name}: {_scalar('${' + name + '}')}")
+
+    if instances:
+        lines += [
+            f"  {PROXY_SERVICE}:",
+            f"    image: {_scalar(PROXY_IMAGE)}",
+            f"    command: {json.dumps([f'{instance}?port={proxies[instance]}' for instance in instances])}",
+        ]
+        user = _host_user()
+        if user:
+            # The image's default user (65532) cannot read the 0600 credentials file mounted below
+            lines.append(f"    user: {_scalar(user)}")
+        lines += published
+        lines += [
+            "    environment:",
+            f"      CLOUDSDK_CONFIG: {_scalar('/config/gcloud')}",
+            f"      GOOGLE_APPLICATION_CREDENTIALS: {_scalar('/config/gcloud/application_default_credentials.json')}",
+            "    volumes:",
+            f"      - {_scalar('${CLOUDSDK_CONFIG:-${HOME}/.config/gcloud}:/config/gcloud:ro')}",
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def render_dockerfile(runtime_info: Dict[str, Any], metadata: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """
+    Returns a Dockerfile for building the working tree with BuildKit cache mounts, or None if
+    the runtime is unknown. Dependencies are installed from the manifests alone first, so that
+    layer is rebuilt only when they change.
+    """
+    profile = BUILD_PROFILES.get(runtime_info.get("language"))
+    if not profile or not runtime_info.get("cmd"):
+        return None
+    base, cache_target, manifests = profile
+    metadata = metadata or {}
+    present = [m for m in manifests if m in {runtime_info.get("dependency_file"), runtime_info.get("lockfile")}]
+    lines = [
+        "# syntax=docker/dockerfile:1",
+        f"# {GENERATED_MARKER} (--local-code) for a {runtime_info['language']} project.",
+        f"FROM {base}",
+        "WORKDIR /app",
+    ]
+    cmd = runtime_info["cmd"]
+    tool = cmd.split()[0]
+    if runtime_info["language"] == "python" and tool != "pip":
+        lines.append(f"RUN --mount=type=cache,target={cache_target} pip install {tool}")
+        # Only the manifests are in the image at this point, so skip installing the project itself
+        if tool == "poetry":
+            lines.append("ENV POETRY_VIRTUALENVS_CREATE=false")
+            cmd += " --no-root"
+        elif tool == "uv":
+            lines.append("ENV UV_PROJECT_ENVIRONMENT=/usr/local")
+            cmd += " --no-install-project"
+    if present:
+        lines.append(f"COPY {' '.join(present)} ./")
+    lines.append(f"RUN --mount=type=cache,target={cache_target} {cmd}")
+    lines.append("COPY . .")
+    port = int(metadata.get("port") or 8080)
+    lines += [f"ENV PORT={port}", f"EXPOSE {port}"]
+    if metadata.get("command"):
+        lines.append(f"ENTRYPOINT {json.dumps(metadata['command'])}")
+    if metadata.get("args"):
+        lines.append(f"CMD {json.dumps(metadata['args'])}")
+    return "\n".join(lines) + "\n"
+
+
+def _generated(path: str) -> bool:
+    """True if the file at `path` was written by `ag pull` (its first lines carry the marker)."""
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            head = f.read(512)
+    except OSError:
+        return False
+    return any(GENERATED_MARKER in line for line in head.splitlines()[:2])
+
+
+def write_compose(project_path: str, content: str, dockerfile: Optional[str] = None, force: bool = False) -> List[str]:
+    """
+    Writes the compose file (and a generated Dockerfile, if any). Returns the paths written.
+    Raises ComposeError, before writing anything, if a target exists and was not generated by
+    `ag pull`, unless `force` is set.
+    """
+    files = [(os.path.join(project_path, DOCKERFILE), dockerfile)] if dockerfile is not None else []
+    files.append((os.path.join(project_path, COMPOSE_FILE), content))
+    if not force:
+        existing = [path for path, _ in files if os.path.exists(path) and not _generated(path)]
+        if existing:
+            names = ", ".join(os.path.basename(path) for path in existing)
+            raise ComposeError(f"refusing to overwrite {names}, which ag did not generate; pass --force to replace it")
+    written = []
+    for path, text in files:
+        with open(path, "w") as f:
+            f.write(text)
+        written.append(path)
+    return written
+
+
+def ensure_image(image: str) -> bool:
+    """
+    Pulls the image into the local Docker image cache unless it is already there.
+    Returns False if Docker is unavailable or the pull failed.
+    """
+    try:
+        import docker
+        from docker.errors import DockerException, ImageNotFound
+    except ImportError:
+        return False
+    try:
+        client = docker.from_env()
+        try:
+            client.images.get(image)
+            return True
+        except ImageNotFound:
+            repo, _, digest = image.partition("@")
+            client.images.pull(repo, tag=digest or None)
+            return True
+    except DockerException:
+        return False
@@ -1,36 +1,171 @@
+import base64
 import subprocess
 import shutil
 import os
-from typing import List, Dict, Optional
-from rich.console import Console
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Any, Tuple, Deque
+
+from .ports import PortAllocator, PortReservation
+from .profiling import profiled, profiler
+from .console import console
+
+
+# Readiness polling backoff (seconds)
+READY_BACKOFF_START = 0.05
+READY_BACKOFF_MAX = 1.0
+# Restart backoff for proxies that keep crashing (seconds)
+RESTART_BACKOFF_START = 1.0
+RESTART_BACKOFF_MAX = 30.0
+# Consecutive crashes after which a proxy is given up on
+MAX_CONSECUTIVE_FAILURES = 5
+# cloud-sql-proxy logs this once its listeners are up and the instance connection is set up
+# (v1 capitalizes "Ready"); the port already accepts connections before that
+READY_LOG_MARKER = "ready for new connections"
+# How a proxy reports that its port was taken (Linux/macOS, Windows)
+PORT_IN_USE_MARKERS = ("address already in use", "only one usage of each socket address")
+# Times a proxy is moved to a newly allocated port when its port was taken before it bound it
+PORT_RETRIES = 3
+# Proxies listen on loopback only
+PROXY_HOST = "127.0.0.1"
+
+
+def proxy_env(instances: List[str], ports: Dict[str, int]) -> Dict[str, str]:
+    """
+    Returns DB_HOST / DB_PORT pointing at the local proxy for a service that uses exactly one
+    Cloud SQL instance. They replace the deployed values (e.g. a /cloudsql/... socket), which do
+    not resolve locally. With several instances there is no single right answer, so nothing is set.
+    """
+    if len(set(instances)) != 1 or instances[0] not in ports:
+        return {}
+    return {"DB_HOST": PROXY_HOST, "DB_PORT": str(ports[instances[0]])}
+
+class ProxyProcess:
+    """
+    One cloud-sql-proxy process serving a single instance on a fixed local port.
+    Its combined stdout/stderr is kept in a ring buffer of the last `log_lines` lines, which is
+    also where readiness is read from.
+    """
+
+    def __init__(self, instance: str, port: int, reservation: Optional[PortReservation] = None, log_lines: int = 500):
+        self.instance = instance
+        self.port = port
+        self.reservation = reservation
+        self.logs: Deque[str] = deque(maxlen=log_lines)
+        self.process: Optional[subprocess.Popen] = None
+        self.restarts = 0
+        self.ready_latency: Optional[float] = None
+        self.started_at = 0.0
+        self.next_restart_at = 0.0
+        self.restart_delay = RESTART_BACKOFF_START
+        self.failures = 0
+        self.failed = False
+        self._ready = threading.Event()
+        self._reader: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self.reservation and self.reservation.held:
+            # The proxy binds the port itself, so hand it over right before spawning (see PortReservation)
+            self.reservation.release()
+        # v2 accepts per-instance query parameters: 'instance?port=5432'
+        cmd = ["cloud-sql-proxy", f"{self.instance}?port={self.port}"]
+        profiler.count("subprocesses")
+        self.process = subprocess.Popen(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+            text=True, errors="replace",
+        )
+        self.started_at = time.monotonic()
+        self._ready = threading.Event()
+        self._reader = threading.Thread(target=self._collect_logs, args=(self.process, self._ready), daemon=True)
+        self._reader.start()
+
+    def _collect_logs(self, process: subprocess.Popen, ready: threading.Event) -> None:
+        for line in process.stdout:
+            self.logs.append(line.rstrip("\n"))
+            if READY_LOG_MARKER in line.lower():
+                ready.set()
+
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def lost_port(self) -> bool:
+        """True if the process exited because its port was already taken (EADDRINUSE)."""
+        if self.alive():
+            return False
+        if self._reader:
+            self._reader.join(1.0)  # the last lines may still be in the pipe
+        return any(marker in line.lower() for line in self.logs for marker in PORT_IN_USE_MARKERS)
+
+    def wait_ready(self, timeout: float) -> bool:
+        """
+        Waits until the proxy logs that it is ready for new connections, checking that the
+        process is still running with exponential backoff. Gives up early if the process exits.
+        A listening port alone is not enough: v2 binds it before IAM/TLS setup has succeeded.
+        """
+        started = time.perf_counter()
+        deadline = started + timeout
+        delay = READY_BACKOFF_START
+        ready = self._ready
+        while time.perf_counter() < deadline:
+            if ready.wait(min(delay, max(0.0, deadline - time.perf_counter()))):
+                self.ready_latency = time.perf_counter() - started
+                return True
+            if not self.alive():
+                # The last lines may still be in the pipe
+                return ready.wait(0.1) and self.alive()
+            delay = min(delay * 2, READY_BACKOFF_MAX)
+        return False
+
+    def terminate(self, timeout: float = 5.0) -> None:
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
 
-console = Console()
 
 class ProxyManager:
-    def __init__(self):
-        self.proxy_process: Optional[subprocess.Popen] = None
+    """
+    Starts one cloud-sql-proxy per Cloud SQL instance, waits until each proxy reports that it is
+    ready for new connections, and supervises the processes in the background: a proxy that dies
+    is restarted on the same port (with backoff if it keeps crashing), and given up on after
+    MAX_CONSECUTIVE_FAILURES crashes in a row.
+    """
+
+    def __init__(self, allocator: Optional[PortAllocator] = None, ready_timeout: float = 30.0, supervise_interval: float = 1.0):
+        self.allocator = allocator or PortAllocator()
+        self.ready_timeout = ready_timeout
+        self.supervise_interval = supervise_interval
+        self.proxies: Dict[str, ProxyProcess] = {}
+        self._lock = threading.Lock()
+        # Held from the "already running?" check until new proxies are registered and ready, so
+        # concurrent callers (daemon attaches) never start a second proxy for the same instance
+        self._start_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._supervisor: Optional[threading.Thread] = None
 
     def check_installed(self) -> bool:
         return shutil.which("cloud-sql-proxy") is not None
 
-
-
     def get_free_port(self, start_port: int = 5432) -> int:
-        """Finds the first available port starting from start_port."""
-        import socket
-        port = start_port
-        while port < 65535:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                if s.connect_ex(('localhost', port)) != 0:
-                    return port
-                port += 1
-        return start_port # Fallback, though unlikely to happen
+        """Finds the first port starting from start_port that can actually be bound."""
+        port = self.allocator.find_free(start_port)
+        return port if port is not None else start_port # Fallback, though unlikely to happen
 
+    @profiled()
     def start_cloud_sql_proxy(self, instances: List[str], port_start: int = 5432) -> Dict[str, int]:
         """
-        Starts cloud-sql-proxy for the given instances.
+        Starts cloud-sql-proxy for the given instances and waits until they are ready.
         Returns a mapping of instance connection name to local port.
-        Automatically finds free ports if default is taken.
+        Ports are reserved by binding them (reusing each instance's port from the last run
+        when it is free) and held until just before each proxy starts. A proxy whose port was
+        taken in between is started again on a newly allocated port (up to PORT_RETRIES times).
+        Instances that already have a proxy are reused (one that was given up on is started
+        again); concurrent calls are serialized.
         """
         if not instances:
             return {}
@@ -39,61 +174,225 @@ class ProxyManager:
             console.print("[bold yellow]⚠️ 'cloud-sql-proxy' not found.[/bold yellow] Please install it to access Cloud SQL.")
             return {}
 
-        instance_args = []
-        mapping = {}
-        current_port = port_start
-        
-        console.print(f"[bold blue]ℹ️[/bold blue] Starting Cloud SQL Proxy for {len(instances)} instances...")
+        with self._start_lock:
+            with self._lock:
+                new_instances = [i for i in dict.fromkeys(instances) if i not in self.proxies or self.proxies[i].failed]
+            for instance in new_instances:
+                self.stop_instance(instance)
+            if new_instances:
+                console.print(f"[bold blue]ℹ️[/bold blue] Starting Cloud SQL Proxy for {len(new_instances)} instances...")
+                try:
+                    reservations = self.allocator.allocate(new_instances, port_start)
+                except RuntimeError as e:
+                    console.print(f"[red]Failed to reserve local ports: {e}[/red]")
+                    return {}
 
-        for instance in instances:
-            # Find a free port for this instance
-            port = self.get_free_port(current_port)
-            mapping[instance] = port
-            
-            # Prepare arguments for this instance (v2 syntax checks needed for multi-instance)
-            # For simplicity/robustness in this MVP, we might need one proxy process per instance 
-            # OR use the --port flag carefully if supported for multiple.
-            # 'cloud-sql-proxy instance-name?port=5432' is v1 syntax.
-            # v2 uses: ./cloud-sql-proxy instance-name --port 5432
-            # To avoid complexity allow one instance for now or standard config.
-            
-            # Let's use the v1 syntax as it is often still supported or use the standard auto-assign if possible.
-            # Actually, let's just use the `get_free_port` to find a port and tell the user.
-            
-            # For the purpose of this implementation, we will assume we are starting one proxy 
-            # that handles all, or we loop. 
-            # Re-reading: "The Fix: ... detects this and assigns a random port or asks the user."
-            
-            instance_args.append(f"{instance}?port={port}") 
-            current_port = port + 1
-
-        cmd = ["cloud-sql-proxy"] + instance_args
-        
-        try:
-             # run in background
-             self.proxy_process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-             console.print(f"[green]✓[/green] Proxy started. Mapped {', '.join([f'{k}->{v}' for k,v in mapping.items()])}")
-             return mapping
-        except Exception as e:
-            console.print(f"[red]Failed to start proxy: {e}[/red]")
-            return {}
+                for attempt in range(PORT_RETRIES + 1):
+                    collided = self._wait_ready(self._spawn(reservations), retry_ports=attempt < PORT_RETRIES)
+                    if not collided:
+                        break
+                    # The port was free when reserved but taken before the proxy bound it
+                    for proxy in collided:
+                        self.stop_instance(proxy.instance)
+                    try:
+                        reservations = self.allocator.allocate([p.instance for p in collided], port_start)
+                    except RuntimeError as e:
+                        console.print(f"[red]Failed to reserve local ports: {e}[/red]")
+                        break
+                    for proxy in collided:
+                        console.print(f"[yellow]⚠️ Port {proxy.port} was taken before the proxy for {proxy.instance} could bind it; retrying on {reservations[proxy.instance].port}.[/yellow]")
+                self._ensure_supervisor()
+
+        with self._lock:
+            return {i: self.proxies[i].port for i in instances if i in self.proxies}
+
+    def _spawn(self, reservations: Dict[str, PortReservation]) -> List["ProxyProcess"]:
+        """Starts and registers a proxy per reservation. Returns the ones that started."""
+        started: List[ProxyProcess] = []
+        for instance, reservation in reservations.items():
+            proxy = ProxyProcess(instance, reservation.port, reservation)
+            try:
+                proxy.start()
+            except Exception as e:
+                console.print(f"[red]Failed to start proxy for {instance}: {e}[/red]")
+                self.allocator.release({instance: reservation})
+                continue
+            started.append(proxy)
+            with self._lock:
+                self.proxies[instance] = proxy
+        return started
+
+    @profiled()
+    def _wait_ready(self, proxies: List["ProxyProcess"], retry_ports: bool = False) -> List["ProxyProcess"]:
+        """
+        Checks every new proxy concurrently and reports per-instance startup latency.
+        With `retry_ports`, proxies that exited because their port was taken are returned
+        (unreported) for the caller to move to another port.
+        """
+        if not proxies:
+            return []
+        with ThreadPoolExecutor(max_workers=len(proxies)) as pool:
+            ready = list(pool.map(lambda p: p.wait_ready(self.ready_timeout), proxies))
+        collided = []
+        for proxy, ok in zip(proxies, ready):
+            if not ok and retry_ports and proxy.lost_port():
+                collided.append(proxy)
+            elif ok:
+                console.print(f"[green]✓[/green] Proxy ready: {proxy.instance} -> {proxy.port} [gray]({proxy.ready_latency:.2f}s)[/gray]")
+            elif proxy.alive():
+                console.print(f"[yellow]⚠️ Proxy for {proxy.instance} did not report ready on {proxy.port} after {self.ready_timeout:.0f}s.[/yellow]")
+                for line in list(proxy.logs)[-5:]:
+                    console.print(f"[gray]   {line}[/gray]")
+            else:
+                console.print(f"[red]Proxy for {proxy.instance} exited during startup.[/red]")
+                for line in list(proxy.logs)[-5:]:
+                    console.print(f"[gray]   {line}[/gray]")
+        return collided
+
+    # --- Supervision ---
+
+    def _ensure_supervisor(self) -> None:
+        if self._supervisor is None or not self._supervisor.is_alive():
+            self._stopping.clear()
+            self._supervisor = threading.Thread(target=self._supervise, daemon=True)
+            self._supervisor.start()
+
+    def _supervise(self) -> None:
+        while not self._stopping.wait(self.supervise_interval):
+            with self._lock:
+                proxies = list(self.proxies.values())
+            for proxy in proxies:
+                if self._stopping.is_set():
+                    return
+                if proxy.failed:
+                    continue
+                if proxy.alive():
+                    if time.monotonic() - proxy.started_at > RESTART_BACKOFF_MAX:
+                        # Stable again; forget earlier crashes
+                        proxy.restart_delay = RESTART_BACKOFF_START
+                        proxy.failures = 0
+                    continue
+                now = time.monotonic()
+                if now < proxy.next_restart_at:
+                    continue
+                proxy.failures += 1
+                if proxy.failures >= MAX_CONSECUTIVE_FAILURES:
+                    proxy.failed = True
+                    proxy.logs.append(f"[ground-control] proxy crashed {proxy.failures} times in a row; giving up")
+                    console.print(f"\n[red]Proxy for {proxy.instance} crashed {proxy.failures} times in a row; not restarting it.[/red]")
+                    output = [line for line in proxy.logs if not line.startswith("[ground-control]")]
+                    for line in output[-5:]:
+                        console.print(f"[gray]   {line}[/gray]")
+                    continue
+                proxy.logs.append(f"[ground-control] proxy exited with code {proxy.process.returncode if proxy.process else None}; restarting on port {proxy.port}")
+                try:
+                    proxy.start()
+                    proxy.restarts += 1
+                except Exception as e:
+                    proxy.logs.append(f"[ground-control] restart failed: {e}")
+                # Back off if the proxy keeps crashing
+                proxy.next_restart_at = now + proxy.restart_delay
+                proxy.restart_delay = min(proxy.restart_delay * 2, RESTART_BACKOFF_MAX)
+
+    def status(self) -> List[Dict[str, Any]]:
+        """Returns a summary row per proxy (instance, port, alive, restarts, failed, ready latency)."""
+        with self._lock:
+            proxies = list(self.proxies.values())
+        return [
+            {
+                "instance": p.instance,
+                "port": p.port,
+                "alive": p.alive(),
+                "pid": p.process.pid if p.process else None,
+                "restarts": p.restarts,
+                "failed": p.failed,
+                "ready_latency": p.ready_latency,
+            }
+            for p in proxies
+        ]
+
+    def logs(self, instance: Optional[str] = None) -> Dict[str, List[str]]:
+        """Returns the buffered log lines, per instance."""
+        with self._lock:
+            proxies = [p for p in self.proxies.values() if instance is None or p.instance == instance]
+        return {p.instance: list(p.logs) for p in proxies}
+
+    # --- Shutdown ---
+
+    def stop_instance(self, instance: str) -> None:
+        with self._lock:
+            proxy = self.proxies.pop(instance, None)
+        if proxy:
+            proxy.terminate()
+            if proxy.reservation:
+                self.allocator.release({instance: proxy.reservation})
 
     def stop(self):
-        if self.proxy_process:
-            self.proxy_process.terminate()
+        self._stopping.set()
+        with self._lock:
+            instances = list(self.proxies)
+        for instance in instances:
+            self.stop_instance(instance)
+        if instances:
             console.print("[gray]Proxy stopped.[/gray]")
 
+
+class RestSecretClient:
+    """
+    Secret Manager client speaking the REST API (`versions/*:access`) over a ground-control
+    transport. Used when SecretManager is pointed at another endpoint, e.g. a local fake.
+    """
+
+    def __init__(self, endpoint: str, transport: Optional[Any] = None):
+        from .providers.gcp_api import UrllibTransport
+        self.endpoint = endpoint.rstrip("/")
+        self.transport = transport or UrllibTransport()
+
+    def access_secret_version(self, request: Dict[str, str]) -> Any:
+        from .providers.gcp_api import TransportError
+        url = f"{self.endpoint}/v1/{request['name']}:access"
+        resp = self.transport.request("GET", url)
+        if resp.status >= 400:
+            raise TransportError(f"GET {url} returned {resp.status}", status=resp.status)
+        data = base64.b64decode(resp.json().get("payload", {}).get("data", ""))
+        return SimpleNamespace(payload=SimpleNamespace(data=data))
+
+
 class SecretManager:
-    def __init__(self, project_id: str):
+    def __init__(self, project_id: str, max_workers: int = 16, endpoint: Optional[str] = None):
         self.project_id = project_id
-    
+        self.max_workers = max_workers
+        # Optional REST endpoint override (defaults to AG_SECRET_MANAGER_ENDPOINT); gRPC otherwise
+        self.endpoint = endpoint or os.environ.get("AG_SECRET_MANAGER_ENDPOINT")
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    def _get_client(self):
+        """
+        Returns a shared Secret Manager client.
+        Building the client (auth + gRPC channel) is the expensive part, so it is done once per instance.
+        """
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    if self.endpoint:
+                        self._client = RestSecretClient(self.endpoint)
+                    else:
+                        from google.cloud import secretmanager
+                        self._client = secretmanager.SecretManagerServiceClient()
+        return self._client
+
+    def _access(self, secret_id: str, version_id: str) -> str:
+        name = f"projects/{self.project_id}/secrets/{secret_id}/versions/{version_id}"
+        with profiler.span("SecretManager.access_secret_version", "rpc"):
+            response = self._get_client().access_secret_version(request={"name": name})
+            profiler.count("rpcs", nbytes=len(response.payload.data))
+        return response.payload.data.decode("UTF-8")
+
+    @profiled()
     def fetch_secret(self, secret_id: str, version_id: str = "latest") -> Optional[str]:
         try:
-            from google.cloud import secretmanager
-            client = secretmanager.SecretManagerServiceClient()
-            name = f"projects/{self.project_id}/secrets/{secret_id}/versions/{version_id}"
-            response = client.access_secret_version(request={"name": name})
-            return response.payload.data.decode("UTF-8")
+            return self._access(secret_id, version_id)
         except ImportError:
             console.print("[red]google-cloud-secret-manager not installed.[/red]")
             return None
@@ -101,3 +400,46 @@ class SecretManager:
             # handle permission denied etc
             console.print(f"[yellow]Could not access secret {secret_id}: {e}[/yellow]")
             return None
+
+    @profiled()
+    def fetch_many(self, secrets: Dict[str, Dict[str, str]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Fetches many secrets concurrently over a single client.
+        `secrets` maps env var names to {"secret": ..., "version": ...} references,
+        as returned by GCPProvider.extract_metadata. Each distinct (secret, version)
+        pair is fetched only once.
+        Returns a mapping of env var name to {"value": Optional[str], "error": Optional[str]}.
+        """
+        if not secrets:
+            return {}
+
+        pairs: Dict[Tuple[str, str], List[str]] = {}
+        for env_name, secret_info in secrets.items():
+            key = (secret_info["secret"], secret_info.get("version") or "latest")
+            pairs.setdefault(key, []).append(env_name)
+
+        try:
+            self._get_client()
+        except ImportError:
+            console.print("[red]google-cloud-secret-manager not installed.[/red]")
+            return {name: {"value": None, "error": "google-cloud-secret-manager not installed"} for name in secrets}
+        except Exception as e:
+            # e.g. DefaultCredentialsError: degrade per secret rather than abort the pull
+            return {name: {"value": None, "error": str(e)} for name in secrets}
+
+        def fetch(key: Tuple[str, str]) -> Dict[str, Any]:
+            try:
+                return {"value": self._access(*key), "error": None}
+            except Exception as e:
+                return {"value": None, "error": str(e)}
+
+        workers = max(1, min(self.max_workers, len(pairs)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            fetched = dict(zip(pairs, pool.map(fetch, pairs)))
+
+        results: Dict[str, Dict[str, Any]] = {}
+        for key, env_names in pairs.items():
+            for env_name in env_names:
+                results[env_name] = fetched[key]
+        # Preserve the caller's ordering
+        return {name: results[name] for name in secrets}
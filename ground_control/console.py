@@ -0,0 +1,32 @@
+"""
+The rich Console shared by every module, created on first use.
+
+Importing rich.console costs tens of milliseconds, so commands that never print
+(or only print --version) should not pay for it at import time.
+"""
+import threading
+from typing import Any
+
+_lock = threading.Lock()
+_console = None
+
+
+def get_console() -> Any:
+    """Returns the shared rich Console, creating it on first call."""
+    global _console
+    if _console is None:
+        with _lock:
+            if _console is None:
+                from rich.console import Console
+                _console = Console()
+    return _console
+
+
+class LazyConsole:
+    """Stand-in for a rich Console that builds the real one on first attribute access."""
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(get_console(), name)
+
+
+console = LazyConsole()
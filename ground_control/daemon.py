@@ -0,0 +1,342 @@
+from typing import Any, Dict, List, Optional
+import json
+import os
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+from .cache import cache_root, runtime_dir
+from .connectivity import ProxyManager
+from .ports import _pid_alive
+from .console import console
+
+
+# Proxies nobody is attached to are stopped after this long; the daemon exits once it has been idle as long.
+DEFAULT_IDLE_TIMEOUT = 15 * 60
+SWEEP_INTERVAL = 5.0
+PROTOCOL_VERSION = 1
+
+
+def default_socket_path() -> str:
+    return os.environ.get("AG_DAEMON_SOCKET") or os.path.join(runtime_dir(), "agd.sock")
+
+
+def default_log_path() -> str:
+    return os.path.join(cache_root(), "agd.log")
+
+
+class DaemonError(Exception):
+    """Raised when the daemon cannot be reached or rejects a request."""
+
+
+class AgDaemon:
+    """
+    Long-lived process that owns Cloud SQL proxies and cached service context.
+
+    Shells attach to proxies through leases. A proxy stays up while any live lease references
+    it, and is stopped once it has been unreferenced for `idle_timeout` seconds. Leases are tied
+    to a client pid, so a shell that dies without detaching does not pin proxies forever.
+    """
+
+    def __init__(self, socket_path: Optional[str] = None, idle_timeout: float = DEFAULT_IDLE_TIMEOUT):
+        self.socket_path = socket_path or default_socket_path()
+        self.idle_timeout = idle_timeout
+        self.proxy_manager = ProxyManager()
+        self.leases: Dict[str, Dict[str, Any]] = {}
+        self.unreferenced_since: Dict[str, float] = {}
+        self.contexts: Dict[str, Any] = {}
+        self.started_at = time.time()
+        self.idle_since: Optional[float] = time.monotonic()
+        self._lock = threading.RLock()
+        self._server: Optional[socketserver.ThreadingUnixStreamServer] = None
+
+    # --- Reference counting ---
+
+    def refcounts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        with self._lock:
+            for lease in self.leases.values():
+                for instance in lease["instances"]:
+                    counts[instance] = counts.get(instance, 0) + 1
+        return counts
+
+    def attach(self, instances: List[str], pid: Optional[int] = None) -> Dict[str, Any]:
+        with self._lock:
+            # Keep a sweep from stopping an idle proxy this attach is about to reuse
+            for instance in instances:
+                self.unreferenced_since.pop(instance, None)
+        # Concurrent attaches of the same instance share one proxy (starts are serialized)
+        ports = self.proxy_manager.start_cloud_sql_proxy(instances) if instances else {}
+        lease_id = uuid.uuid4().hex
+        with self._lock:
+            self.leases[lease_id] = {"instances": list(ports), "pid": pid, "created_at": time.time()}
+            for instance in ports:
+                self.unreferenced_since.pop(instance, None)
+            self.idle_since = None
+        missing = [i for i in instances if i not in ports]
+        return {"lease": lease_id, "ports": ports, "missing": missing}
+
+    def release(self, lease_id: str) -> Dict[str, Any]:
+        with self._lock:
+            lease = self.leases.pop(lease_id, None)
+        self._mark_unreferenced()
+        return {"released": lease is not None}
+
+    def _mark_unreferenced(self) -> None:
+        counts = self.refcounts()
+        now = time.monotonic()
+        with self._lock:
+            for row in self.proxy_manager.status():
+                if counts.get(row["instance"], 0) == 0:
+                    self.unreferenced_since.setdefault(row["instance"], now)
+
+    def sweep(self) -> None:
+        """Drops leases of dead clients and stops proxies that have been idle too long."""
+        with self._lock:
+            for lease_id, lease in list(self.leases.items()):
+                if lease["pid"] and not _pid_alive(lease["pid"]):
+                    del self.leases[lease_id]
+        self._mark_unreferenced()
+
+        now = time.monotonic()
+        with self._lock:
+            expired = [i for i, since in self.unreferenced_since.items() if now - since >= self.idle_timeout]
+            for instance in expired:
+                del self.unreferenced_since[instance]
+        for instance in expired:
+            self.proxy_manager.stop_instance(instance)
+
+        with self._lock:
+            busy = bool(self.leases) or bool(self.proxy_manager.status())
+            if busy:
+                self.idle_since = None
+            elif self.idle_since is None:
+                self.idle_since = now
+            if self.idle_since is not None and now - self.idle_since >= self.idle_timeout:
+                self.shutdown()
+
+    # --- Requests ---
+
+    def handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        op = request.get("op")
+        if op == "attach":
+            return self.attach(request.get("instances", []), request.get("pid"))
+        if op == "release":
+            return self.release(request.get("lease", ""))
+        if op == "list":
+            counts = self.refcounts()
+            proxies = self.proxy_manager.status()
+            for row in proxies:
+                row["refcount"] = counts.get(row["instance"], 0)
+            return {"proxies": proxies}
+        if op == "status":
+            with self._lock:
+                leases = len(self.leases)
+                contexts = sorted(self.contexts)
+            return {
+                "pid": os.getpid(),
+                "version": PROTOCOL_VERSION,
+                "uptime": time.time() - self.started_at,
+                "leases": leases,
+                "proxies": len(self.proxy_manager.status()),
+                "contexts": contexts,
+                "idle_timeout": self.idle_timeout,
+            }
+        if op == "logs":
+            return {"logs": self.proxy_manager.logs(request.get("instance"))}
+        if op == "context.put":
+            with self._lock:
+                self.contexts[request["key"]] = request.get("value")
+            return {}
+        if op == "context.get":
+            with self._lock:
+                return {"value": self.contexts.get(request["key"])}
+        if op == "stop":
+            instance = request.get("instance")
+            if instance:
+                self.proxy_manager.stop_instance(instance)
+                return {"stopped": [instance]}
+            threading.Thread(target=self.shutdown, daemon=True).start()
+            return {"stopped": "daemon"}
+        raise DaemonError(f"Unknown op '{op}'")
+
+    # --- Lifecycle ---
+
+    def serve_forever(self) -> None:
+        os.makedirs(os.path.dirname(self.socket_path), mode=0o700, exist_ok=True)
+        if os.path.exists(self.socket_path):
+            if DaemonClient(self.socket_path).ping():
+                raise DaemonError(f"A daemon is already listening on {self.socket_path}")
+            os.remove(self.socket_path)
+
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    try:
+                        response = {"ok": True, **daemon.handle(json.loads(line))}
+                    except Exception as e:
+                        response = {"ok": False, "error": str(e)}
+                    self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+                    self.wfile.flush()
+
+        old_umask = os.umask(0o177)
+        try:
+            self._server = socketserver.ThreadingUnixStreamServer(self.socket_path, Handler)
+        finally:
+            os.umask(old_umask)
+        self._server.daemon_threads = True
+
+        def sweeper():
+            while self._server is not None:
+                time.sleep(SWEEP_INTERVAL)
+                try:
+                    self.sweep()
+                except Exception as e:
+                    console.print(f"[red]Sweep failed: {e}[/red]")
+
+        threading.Thread(target=sweeper, daemon=True).start()
+        console.print(f"[green]✓[/green] ag daemon listening on {self.socket_path} (pid {os.getpid()})")
+        try:
+            self._server.serve_forever()
+        finally:
+            self.proxy_manager.stop()
+            try:
+                os.remove(self.socket_path)
+            except OSError:
+                pass
+
+    def shutdown(self) -> None:
+        server, self._server = self._server, None
+        if server:
+            server.shutdown()
+
+
+class DaemonClient:
+    """
+    Client for the daemon's line-delimited JSON control socket.
+    """
+
+    def __init__(self, socket_path: Optional[str] = None, timeout: float = 60.0):
+        self.socket_path = socket_path or default_socket_path()
+        self.timeout = timeout
+
+    def call(self, op: str, **params) -> Dict[str, Any]:
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+                s.settimeout(self.timeout)
+                s.connect(self.socket_path)
+                s.sendall((json.dumps({"op": op, **params}) + "\n").encode("utf-8"))
+                data = b""
+                while not data.endswith(b"\n"):
+                    chunk = s.recv(65536)
+                    if not chunk:
+                        break
+                    data += chunk
+        except OSError as e:
+            raise DaemonError(f"Cannot reach ag daemon at {self.socket_path}: {e}")
+        if not data:
+            raise DaemonError("ag daemon closed the connection")
+        response = json.loads(data)
+        if not response.pop("ok", False):
+            raise DaemonError(response.get("error", "unknown error"))
+        return response
+
+    def ping(self) -> bool:
+        try:
+            self.call("status")
+            return True
+        except DaemonError:
+            return False
+
+    def ensure_running(self, idle_timeout: float = DEFAULT_IDLE_TIMEOUT, wait: float = 10.0) -> None:
+        """Starts a detached daemon if none is reachable, and waits for its socket."""
+        if self.ping():
+            return
+        os.makedirs(os.path.dirname(default_log_path()), exist_ok=True)
+        with open(default_log_path(), "a") as log:
+            subprocess.Popen(
+                [sys.executable, "-m", "ground_control.daemon", "--socket", self.socket_path, "--idle-timeout", str(idle_timeout)],
+                stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT,
+                start_new_session=True,
+            )
+        deadline = time.monotonic() + wait
+        while time.monotonic() < deadline:
+            if self.ping():
+                return
+            time.sleep(0.1)
+        raise DaemonError(f"ag daemon did not start; see {default_log_path()}")
+
+
+class DaemonProxyManager:
+    """
+    ProxyManager stand-in for `pull --daemon`: proxies live in the daemon and this
+    session only holds leases on them (one per attach). `stop()` releases them, leaving warm proxies behind.
+    """
+
+    def __init__(self, client: DaemonClient, pid: Optional[int] = None):
+        self.client = client
+        self.pid = pid or os.getpid()
+        self.leases: Dict[str, List[str]] = {}
+
+    def start_cloud_sql_proxy(self, instances: List[str], port_start: int = 5432) -> Dict[str, int]:
+        response = self.client.call("attach", instances=instances, pid=self.pid)
+        self.leases[response["lease"]] = list(instances)
+        for instance in response.get("missing", []):
+            console.print(f"[red]Daemon could not start a proxy for {instance}.[/red]")
+        console.print(f"[green]✓[/green] Attached to daemon proxies: {', '.join(f'{k}->{v}' for k, v in response['ports'].items())}")
+        return response["ports"]
+
+    def status(self) -> List[Dict[str, Any]]:
+        try:
+            return self.client.call("list")["proxies"]
+        except DaemonError:
+            return []
+
+    def stop_instance(self, instance: str) -> None:
+        """
+        Stops holding the instance's proxy; the daemon idles it out once no session leases it.
+        Other instances on the same lease are re-attached under a new lease first.
+        """
+        for lease, instances in list(self.leases.items()):
+            if instance not in instances:
+                continue
+            remaining = [i for i in instances if i != instance]
+            if remaining:
+                try:
+                    response = self.client.call("attach", instances=remaining, pid=self.pid)
+                    self.leases[response["lease"]] = remaining
+                except DaemonError:
+                    continue  # keep the old lease rather than drop the other proxies
+            self._release(lease)
+
+    def _release(self, lease: str) -> None:
+        try:
+            self.client.call("release", lease=lease)
+        except DaemonError:
+            pass
+        self.leases.pop(lease, None)
+
+    def stop(self):
+        if self.leases:
+            for lease in list(self.leases):
+                self._release(lease)
+            console.print("[gray]Detached from daemon proxies (kept warm).[/gray]")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    import argparse
+    parser = argparse.ArgumentParser(prog="ag-daemon", description="Ground Control background daemon.")
+    parser.add_argument("--socket", default=None)
+    parser.add_argument("--idle-timeout", type=float, default=DEFAULT_IDLE_TIMEOUT)
+    args = parser.parse_args(argv)
+    AgDaemon(args.socket, args.idle_timeout).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+"""
+Dependency environment cache for `ag pull`.
+
+Installed dependencies are cached once per runtime, toolchain and lockfile (or manifest) content
+hash, so a repeat pull of the same code links a prebuilt environment instead of installing:
+
+    python  a virtualenv, linked as <project>/.venv
+    node    a node_modules tree, linked as <project>/node_modules
+    go      a module cache, exported as GOMODCACHE
+
+Entries live under <cache root>/deps/<key>/ with a meta.json written last, so an interrupted
+build is never mistaken for a usable one. Builds of the same key are serialized on a file lock.
+When the cache outgrows its disk budget, the least recently used entries are removed.
+"""
+from typing import Any, Dict, List, Optional
+import hashlib
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from .cache import cache_root
+from .profiling import profiler
+
+try:
+    import fcntl
+except ImportError:  # Windows: builds of the same key are not serialized
+    fcntl = None
+
+DEFAULT_BUDGET_BYTES = 10 * 1024 ** 3
+# Bumped when the way entries are built changes, so older entries are no longer hits
+KEY_VERSION = "2"
+BUILD_TIMEOUT = 30 * 60
+META_FILE = "meta.json"
+
+# language -> (toolchain binary, directory inside the entry, link name in the project, or None)
+LAYOUTS = {
+    "python": ("python3", "venv", ".venv"),
+    "node": ("node", "node_modules", "node_modules"),
+    "go": ("go", "gomod", None),
+}
+
+# Python installers that also install the project itself (editable, pointing at the checkout
+# that built the entry) -> the flag that installs dependencies only. A cached venv is shared by
+# every checkout with the same lockfile, so it must not contain any one checkout's code.
+NO_PROJECT_FLAGS = {
+    "poetry": "--no-root",
+    "uv": "--no-install-project",
+    "pdm": "--no-self",
+}
+
+
+class DependencyCacheError(Exception):
+    """Raised when dependencies cannot be installed into the cache."""
+
+
+def default_budget() -> int:
+    """Disk budget in bytes; AG_DEPS_BUDGET_MB overrides the 10 GiB default."""
+    override = os.environ.get("AG_DEPS_BUDGET_MB")
+    try:
+        return int(float(override) * 1024 * 1024) if override else DEFAULT_BUDGET_BYTES
+    except ValueError:
+        return DEFAULT_BUDGET_BYTES
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, name)).st_size
+            except OSError:
+                continue
+    return total
+
+
+def _toolchain_id(binary: str) -> Optional[str]:
+    """Identifies the installed toolchain by its resolved path and mtime, without running it."""
+    found = shutil.which(binary)
+    if not found:
+        return None
+    real = os.path.realpath(found)
+    try:
+        return f"{real}:{os.stat(real).st_mtime_ns}"
+    except OSError:
+        return real
+
+
+class DependencyCache:
+    """
+    Builds, restores and evicts cached dependency environments for runtimes reported by
+    `RuntimeSynthesizer.detect` (each with language, cmd and manifest/lockfile hashes).
+    """
+
+    def __init__(self, root: Optional[str] = None, budget: Optional[int] = None):
+        self.directory = root or os.path.join(cache_root(), "deps")
+        self.budget = default_budget() if budget is None else budget
+
+    # --- Keys ---
+
+    def key(self, runtime: Dict[str, Any]) -> Optional[str]:
+        """Returns the cache key for a runtime, or None if it cannot be cached."""
+        layout = LAYOUTS.get(runtime.get("language"))
+        content = runtime.get("lockfile_hash") or runtime.get("manifest_hash")
+        if not layout or not content or not runtime.get("cmd"):
+            return None
+        toolchain = _toolchain_id(layout[0])
+        if toolchain is None:
+            return None
+        parts = [KEY_VERSION, runtime["language"], runtime["dependency_file"], runtime.get("lockfile") or "", content, runtime["cmd"], toolchain]
+        return f"{runtime['language']}-{hashlib.sha256(chr(0).join(parts).encode('utf-8')).hexdigest()[:24]}"
+
+    def _entry(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def _meta(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(self._entry(key), META_FILE), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, key: str, meta: Dict[str, Any]) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self._entry(key), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(self._entry(key), META_FILE))
+
+    # --- Lookup & restore ---
+
+    def lookup(self, runtime: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Returns the entry's metadata on a hit, else None."""
+        key = self.key(runtime)
+        return self._meta(key) if key else None
+
+    def restore(self, runtime: Dict[str, Any], project_dir: str, install: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Links the cached environment for `runtime` into its directory under `project_dir`,
+        building it first on a miss if `install` is set.
+
+        Returns {"hit", "linked", "path", "env"} where `env` holds variables to export
+        (VIRTUAL_ENV for Python, GOMODCACHE for Go; callers put $VIRTUAL_ENV/bin on PATH), or None on a miss without `install`
+        or for a runtime that cannot be cached. Raises DependencyCacheError if a build fails.
+        """
+        key = self.key(runtime)
+        if key is None:
+            return None
+        target_dir = os.path.abspath(os.path.join(project_dir, runtime.get("path", ".")))
+        meta = self._meta(key)
+        hit = meta is not None
+        if not hit:
+            if not install:
+                return None
+            meta = self._build(key, runtime, target_dir)
+        meta["last_used"] = time.time()
+        try:
+            self._write_meta(key, meta)
+        except OSError:
+            pass
+
+        _, subdir, link_name = LAYOUTS[runtime["language"]]
+        env_path = os.path.join(self._entry(key), subdir)
+        linked = self._link(env_path, os.path.join(target_dir, link_name)) if link_name else False
+        if not hit:
+            self.prune(keep=key)
+        return {"hit": hit, "linked": linked, "path": env_path, "env": self._env(runtime["language"], env_path)}
+
+    def _env(self, language: str, env_path: str) -> Dict[str, str]:
+        if language == "python":
+            return {"VIRTUAL_ENV": env_path}
+        if language == "go":
+            return {"GOMODCACHE": env_path}
+        return {}
+
+    def _link(self, env_path: str, link_path: str) -> bool:
+        """
+        Points `link_path` at the cached environment. An existing real directory or file is left
+        alone; a symlink (e.g. to an older cache entry) is replaced atomically.
+        """
+        if os.path.lexists(link_path) and not os.path.islink(link_path):
+            return False
+        if os.path.islink(link_path) and os.readlink(link_path) == env_path:
+            return True
+        tmp_link = f"{link_path}.ag-{os.getpid()}"
+        try:
+            os.symlink(env_path, tmp_link)
+            os.replace(tmp_link, link_path)
+        except OSError:
+            try:
+                os.remove(tmp_link)
+            except OSError:
+                pass
+            return False
+        return True
+
+    # --- Build ---
+
+    def _build(self, key: str, runtime: Dict[str, Any], target_dir: str) -> Dict[str, Any]:
+        os.makedirs(self.directory, exist_ok=True)
+        lock_fd = os.open(os.path.join(self.directory, f"{key}.lock"), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if fcntl:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            meta = self._meta(key)
+            if meta is not None:
+                return meta  # another pull built it while we waited
+            entry = self._entry(key)
+            shutil.rmtree(entry, ignore_errors=True)  # leftovers of an interrupted build
+            os.makedirs(entry)
+            started = time.time()
+            try:
+                with profiler.span("DependencyCache.build", "subprocess", language=runtime["language"]):
+                    self._install(entry, runtime, target_dir)
+            except (OSError, subprocess.SubprocessError, DependencyCacheError) as e:
+                shutil.rmtree(entry, ignore_errors=True)
+                raise DependencyCacheError(f"'{runtime['cmd']}' failed in {target_dir}: {e}") from e
+            meta = {
+                "key": key,
+                "language": runtime["language"],
+                "lockfile": runtime.get("lockfile") or runtime["dependency_file"],
+                "cmd": runtime["cmd"],
+                "source": target_dir,
+                "size": _dir_size(entry),
+                "build_seconds": round(time.time() - started, 1),
+                "created": time.time(),
+                "last_used": time.time(),
+            }
+            self._write_meta(key, meta)
+            return meta
+        finally:
+            if fcntl:
+                fcntl.flock(lock_fd, fcntl.LOCK_UN)
+            os.close(lock_fd)
+
+    def _install(self, entry: str, runtime: Dict[str, Any], target_dir: str) -> None:
+        language = runtime["language"]
+        _, subdir, _ = LAYOUTS[language]
+        env_path = os.path.join(entry, subdir)
+        env = os.environ.copy()
+        cwd = target_dir
+
+        if language == "python":
+            # Virtualenvs are not relocatable, so the venv is created at its final path in the cache
+            self._run([shutil.which("python3") or sys.executable, "-m", "venv", env_path], cwd, env)
+            env.update(self._env(language, env_path))
+            env["PATH"] = os.pathsep.join([os.path.join(env_path, "bin"), env.get("PATH", "")])
+            env["UV_PROJECT_ENVIRONMENT"] = env_path
+            env["POETRY_VIRTUALENVS_CREATE"] = "false"
+            env.pop("PYTHONHOME", None)
+        elif language == "node":
+            # Install in a staging copy of the manifest and lockfile so the project's own
+            # node_modules is never touched; the tree is then moved into the entry
+            cwd = os.path.join(entry, "stage")
+            os.makedirs(cwd)
+            for name in (runtime["dependency_file"], runtime.get("lockfile"), ".npmrc"):
+                if name and os.path.exists(os.path.join(target_dir, name)):
+                    shutil.copy2(os.path.join(target_dir, name), cwd)
+        elif language == "go":
+            env["GOMODCACHE"] = env_path
+            env["GOFLAGS"] = " ".join(filter(None, [env.get("GOFLAGS"), "-modcacherw"]))
+
+        cmd = shlex.split(runtime["cmd"])
+        if language == "python" and cmd[0] in NO_PROJECT_FLAGS:
+            cmd.append(NO_PROJECT_FLAGS[cmd[0]])
+        self._run(cmd, cwd, env)
+
+        if language == "node":
+            staged = os.path.join(cwd, "node_modules")
+            if not os.path.isdir(staged):
+                os.makedirs(staged)  # a project without dependencies
+            os.replace(staged, env_path)
+            shutil.rmtree(cwd, ignore_errors=True)
+
+    def _run(self, cmd: List[str], cwd: str, env: Dict[str, str]) -> None:
+        profiler.count("subprocesses")
+        result = subprocess.run(cmd, cwd=cwd, env=env, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT, text=True, timeout=BUILD_TIMEOUT)
+        if result.returncode != 0:
+            tail = "\n".join(result.stdout.strip().splitlines()[-5:])
+            raise DependencyCacheError(f"exit status {result.returncode}\n{tail}")
+
+    # --- Eviction ---
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """Returns the metadata of every complete entry, most recently used first."""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        entries = []
+        for name in names:
+            meta = self._meta(name) if os.path.isdir(self._entry(name)) else None
+            if meta:
+                entries.append(meta)
+        return sorted(entries, key=lambda m: m.get("last_used", 0), reverse=True)
+
+    def prune(self, keep: Optional[str] = None, budget: Optional[int] = None) -> List[str]:
+        """Evicts least recently used entries until the cache fits the budget. Returns evicted keys."""
+        budget = self.budget if budget is None else budget
+        entries = self.entries()
+        total = sum(m.get("size", 0) for m in entries)
+        evicted = []
+        for meta in reversed(entries):
+            if total <= budget:
+                break
+            if meta["key"] == keep:
+                continue
+            self.remove(meta["key"])
+            total -= meta.get("size", 0)
+            evicted.append(meta["key"])
+        return evicted
+
+    def remove(self, key: str) -> None:
+        entry = self._entry(key)
+        # Drop the metadata first so a half-deleted entry is never treated as a hit
+        try:
+            os.remove(os.path.join(entry, META_FILE))
+        except OSError:
+            pass
+        shutil.rmtree(entry, ignore_errors=True)
+        try:
+            os.remove(os.path.join(self.directory, f"{key}.lock"))
+        except OSError:
+            pass
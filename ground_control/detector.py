@@ -1,55 +1,366 @@
+import hashlib
 import os
-from rich.console import Console
-from typing import Dict, Optional, Any
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, List, Optional, Any, Tuple
+
+from .cache import DiskCache
+from .profiling import profiled
+from .console import console
+
+# Directories never worth descending into, whatever .gitignore says
+SKIP_DIRS = {
+    ".git", ".hg", ".svn", "node_modules", ".venv", "venv", "env", "__pycache__", ".tox", ".nox",
+    ".mypy_cache", ".pytest_cache", ".ruff_cache", "site-packages", "vendor", "third_party",
+    "bower_components", ".next", ".nuxt", ".terraform", ".gradle", "target", "dist", "build",
+    ".cache", ".npm", ".yarn", ".pnpm-store", ".cargo", ".rustup", ".local", ".config", ".idea",
+    ".vscode", ".direnv", ".eggs", ".Trash",
+}
+DEFAULT_WORKERS = 8
+# Nested discovery is bounded so that pulling from $HOME or a huge monorepo root stays fast:
+# services deeper than this, or beyond these many directories or seconds, are not reported
+DEFAULT_MAX_DEPTH = 3
+DEFAULT_MAX_DIRS = 2000
+DEFAULT_TIME_BUDGET = 1.0
+CACHE_MAX_AGE = 30 * 24 * 3600
+
+# language -> manifests in order of precedence. Each manifest lists its lockfiles in order of
+# precedence, with the install command to use for each (None: no lockfile).
+MANIFESTS: List[Tuple[str, str, List[Tuple[Optional[str], str]]]] = [
+    ("python", "requirements.txt", [(None, "pip install -r requirements.txt")]),
+    ("python", "pyproject.toml", [
+        ("poetry.lock", "poetry install"),
+        ("uv.lock", "uv sync --frozen"),
+        ("pdm.lock", "pdm install --frozen-lockfile"),
+        (None, "poetry install"),  # assumption
+    ]),
+    ("python", "Pipfile", [("Pipfile.lock", "pipenv install --deploy"), (None, "pipenv install")]),
+    ("node", "package.json", [
+        ("package-lock.json", "npm ci"),
+        ("pnpm-lock.yaml", "pnpm install --frozen-lockfile"),
+        ("yarn.lock", "yarn install --frozen-lockfile"),
+        ("bun.lockb", "bun install --frozen-lockfile"),
+        (None, "npm install"),
+    ]),
+    ("go", "go.mod", [("go.sum", "go mod download"), (None, "go mod download")]),
+]
+TRACKED_FILES = {m for _, m, _ in MANIFESTS} | {l for _, _, locks in MANIFESTS for l, _ in locks if l} | {".gitignore"}
+
+
+def _file_hash(path: str) -> Optional[str]:
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+class GitIgnore:
+    """
+    Minimal .gitignore matcher: comments, negation, directory-only and anchored patterns,
+    `*`, `?`, `[...]` and `**`. Rules from nested .gitignore files apply below their directory.
+    """
+
+    def __init__(self, rules: Optional[List[Tuple[str, "re.Pattern", bool, bool]]] = None):
+        self.rules = rules or []
+
+    def extend(self, base: str, text: str) -> "GitIgnore":
+        rules = list(self.rules)
+        for line in text.splitlines():
+            line = line.rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            if line.startswith("\\"):
+                line = line[1:]
+            dir_only = line.endswith("/")
+            # Only the trailing slash is dropped here: a leading (or middle) one anchors the pattern
+            line = line.rstrip("/")
+            anchored = "/" in line
+            line = line.lstrip("/")
+            if not line:
+                continue
+            regex = self._translate(line)
+            prefix = "" if anchored else "(?:.*/)?"
+            rules.append((base, re.compile(f"^{prefix}{regex}$"), negate, dir_only))
+        return GitIgnore(rules)
+
+    @staticmethod
+    def _translate(pattern: str) -> str:
+        out, i = [], 0
+        while i < len(pattern):
+            if pattern.startswith("**/", i):
+                out.append("(?:.*/)?")
+                i += 3
+            elif pattern.startswith("/**", i) and i + 3 == len(pattern):
+                out.append("/.*")
+                i += 3
+            elif pattern.startswith("**", i):
+                out.append(".*")
+                i += 2
+            elif pattern[i] == "*":
+                out.append("[^/]*")
+                i += 1
+            elif pattern[i] == "?":
+                out.append("[^/]")
+                i += 1
+            elif pattern[i] == "[":
+                end = pattern.find("]", i + 1)
+                if end == -1:
+                    out.append(re.escape(pattern[i]))
+                    i += 1
+                else:
+                    out.append("[" + pattern[i + 1:end].replace("!", "^", 1) + "]")
+                    i = end + 1
+            else:
+                out.append(re.escape(pattern[i]))
+                i += 1
+        return "".join(out)
+
+    def ignored(self, rel: str, is_dir: bool) -> bool:
+        result = False
+        for base, regex, negate, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if base:
+                if not rel.startswith(base + "/"):
+                    continue
+                candidate = rel[len(base) + 1:]
+            else:
+                candidate = rel
+            if regex.match(candidate):
+                result = not negate
+        return result
 
-console = Console()
 
 class RuntimeSynthesizer:
-    def detect(self, path: str) -> Dict[str, Any]:
+    """
+    Detects runtimes for a project directory, including every service of a monorepo.
+
+    The tree is walked in parallel, honouring .gitignore files and skipping vendored and virtualenv
+    directories, down to `max_depth` levels and within `max_dirs` directories and `time_budget`
+    seconds. Per-directory results are cached together with the directory's mtime and the
+    mtime/size/hash of its manifests and lockfiles, so later runs only re-read directories that changed.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_WORKERS,
+        use_cache: bool = True,
+        max_depth: int = DEFAULT_MAX_DEPTH,
+        max_dirs: int = DEFAULT_MAX_DIRS,
+        time_budget: float = DEFAULT_TIME_BUDGET,
+    ):
+        self.max_workers = max_workers
+        self.max_depth = max_depth
+        self.max_dirs = max_dirs
+        self.time_budget = time_budget
+        self.cache = DiskCache("detect", ttl=CACHE_MAX_AGE) if use_cache else None
+
+    # --- Per-directory detection ---
+
+    def _detect_dir(self, files: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Returns one runtime per language found in a directory, from its tracked files."""
+        runtimes: Dict[str, Dict[str, Any]] = {}
+        for language, manifest, locks in MANIFESTS:
+            if language in runtimes or manifest not in files:
+                continue
+            for lockfile, cmd in locks:
+                if lockfile is None or lockfile in files:
+                    break
+            runtimes[language] = {
+                "language": language,
+                "dependency_file": manifest,
+                "lockfile": lockfile,
+                "lockfile_hash": files[lockfile]["hash"] if lockfile else None,
+                "manifest_hash": files[manifest]["hash"],
+                "cmd": cmd,
+            }
+        return list(runtimes.values())
+
+    def _file_state(self, path: str, previous: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if previous and previous["mtime"] == st.st_mtime_ns and previous["size"] == st.st_size:
+            return previous
+        return {"mtime": st.st_mtime_ns, "size": st.st_size, "hash": _file_hash(path)}
+
+    def _scan(self, root: str, rel: str, cached: Optional[Dict[str, Any]]) -> Tuple[Dict[str, Any], bool]:
+        """
+        Scans one directory. Returns its cache entry and whether anything in it changed.
+        When the directory's mtime is unchanged its listing is reused, and only tracked files are re-stat'ed.
+        """
+        directory = os.path.join(root, rel) if rel else root
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            return {"mtime": None, "subdirs": [], "files": {}, "runtimes": []}, True
+
+        if cached and cached["mtime"] == mtime:
+            subdirs = cached["subdirs"]
+            names = list(cached["files"])
+        else:
+            subdirs, names = [], []
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                subdirs.append(entry.name)
+                            elif entry.name in TRACKED_FILES:
+                                names.append(entry.name)
+                        except OSError:
+                            continue
+            except OSError:
+                pass
+            subdirs.sort()
+
+        previous_files = cached["files"] if cached else {}
+        files = {}
+        for name in names:
+            state = self._file_state(os.path.join(directory, name), previous_files.get(name))
+            if state:
+                files[name] = state
+        changed = not cached or cached["mtime"] != mtime or files != previous_files
+        runtimes = cached["runtimes"] if not changed else self._detect_dir(files)
+        return {"mtime": mtime, "subdirs": subdirs, "files": files, "runtimes": runtimes}, changed
+
+    # --- Tree walk ---
+
+    def _walk(self, root: str, cached_dirs: Dict[str, Dict[str, Any]], root_entry: Dict[str, Any]) -> Tuple[Dict[str, Dict[str, Any]], int, bool]:
+        """Walks below an already scanned root. Returns (entries by path, changed count, truncated)."""
+        results: Dict[str, Dict[str, Any]] = {"": root_entry}
+        changed_count = 0
+        truncated = False
+        deadline = time.monotonic() + self.time_budget
+
+        def load_ignore(parent: GitIgnore, rel: str, entry: Dict[str, Any]) -> GitIgnore:
+            if ".gitignore" not in entry["files"]:
+                return parent
+            try:
+                with open(os.path.join(root, rel, ".gitignore"), "r", encoding="utf-8", errors="replace") as f:
+                    return parent.extend(rel, f.read())
+            except OSError:
+                return parent
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            pending: Dict[Any, Tuple[str, GitIgnore, int]] = {}
+
+            def expand(rel: str, entry: Dict[str, Any], parent_ignore: GitIgnore, depth: int) -> None:
+                nonlocal truncated
+                if depth >= self.max_depth:
+                    return
+                ignore = load_ignore(parent_ignore, rel, entry)
+                for name in entry["subdirs"]:
+                    child = f"{rel}/{name}" if rel else name
+                    if name in SKIP_DIRS or ignore.ignored(child, True):
+                        continue
+                    if len(results) + len(pending) >= self.max_dirs or time.monotonic() > deadline:
+                        truncated = True
+                        return
+                    pending[pool.submit(self._scan, root, child, cached_dirs.get(child))] = (child, ignore, depth + 1)
+
+            expand("", root_entry, GitIgnore(), 0)
+            while pending:
+                done, _ = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+                if not done:
+                    # Out of time: drop what is still queued and report what was found
+                    truncated = True
+                    for future in pending:
+                        future.cancel()
+                    break
+                for future in done:
+                    rel, parent_ignore, depth = pending.pop(future)
+                    entry, changed = future.result()
+                    results[rel] = entry
+                    changed_count += changed
+                    expand(rel, entry, parent_ignore, depth)
+        return results, changed_count, truncated
+
+    def detect_all(self, path: str, nested: bool = True) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Returns (runtimes, truncated): every runtime under `path` (only the root's without
+        `nested`), each with its directory relative to `path` ("." for the root), manifest,
+        lockfile (and content hashes) and install command. `truncated` is set when the walk hit
+        its depth-independent limits (directories or time) before covering the tree.
+        """
+        root = os.path.abspath(path)
+        cache_key = f"tree:{root}"
+        cached = (self.cache.get(cache_key) if self.cache else None) or {}
+        cached_dirs = cached.get("dirs", {})
+
+        # The root is scanned on its own first, so its result never waits on the rest of the tree
+        root_entry, root_changed = self._scan(root, "", cached_dirs.get(""))
+        truncated = False
+        if nested:
+            # Ignore rules are re-evaluated on every walk, so edited .gitignore files take effect at once
+            dirs, changed, truncated = self._walk(root, cached_dirs, root_entry)
+            changed += root_changed
+            to_save = dirs
+        else:
+            # Keep the nested entries cached for the next nested walk
+            dirs, changed = {"": root_entry}, root_changed
+            to_save = {**cached_dirs, "": root_entry}
+        if self.cache and (changed or to_save.keys() != cached_dirs.keys()):
+            self.cache.set(cache_key, {"dirs": to_save})
+
+        runtimes = []
+        for rel in sorted(dirs):
+            for runtime in dirs[rel]["runtimes"]:
+                runtimes.append({"path": rel or ".", **runtime})
+        return runtimes, truncated
+
+    @profiled()
+    def detect(self, path: str, nested: bool = True) -> Dict[str, Any]:
         """
         Detects the runtime stack of the project at the given path.
+        The root's runtime is reported as before; `runtimes` lists every runtime found in the
+        tree (the root's only without `nested`), and `runtimes_truncated` says whether the walk
+        stopped early.
         """
         info: Dict[str, Any] = {
             "language": "unknown",
             "dependency_file": None,
-            "cmd": None
+            "lockfile": None,
+            "cmd": None,
+            "runtimes": [],
+            "runtimes_truncated": False,
         }
-        
-        # Check for Python
-        if os.path.exists(os.path.join(path, "requirements.txt")):
-            info["language"] = "python"
-            info["dependency_file"] = "requirements.txt"
-            info["cmd"] = "pip install -r requirements.txt"
-        elif os.path.exists(os.path.join(path, "pyproject.toml")):
-             info["language"] = "python"
-             info["dependency_file"] = "pyproject.toml"
-             info["cmd"] = "poetry install" # assumption
-        
-        # Check for Node
-        elif os.path.exists(os.path.join(path, "package.json")):
-            info["language"] = "node"
-            info["dependency_file"] = "package.json"
-            info["cmd"] = "npm install"
-
-        # Check for Go
-        elif os.path.exists(os.path.join(path, "go.mod")):
-            info["language"] = "go"
-            info["dependency_file"] = "go.mod"
-            info["cmd"] = "go mod download"
-            
+        try:
+            runtimes, info["runtimes_truncated"] = self.detect_all(path, nested)
+        except OSError as e:
+            console.print(f"[yellow]⚠️  Runtime detection failed: {e}[/yellow]")
+            return info
+        info["runtimes"] = runtimes
+
+        # The root keeps its historical precedence: requirements.txt, pyproject.toml, package.json, go.mod
+        root_runtimes = [r for r in runtimes if r["path"] == "."]
+        order = [manifest for _, manifest, _ in MANIFESTS]
+        if root_runtimes:
+            primary = min(root_runtimes, key=lambda r: order.index(r["dependency_file"]))
+            info.update({k: primary[k] for k in ("language", "dependency_file", "lockfile", "cmd")})
         return info
 
-    def generate_docker_compose(self, info: Dict[str, str], services: Optional[Dict] = None) -> str:
+    def generate_docker_compose(
+        self,
+        info: Dict[str, Any],
+        metadata: Dict[str, Any],
+        service: str = "app",
+        image_digest: Optional[str] = None,
+        proxies: Optional[Dict[str, int]] = None,
+        local_code: bool = False,
+        dockerfile: Optional[str] = None,
+    ) -> str:
         """
-        Generates a docker-compose.yml content based on detection.
+        Generates docker-compose.yml content for a pulled service; see compose.render_compose.
         """
-        # Simple template for v1
-        return f"""version: '3.8'
-services:
-  app:
-    build: .
-    ports:
-      - "8080:8080"
-    environment:
-      - PORT=8080
-"""
+        from .compose import render_compose
+        return render_compose(service, metadata, image_digest, proxies, local_code, dockerfile)
@@ -1,27 +1,82 @@
 from mcp.server.fastmcp import FastMCP
-from typing import List, Dict
+from typing import Any, Dict, List, Optional
 import json
+import threading
+
+from .sampling import (
+    DEFAULT_BYTE_LIMIT, DEFAULT_COLUMN_LIMIT, DEFAULT_ROW_LIMIT, DEFAULT_VALUE_CHARS, TableSampler, format_sample,
+)
+from .schema import DEFAULT_PAGE_SIZE, SchemaError, SchemaIntrospector, connect_pool
+from .snapshot import SnapshotReader
 
 # Initialize FastMCP
 mcp = FastMCP("ground-control")
 
-# This would strictly be populated by the running Ground Control process
-# For now we use global state or a file-based context
-CONTEXT: Dict = {
-    "schema": [],
-    "api_defs": []
-}
+# Populated by `ag pull` through the memory-mapped context snapshot. Reads are served from
+# memory and only sections whose generation changed since the last read are decoded again.
+snapshot = SnapshotReader()
+
+# The database is introspected through the proxy ports `ag pull` mapped; connected on first use,
+# and reconnected when a later pull publishes different ports.
+_introspector: Optional[SchemaIntrospector] = None
+_introspector_ports: Optional[Dict] = None
+_introspector_lock = threading.Lock()
+
+
+def get_introspector() -> SchemaIntrospector:
+    global _introspector, _introspector_ports
+    ports = (snapshot.section("proxies") or {}).get("ports")
+    with _introspector_lock:
+        if _introspector is not None and ports and ports != _introspector_ports:
+            _introspector.pool.close()
+            _introspector = None
+        if _introspector is None:
+            _introspector = SchemaIntrospector(connect_pool())
+            _introspector_ports = ports
+        return _introspector
+
+
+def _format_page(page: Dict) -> str:
+    text = "Available Tables:\n" + "\n".join(page["tables"])
+    if page["next_page_token"]:
+        text += f"\n\n(More tables: call list_tables with page_token='{page['next_page_token']}')"
+    return text
+
+
+@mcp.resource("ground-control://context")
+def get_context() -> str:
+    """Returns the pulled services' metadata and proxy port mappings (no secret values)."""
+    context = snapshot.sections(["service", "services", "proxies"])
+    if not context:
+        return "No context published yet. Run 'ag pull' first."
+    return json.dumps(context, indent=2)
+
 
 @mcp.resource("ground-control://schema")
 def get_schema() -> str:
-    """Returns the list of tables found in the database (Lazy Loading)."""
-    # In a real implementation, this would query metadata for table names only.
-    schema_context = CONTEXT.get("schema", [])
-    if isinstance(schema_context, list):
-        # Assuming schema_context is a list of tables or dicts
-        # If it's a list of mock strings or dicts, we just list names
-        return "Available Tables:\n" + "\n".join([t.get("name", "unknown") if isinstance(t, dict) else str(t) for t in schema_context])
-    return str(schema_context)
+    """Returns the first page of table names found in the database (Lazy Loading)."""
+    try:
+        return _format_page(get_introspector().list_tables())
+    except SchemaError as e:
+        # Fall back to the table names `ag pull` summarized, if any
+        summary = snapshot.section("schema") or {}
+        tables = [t for instance in summary.values() for t in instance.get("tables", [])]
+        if tables:
+            return "Available Tables (from the last pull):\n" + "\n".join(tables)
+        return f"Schema unavailable: {e}"
+
+
+@mcp.tool()
+def list_tables(schema: str = "", page_token: str = "", page_size: int = DEFAULT_PAGE_SIZE) -> str:
+    """
+    List table names only, one page at a time.
+    Optionally restrict to one schema; pass the returned page_token to get the next page.
+    """
+    try:
+        return _format_page(get_introspector().list_tables(schema or None, page_token or None, page_size))
+    except SchemaError as e:
+        return f"Schema unavailable: {e}"
+
 
 @mcp.tool()
 def get_table_schema(table_name: str) -> str:
@@ -29,16 +84,39 @@ def get_table_schema(table_name: str) -> str:
     Get detailed schema definition for a specific table.
     Use this to inspect columns and types when needed.
     """
-    # In a real implementation, this would look up the specific table schema
-    # from the CONTEXT or query the DB directly.
-    all_schemas = CONTEXT.get("schema", [])
-    
-    # Mock lookup logic
-    for table in all_schemas:
-        if isinstance(table, dict) and table.get("name") == table_name:
-             return f"Schema for {table_name}:\n{json.dumps(table, indent=2)}"
-    
-    return f"Schema for {table_name}: (Mock data - Table not found or schema not loaded)"
+    try:
+        table = get_introspector().table_schema(table_name)
+    except SchemaError as e:
+        return f"Schema unavailable: {e}"
+    if table is None:
+        return f"Schema for {table_name}: table not found. Use list_tables to see available tables."
+    return f"Schema for {table['name']}:\n{json.dumps(table, indent=2)}"
+
+
+@mcp.tool()
+def sample_table(
+    table_name: str,
+    columns: Optional[List[str]] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    row_limit: int = DEFAULT_ROW_LIMIT,
+    byte_limit: int = DEFAULT_BYTE_LIMIT,
+    column_limit: int = DEFAULT_COLUMN_LIMIT,
+    max_value_chars: int = DEFAULT_VALUE_CHARS,
+) -> str:
+    """
+    Get a few sample rows from a table, optionally filtered by column equality
+    (e.g. filters={"status": "active"}; null matches IS NULL) and projected to some columns.
+    Output is one JSON array per row and stops at the row or byte limit; long values are truncated.
+    Read-only.
+    """
+    try:
+        result = TableSampler(get_introspector()).sample(
+            table_name, columns, filters, row_limit, byte_limit, column_limit, max_value_chars,
+        )
+    except (SchemaError, ValueError) as e:
+        return f"Cannot sample {table_name}: {e}"
+    return format_sample(result)
+
 
 if __name__ == "__main__":
     mcp.run()
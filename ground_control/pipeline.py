@@ -0,0 +1,157 @@
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import time
+from rich.live import Live
+from rich.table import Table
+
+from .console import console, get_console
+
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+STATUS_STYLES = {
+    PENDING: "[gray]… pending[/gray]",
+    RUNNING: "[yellow]⟳ running[/yellow]",
+    DONE: "[green]✓ done[/green]",
+    FAILED: "[red]x failed[/red]",
+    SKIPPED: "[gray]- skipped[/gray]",
+}
+
+
+class Task:
+    def __init__(self, name: str, fn: Callable[[Dict[str, Any]], Any], deps: Iterable[str] = (), label: Optional[str] = None):
+        self.name = name
+        self.fn = fn
+        self.deps = list(deps)
+        self.label = label or name
+        self.status = PENDING
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+
+    @property
+    def elapsed(self) -> Optional[float]:
+        if self.started is None:
+            return None
+        return (self.finished or time.perf_counter()) - self.started
+
+
+class Pipeline:
+    """
+    Runs a graph of tasks on a thread pool, starting each task as soon as its dependencies finish.
+
+    Each task function receives a dict of the results of the tasks completed so far
+    (which always includes its own dependencies). A failed task marks its dependents as skipped;
+    independent tasks keep running. Progress is shown as a live table, one row per task.
+    By default the pool has a thread per task, so ready tasks never queue behind each other.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers
+        self.tasks: Dict[str, Task] = {}
+
+    def add(self, name: str, fn: Callable[[Dict[str, Any]], Any], deps: Iterable[str] = (), label: Optional[str] = None) -> Task:
+        if name in self.tasks:
+            raise ValueError(f"Duplicate task '{name}'")
+        task = Task(name, fn, deps, label)
+        self.tasks[name] = task
+        return task
+
+    def _validate(self) -> None:
+        for task in self.tasks.values():
+            for dep in task.deps:
+                if dep not in self.tasks:
+                    raise ValueError(f"Task '{task.name}' depends on unknown task '{dep}'")
+
+        # Depth-first cycle check
+        visiting, visited = set(), set()
+
+        def visit(name: str) -> None:
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"Dependency cycle through task '{name}'")
+            visiting.add(name)
+            for dep in self.tasks[name].deps:
+                visit(dep)
+            visiting.discard(name)
+            visited.add(name)
+
+        for name in self.tasks:
+            visit(name)
+
+    def _render(self) -> Table:
+        table = Table(show_header=True, header_style="bold", box=None)
+        table.add_column("Phase")
+        table.add_column("Status")
+        table.add_column("Time", justify="right")
+        for task in self.tasks.values():
+            elapsed = task.elapsed
+            table.add_row(task.label, STATUS_STYLES[task.status], f"{elapsed:.2f}s" if elapsed is not None else "")
+        return table
+
+    def _ready(self) -> List[Task]:
+        ready = []
+        for task in self.tasks.values():
+            if task.status != PENDING:
+                continue
+            dep_states = [self.tasks[dep].status for dep in task.deps]
+            if any(state in (FAILED, SKIPPED) for state in dep_states):
+                task.status = SKIPPED
+            elif all(state == DONE for state in dep_states):
+                ready.append(task)
+        return ready
+
+    def _run_task(self, task: Task, results: Dict[str, Any]) -> Any:
+        task.started = time.perf_counter()
+        try:
+            return task.fn(results)
+        finally:
+            task.finished = time.perf_counter()
+
+    def run(self, show_progress: bool = True) -> Dict[str, Task]:
+        """
+        Runs every task and returns them by name once the graph has drained.
+        """
+        self._validate()
+        results: Dict[str, Any] = {}
+        running = {}
+
+        live = Live(self._render(), console=get_console(), refresh_per_second=10) if show_progress else None
+        if live:
+            live.start()
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers or max(1, len(self.tasks))) as pool:
+                while True:
+                    # Skipping a task can unblock (skip) its dependents, so drain until stable
+                    for task in self._ready():
+                        task.status = RUNNING
+                        running[pool.submit(self._run_task, task, dict(results))] = task
+
+                    if not running:
+                        if any(t.status == PENDING for t in self.tasks.values()):
+                            continue
+                        break
+
+                    done, _ = wait(running, timeout=0.1, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        task = running.pop(future)
+                        try:
+                            task.result = future.result()
+                            task.status = DONE
+                            results[task.name] = task.result
+                        except Exception as e:
+                            task.error = e
+                            task.status = FAILED
+                    if live:
+                        live.update(self._render())
+        finally:
+            if live:
+                live.update(self._render())
+                live.stop()
+        return self.tasks
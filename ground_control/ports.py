@@ -0,0 +1,211 @@
+from typing import Dict, List, Optional
+import json
+import os
+import socket
+import tempfile
+from contextlib import contextmanager
+
+from .cache import cache_root
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, allocation is still bind-checked
+    fcntl = None
+
+MAX_PORT = 65535
+
+
+class PortReservation:
+    """
+    A local port held by a bound socket until `release()` is called.
+
+    cloud-sql-proxy cannot take over an inherited socket, so the reservation is released right
+    before the proxy starts and the proxy binds the port itself. Between the two, an unrelated
+    process can still take the port; the proxy then fails with EADDRINUSE and ProxyManager starts
+    it again on a newly allocated port. Other `ag` processes are kept off it by the leases in
+    ports.json.
+    """
+
+    def __init__(self, port: int, sock: socket.socket):
+        self.port = port
+        self._sock: Optional[socket.socket] = sock
+
+    @property
+    def held(self) -> bool:
+        return self._sock is not None
+
+    def release(self) -> None:
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+
+class PortAllocator:
+    """
+    Reserves local ports by binding them, rather than probing with connect().
+
+    `allocate` assigns ports to several instances in one pass. With `persist`, each instance
+    keeps the port it got last time when that port is still free, so connection strings stay
+    stable across runs. Allocation is serialized between processes with a file lock, and
+    ports leased to any live `ag` process are skipped.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", persist: bool = True, state_path: Optional[str] = None):
+        self.host = host
+        self.persist = persist
+        self.state_path = state_path or os.path.join(cache_root(), "ports.json")
+
+    # --- Binding ---
+
+    def reserve(self, port: int) -> Optional[PortReservation]:
+        """Binds the port, returning a reservation, or None if it is in use."""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            sock.bind((self.host, port))
+        except OSError:
+            sock.close()
+            return None
+        return PortReservation(port, sock)
+
+    def find_free(self, start_port: int) -> Optional[int]:
+        """Returns the first port at or above start_port that can currently be bound."""
+        port = start_port
+        while port <= MAX_PORT:
+            reservation = self.reserve(port)
+            if reservation:
+                reservation.release()
+                return port
+            port += 1
+        return None
+
+    # --- Persisted state ---
+
+    @contextmanager
+    def _locked_state(self):
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        with open(self.state_path + ".lock", "a+") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self.state_path, "r", encoding="utf-8") as f:
+                        state = json.load(f)
+                except (OSError, ValueError):
+                    state = {}
+                state.setdefault("stable", {})
+                state.setdefault("leases", {})
+                yield state
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.state_path), suffix=".tmp")
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(state, f)
+                os.replace(tmp_path, self.state_path)
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _live_leases(self, state: Dict) -> Dict[str, int]:
+        """Returns port -> pid for leases whose process is still alive, dropping the rest."""
+        live = {}
+        for port, pid in state["leases"].items():
+            if pid == os.getpid() or _pid_alive(pid):
+                live[port] = pid
+        state["leases"] = dict(live)
+        return live
+
+    def stable_ports(self) -> Dict[str, int]:
+        """Returns the persisted instance -> port assignments."""
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f).get("stable", {})
+        except (OSError, ValueError):
+            return {}
+
+    def live_ports(self) -> Dict[str, int]:
+        """Returns instance -> port for assignments currently leased by a live process."""
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        leased = {int(port) for port, pid in state.get("leases", {}).items() if _pid_alive(pid)}
+        return {instance: port for instance, port in state.get("stable", {}).items() if port in leased}
+
+    # --- Allocation ---
+
+    def allocate(self, instances: List[str], start_port: int = 5432) -> Dict[str, PortReservation]:
+        """
+        Reserves one port per instance in a single pass and returns instance -> reservation.
+        Raises RuntimeError if the port range is exhausted.
+        """
+        if not self.persist:
+            return self._allocate(instances, start_port, {}, {})
+
+        with self._locked_state() as state:
+            leased = self._live_leases(state)
+            reservations = self._allocate(instances, start_port, state["stable"], leased)
+            for instance, reservation in reservations.items():
+                state["stable"][instance] = reservation.port
+                state["leases"][str(reservation.port)] = os.getpid()
+            return reservations
+
+    def _allocate(self, instances: List[str], start_port: int, stable: Dict[str, int], leased: Dict[str, int]) -> Dict[str, PortReservation]:
+        reservations: Dict[str, PortReservation] = {}
+        # Skip ports remembered for other instances, so their assignments stay stable too.
+        remembered = {port for name, port in stable.items() if name not in instances}
+
+        def usable(port: int) -> bool:
+            return str(port) not in leased and all(r.port != port for r in reservations.values())
+
+        try:
+            # First pass: previous ports
+            for instance in instances:
+                port = stable.get(instance)
+                if port and usable(port):
+                    reservation = self.reserve(port)
+                    if reservation:
+                        reservations[instance] = reservation
+
+            # Second pass: one linear scan for everything else
+            port = start_port
+            for instance in instances:
+                if instance in reservations:
+                    continue
+                reservation = None
+                while reservation is None:
+                    if port > MAX_PORT:
+                        raise RuntimeError(f"No free local ports available from {start_port}")
+                    if usable(port) and port not in remembered:
+                        reservation = self.reserve(port)
+                    port += 1
+                reservations[instance] = reservation
+        except Exception:
+            for reservation in reservations.values():
+                reservation.release()
+            raise
+        return reservations
+
+    def release(self, reservations: Dict[str, PortReservation]) -> None:
+        """Releases reservations and drops their leases."""
+        for reservation in reservations.values():
+            reservation.release()
+        if not self.persist:
+            return
+        try:
+            with self._locked_state() as state:
+                for reservation in reservations.values():
+                    if state["leases"].get(str(reservation.port)) == os.getpid():
+                        del state["leases"][str(reservation.port)]
+        except OSError:
+            pass
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
@@ -0,0 +1,171 @@
+from typing import Any, Callable, Dict, List, Optional
+import functools
+import json
+import os
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+from .console import console
+
+
+COUNTERS = ("subprocesses", "rpcs", "bytes")
+
+
+class Span:
+    def __init__(self, name: str, category: str, args: Dict[str, Any]):
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        self.thread_id = threading.get_ident()
+        self.counters = dict.fromkeys(COUNTERS, 0)
+
+
+class Profiler:
+    """
+    Lightweight wall-time and I/O instrumentation for `ag pull --profile`.
+
+    Spans nest per thread; counters (subprocesses, RPCs, bytes) are attributed to the innermost
+    open span of the calling thread. When disabled, `span` and `count` are no-ops.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.origin = time.perf_counter()
+        self.spans: List[Span] = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def enable(self) -> None:
+        self.enabled = True
+        self.origin = time.perf_counter()
+        self.spans = []
+
+    def _stack(self) -> List[Span]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def span(self, name: str, category: str = "phase", **args):
+        if not self.enabled:
+            yield None
+            return
+        span = Span(name, category, args)
+        stack = self._stack()
+        stack.append(span)
+        try:
+            yield span
+        finally:
+            span.duration = time.perf_counter() - span.start
+            stack.pop()
+            with self._lock:
+                self.spans.append(span)
+
+    def count(self, counter: str, n: int = 1, nbytes: int = 0) -> None:
+        """Records `n` subprocesses/RPCs (and the bytes they moved) against the current span."""
+        if not self.enabled:
+            return
+        stack = self._stack()
+        if not stack:
+            return
+        span = stack[-1]
+        with self._lock:
+            span.counters[counter] += n
+            span.counters["bytes"] += nbytes
+
+    # --- Reporting ---
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Aggregates spans by name, in order of first appearance."""
+        rows: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start)
+        for span in spans:
+            row = rows.setdefault(span.name, {"name": span.name, "calls": 0, "wall": 0.0, **dict.fromkeys(COUNTERS, 0)})
+            row["calls"] += 1
+            row["wall"] += span.duration
+            for counter in COUNTERS:
+                row[counter] += span.counters[counter]
+        return list(rows.values())
+
+    def print_summary(self) -> None:
+        from rich.table import Table
+        table = Table(title="Pull profile", header_style="bold")
+        table.add_column("Phase", no_wrap=True)
+        table.add_column("Calls", justify="right")
+        table.add_column("Wall", justify="right")
+        table.add_column("Subprocs", justify="right")
+        table.add_column("RPCs", justify="right")
+        table.add_column("Bytes", justify="right")
+        for row in self.summary():
+            table.add_row(
+                row["name"], str(row["calls"]), f"{row['wall']:.3f}s",
+                str(row["subprocesses"]), str(row["rpcs"]), f"{row['bytes']:,}",
+            )
+        console.print(table)
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """Returns the spans as Chrome trace-event JSON (chrome://tracing, Perfetto)."""
+        pid = os.getpid()
+        with self._lock:
+            spans = list(self.spans)
+        events = [
+            {
+                "name": span.name,
+                "cat": span.category,
+                "ph": "X",
+                "ts": round((span.start - self.origin) * 1e6, 1),
+                "dur": round(span.duration * 1e6, 1),
+                "pid": pid,
+                "tid": span.thread_id,
+                "args": {**{k: str(v) for k, v in span.args.items()}, **span.counters},
+            }
+            for span in spans
+        ]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f)
+
+
+profiler = Profiler()
+
+
+def profiled(name: Optional[str] = None, category: str = "phase") -> Callable:
+    """
+    Decorator that wraps a function call in a profiler span.
+    The span defaults to the function's qualified name (e.g. 'GCPProvider.list_services').
+    """
+    def decorator(fn: Callable) -> Callable:
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return fn(*args, **kwargs)
+            with profiler.span(span_name, category):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def run_subprocess(cmd: List[str], **kwargs) -> subprocess.CompletedProcess:
+    """
+    subprocess.run that records the call (and its output size) with the profiler.
+    """
+    output = None
+    try:
+        result = subprocess.run(cmd, **kwargs)
+        output = result.stdout
+        return result
+    except subprocess.CalledProcessError as e:
+        output = e.stdout
+        raise
+    finally:
+        profiler.count("subprocesses", nbytes=len(output) if output else 0)
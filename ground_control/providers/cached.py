@@ -0,0 +1,282 @@
+from typing import Optional, List, Dict, Any
+import atexit
+import threading
+import time
+import weakref
+
+from ..cache import DiskCache
+
+# Serve entries younger than this without revalidating.
+FRESH_SECONDS = 60
+# Entries older than this are dropped entirely.
+MAX_AGE_SECONDS = 7 * 24 * 3600
+# Region lists rarely change.
+REGIONS_TTL_SECONDS = 24 * 3600
+# Size budget for the metadata namespace.
+MAX_BYTES = 50 * 1024 * 1024
+# Labels behind a mutable tag can move when the tag is re-pushed.
+MUTABLE_IMAGE_TTL_SECONDS = 3600
+# Failed lookups are retried after this long.
+NEGATIVE_IMAGE_TTL_SECONDS = 600
+# Size budget for the image namespace; digest entries never expire on their own.
+IMAGE_MAX_BYTES = 10 * 1024 * 1024
+
+
+# Providers whose background revalidations are given a chance to finish at exit
+_live_providers: "weakref.WeakSet[CachedProvider]" = weakref.WeakSet()
+EXIT_WAIT_SECONDS = 5.0
+
+
+@atexit.register
+def _wait_for_revalidations() -> None:
+    # One handler for every provider: a long-lived daemon or watch creates many of them
+    deadline = time.time() + EXIT_WAIT_SECONDS
+    for provider in list(_live_providers):
+        provider.wait(max(0.0, deadline - time.time()))
+
+
+def service_validator(service: Dict[str, Any]) -> Optional[str]:
+    """
+    Returns an identifier that changes whenever the service is redeployed or edited.
+    Prefers metadata.resourceVersion (the object's ETag) and falls back to the latest revision name.
+    """
+    metadata = service.get("metadata", {})
+    status = service.get("status", {})
+    return (
+        metadata.get("resourceVersion")
+        or metadata.get("etag")
+        or status.get("latestReadyRevisionName")
+        or status.get("latestCreatedRevisionName")
+    )
+
+
+class CachedProvider:
+    """
+    Wraps a GCPProvider with a persistent, revision-aware metadata cache.
+
+    Listings and service descriptions are keyed by project/region/service.
+    Cached listings are answered immediately (stale-while-revalidate): entries older than
+    FRESH_SECONDS are refreshed in the background for the next run. A cached description is
+    reused only while its validator matches the one in a listing of its region no older than
+    FRESH_SECONDS; an older listing is fetched again first, so a redeploy always triggers a new
+    describe. `refresh=True` bypasses reads but still updates the cache.
+    """
+
+    def __init__(self, provider: Any, refresh: bool = False, cache: Optional[DiskCache] = None, fresh_seconds: float = FRESH_SECONDS):
+        self.provider = provider
+        self.refresh = refresh
+        self.cache = cache or DiskCache("metadata", ttl=MAX_AGE_SECONDS, max_bytes=MAX_BYTES)
+        self.fresh_seconds = fresh_seconds
+        self._revalidating: Dict[str, threading.Thread] = {}
+        self._region_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        _live_providers.add(self)
+
+    def __getattr__(self, name: str) -> Any:
+        # Everything that is not cached (extract_metadata, get_commit_sha, ...) goes straight through.
+        return getattr(self.provider, name)
+
+    @property
+    def project_id(self) -> str:
+        return self.provider.project_id
+
+    # --- Background revalidation ---
+
+    def _revalidate(self, key: str, fetch) -> None:
+        with self._lock:
+            if key in self._revalidating:
+                return
+            thread = threading.Thread(target=self._run_revalidation, args=(key, fetch), daemon=True)
+            self._revalidating[key] = thread
+        thread.start()
+
+    def _run_revalidation(self, key: str, fetch) -> None:
+        try:
+            fetch()
+        except Exception:
+            # Keep serving the stale entry; the next run will try again.
+            pass
+        finally:
+            with self._lock:
+                self._revalidating.pop(key, None)
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """Waits for pending background revalidations to finish."""
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            with self._lock:
+                threads = list(self._revalidating.values())
+            if not threads:
+                return
+            for thread in threads:
+                remaining = None if deadline is None else max(0.0, deadline - time.time())
+                thread.join(remaining)
+            if deadline is not None and time.time() >= deadline:
+                return
+
+    def _is_fresh(self, entry: Dict[str, Any]) -> bool:
+        return time.time() - entry.get("stored_at", 0) < self.fresh_seconds
+
+    # --- Cached calls ---
+
+    def _services_key(self) -> str:
+        return f"services/{self.project_id}"
+
+    def _fetch_services(self) -> List[Dict[str, Any]]:
+        services = self.provider.list_services()
+        if services:
+            self.cache.set(self._services_key(), services)
+        return services
+
+    def list_services(self, refresh: bool = False) -> List[Dict[str, Any]]:
+        """
+        Lists Cloud Run services, answering from the cache when possible.
+        """
+        key = self._services_key()
+        if not (refresh or self.refresh):
+            entry = self.cache.get_entry(key)
+            if entry:
+                if not self._is_fresh(entry):
+                    self._revalidate(key, self._fetch_services)
+                return entry["value"]
+        return self._fetch_services()
+
+    def list_regions(self) -> List[str]:
+        """
+        Lists Cloud Run regions for the project, cached for a day.
+        """
+        key = f"regions/{self.project_id}"
+        if not self.refresh:
+            regions = self.cache.get(key)
+            if regions:
+                return regions
+        regions = self.provider.list_regions()
+        if regions:
+            self.cache.set(key, regions, ttl=REGIONS_TTL_SECONDS)
+        return regions
+
+    def _region_key(self, region: str) -> str:
+        return f"services/{self.project_id}/{region}"
+
+    def _fetch_region(self, region: str) -> Optional[List[Dict[str, Any]]]:
+        services = self.provider.list_services_in_region(region)
+        if services is not None:
+            # Empty regions are cached too; most regions of a project have no services.
+            self.cache.set(self._region_key(region), services)
+        return services
+
+    def list_services_in_region(self, region: str, refresh: bool = False) -> Optional[List[Dict[str, Any]]]:
+        """
+        Lists services in one region, answering from the cache when possible.
+        """
+        key = self._region_key(region)
+        if not (refresh or self.refresh):
+            entry = self.cache.get_entry(key)
+            if entry:
+                if not self._is_fresh(entry):
+                    self._revalidate(key, lambda: self._fetch_region(region))
+                return entry["value"]
+        return self._fetch_region(region)
+
+    def current_summary(self, service_name: str, region: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the service's entry from a listing of its region no older than FRESH_SECONDS,
+        listing the region again (once, however many services ask) if the cached one is older.
+        Returns None if the service is not in the listing or the region cannot be listed.
+        """
+        key = self._region_key(region)
+        with self._lock:
+            region_lock = self._region_locks.setdefault(region, threading.Lock())
+        with region_lock:
+            entry = None if self.refresh else self.cache.get_entry(key)
+            services = entry["value"] if entry and self._is_fresh(entry) else self._fetch_region(region)
+        for service in services or []:
+            if service.get("metadata", {}).get("name") == service_name:
+                return service
+        return None
+
+    def _details_key(self, service_name: str, region: str) -> str:
+        return f"service/{self.project_id}/{region}/{service_name}"
+
+    def _fetch_details(self, service_name: str, region: str) -> Dict[str, Any]:
+        details = self.provider.get_service_details(service_name, region)
+        if details:
+            self.cache.set(self._details_key(service_name, region), details, validator=service_validator(details))
+        return details
+
+    def get_service_details(self, service_name: str, region: str, summary: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Gets details of a Cloud Run service.
+        With a `summary` (the service's entry from a listing), the cached description is reused
+        only if its validator matches a listing of bounded age (see current_summary); a summary
+        taken from an older listing is not trusted. Without it, the entry is served
+        stale-while-revalidate.
+        """
+        key = self._details_key(service_name, region)
+        if not self.refresh:
+            entry = self.cache.get_entry(key)
+            if entry:
+                if summary is None:
+                    if not self._is_fresh(entry):
+                        self._revalidate(key, lambda: self._fetch_details(service_name, region))
+                    return entry["value"]
+                current = self.current_summary(service_name, region)
+                expected = service_validator(current) if current else None
+                if expected is not None and entry.get("validator") == expected:
+                    return entry["value"]
+        return self._fetch_details(service_name, region)
+
+    def get_image_digest(self, image_url: str, region: str, revision: Optional[str] = None) -> Optional[str]:
+        """
+        Resolves the digest a revision is serving. Revisions are immutable, so cached answers are never revalidated.
+        """
+        if "@" in image_url or not revision:
+            return self.provider.get_image_digest(image_url, region, revision)
+        key = f"digest/{self.project_id}/{region}/{revision}"
+        if not self.refresh:
+            digest = self.cache.get(key)
+            if digest:
+                return digest
+        digest = self.provider.get_image_digest(image_url, region, revision)
+        if digest:
+            self.cache.set(key, digest)
+        return digest
+
+
+class ImageCommitCache:
+    """
+    Persistent image -> (commit SHA, labels) cache.
+
+    Images pinned by digest are immutable, so their labels are kept until evicted for space.
+    Images referenced by tag are kept for MUTABLE_IMAGE_TTL_SECONDS, and images the registry
+    does not have are remembered for NEGATIVE_IMAGE_TTL_SECONDS so a missing image does not
+    slow every pull. Transient failures (timeouts, 5xx, auth) are never stored.
+    """
+
+    def __init__(self, refresh: bool = False, cache: Optional[DiskCache] = None):
+        self.refresh = refresh
+        self.cache = cache or DiskCache("images", max_bytes=IMAGE_MAX_BYTES)
+
+    def _key(self, image_url: str) -> str:
+        if "@" in image_url:
+            # The digest alone identifies the content, whatever tag or repo path points at it.
+            return f"digest/{image_url.split('@', 1)[1]}"
+        return f"tag/{image_url}"
+
+    def lookup(self, image_url: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns {"sha": Optional[str], "labels": Optional[Dict]} or None on a miss.
+        labels is None for an image the registry reported as not found.
+        """
+        if self.refresh:
+            return None
+        return self.cache.get(self._key(image_url))
+
+    def store(self, image_url: str, sha: Optional[str], labels: Optional[Dict[str, str]]) -> None:
+        if labels is None:
+            ttl: Optional[float] = NEGATIVE_IMAGE_TTL_SECONDS
+        elif "@" in image_url:
+            ttl = None
+        else:
+            ttl = MUTABLE_IMAGE_TTL_SECONDS
+        self.cache.set(self._key(image_url), {"sha": sha, "labels": labels}, ttl=ttl)
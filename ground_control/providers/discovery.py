@@ -0,0 +1,154 @@
+from typing import Optional, List, Dict, Any, Iterator, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
+
+DEFAULT_CONCURRENCY = 8
+LOCATION_LABEL = "cloud.googleapis.com/location"
+
+
+class ServiceIndex:
+    """
+    Thread-safe name -> (region, summary) index, filled in as regions report back.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, region: str, services: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            for summary in services:
+                name = summary.get("metadata", {}).get("name")
+                if name:
+                    self._entries[name] = (region, summary)
+
+    def lookup(self, name: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        with self._lock:
+            return self._entries.get(name)
+
+    def names(self) -> List[str]:
+        with self._lock:
+            return sorted(self._entries)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class ServiceDiscovery:
+    """
+    Discovers Cloud Run services by querying every region concurrently.
+
+    `iter_regions` yields each region's services as soon as that region responds, so callers
+    can stream partial results. `find` stops as soon as the owning region of a service reports,
+    without waiting for the remaining regions.
+
+    The fan-out is only used for providers whose per-region listing is cheap (`REGIONAL_LISTING`,
+    an in-process API client). For the gcloud backend every region would cost a subprocess, so
+    unless specific regions are requested the project is listed with one region-less call.
+    """
+
+    def __init__(self, provider: Any, regions: Optional[List[str]] = None, concurrency: int = DEFAULT_CONCURRENCY, refresh: bool = False):
+        self.provider = provider
+        self.regions = regions
+        self.concurrency = max(1, concurrency)
+        self.refresh = refresh
+        self.index = ServiceIndex()
+        self.total = 0
+        self.completed = 0
+        self.failed: List[str] = []
+
+    def _list_region(self, region: str) -> Optional[List[Dict[str, Any]]]:
+        if self.refresh:
+            return self.provider.list_services_in_region(region, refresh=True)
+        return self.provider.list_services_in_region(region)
+
+    def _resolve_regions(self) -> List[str]:
+        if self.regions is None:
+            self.regions = self.provider.list_regions()
+        return self.regions
+
+    def iter_regions(self) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+        """
+        Yields (region, services) pairs in completion order.
+        Closing the iterator early cancels regions that have not started yet.
+        """
+        if self.regions is None and not getattr(self.provider, "REGIONAL_LISTING", True):
+            yield from self._iter_global()
+            return
+        regions = self._resolve_regions()
+        if not regions:
+            # Region listing failed; fall back to one project-wide listing grouped by location.
+            yield from self._iter_global()
+            return
+
+        self.total = len(regions)
+        pool = ThreadPoolExecutor(max_workers=min(self.concurrency, len(regions)))
+        try:
+            futures = {pool.submit(self._list_region, region): region for region in regions}
+            for future in as_completed(futures):
+                region = futures[future]
+                self.completed += 1
+                try:
+                    services = future.result()
+                except Exception:
+                    services = None
+                if services is None:
+                    self.failed.append(region)
+                    services = []
+                self.index.add(region, services)
+                yield region, services
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _iter_global(self) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+        services = self.provider.list_services(refresh=True) if self.refresh else self.provider.list_services()
+        by_region: Dict[str, List[Dict[str, Any]]] = {}
+        for summary in services:
+            region = summary.get("metadata", {}).get("labels", {}).get(LOCATION_LABEL, "")
+            by_region.setdefault(region, []).append(summary)
+        self.total = self.completed = len(by_region)
+        for region, region_services in by_region.items():
+            self.index.add(region, region_services)
+            yield region, region_services
+
+    def all_services(self) -> List[Dict[str, Any]]:
+        services: List[Dict[str, Any]] = []
+        for _, region_services in self.iter_regions():
+            services.extend(region_services)
+        return services
+
+    def find_many(self, names: List[str]) -> Dict[str, Tuple[str, Dict[str, Any]]]:
+        """
+        Returns {name: (region, summary)} for the named services found, sweeping the regions
+        once and stopping as soon as every name has been seen.
+        """
+        found = {name: self.index.lookup(name) for name in names}
+        if all(found.values()):
+            return found
+        regions = self.iter_regions()
+        try:
+            for _ in regions:
+                found = {name: hit or self.index.lookup(name) for name, hit in found.items()}
+                if all(found.values()):
+                    break
+        finally:
+            regions.close()
+        return {name: hit for name, hit in found.items() if hit}
+
+    def find(self, name: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        Returns (region, summary) for the named service, or None if no region has it.
+        """
+        found = self.index.lookup(name)
+        if found:
+            return found
+        regions = self.iter_regions()
+        try:
+            for _ in regions:
+                found = self.index.lookup(name)
+                if found:
+                    return found
+        finally:
+            regions.close()
+        return None
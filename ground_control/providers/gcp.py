@@ -1,14 +1,45 @@
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import subprocess
 import json
-from rich.console import Console
 
-console = Console()
+from ..profiling import profiled, profiler, run_subprocess
+from ..console import console
+
+# Substrings of gcloud's error output that mean the registry has no such image
+NOT_FOUND_MARKERS = ("not found", "not_found", "manifest unknown", "manifest_unknown", "404")
+
+
+class ImageNotFound(Exception):
+    """Raised by an image lookup when the registry definitively has no such image."""
+
+
+def serving_revision(service: Dict[str, Any]) -> Optional[str]:
+    """
+    Returns the revision that serves the service's traffic: the one with the largest share in
+    status.traffic (with a split, the first of the largest). Tag-only routes carry no traffic and
+    are ignored. Falls back to latestReadyRevisionName when no route carries traffic.
+    """
+    status = service.get("status", {})
+    routes = [t for t in status.get("traffic") or [] if t.get("percent")]
+    if routes:
+        top = max(routes, key=lambda t: t["percent"])
+        name = top.get("revisionName") or (status.get("latestReadyRevisionName") if top.get("latestRevision") else None)
+        if name:
+            return name
+    return status.get("latestReadyRevisionName")
+
 
 class GCPProvider:
-    def __init__(self, project_id: str):
+    # Each gcloud call is a subprocess, so one project-wide listing beats a per-region fan-out
+    REGIONAL_LISTING = False
+
+    def __init__(self, project_id: str, image_cache: Optional[Any] = None):
         self.project_id = project_id
+        # Optional ImageCommitCache; see providers/cached.py
+        self.image_cache = image_cache
 
+    @profiled()
     def list_services(self) -> List[Dict[str, Any]]:
         """
         Lists Cloud Run services in the project.
@@ -20,13 +51,50 @@ class GCPProvider:
                 "--project", self.project_id,
                 "--format=json"
             ]
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            result = run_subprocess(cmd, capture_output=True, text=True, check=True)
             services = json.loads(result.stdout)
             return services
         except subprocess.CalledProcessError as e:
             console.print(f"[bold red]❌ Error listing services:[/bold red] {e.stderr}")
             return []
 
+    @profiled()
+    def list_regions(self) -> List[str]:
+        """
+        Lists the regions where Cloud Run is available for the project.
+        """
+        try:
+            cmd = [
+                "gcloud", "run", "regions", "list",
+                "--project", self.project_id,
+                "--format=value(locationId)"
+            ]
+            result = run_subprocess(cmd, capture_output=True, text=True, check=True)
+            return [line.strip() for line in result.stdout.splitlines() if line.strip()]
+        except subprocess.CalledProcessError as e:
+            console.print(f"[bold red]❌ Error listing regions:[/bold red] {e.stderr}")
+            return []
+
+    @profiled()
+    def list_services_in_region(self, region: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Lists Cloud Run services deployed in a single region.
+        Returns None (rather than an empty list) if the region could not be listed.
+        """
+        try:
+            cmd = [
+                "gcloud", "run", "services", "list",
+                "--project", self.project_id,
+                "--region", region,
+                "--format=json"
+            ]
+            result = run_subprocess(cmd, capture_output=True, text=True, check=True)
+            return json.loads(result.stdout)
+        except subprocess.CalledProcessError as e:
+            console.print(f"[bold red]❌ Error listing services in {region}:[/bold red] {e.stderr}")
+            return None
+
+    @profiled()
     def get_service_details(self, service_name: str, region: str) -> Dict[str, Any]:
         """
         Gets details of a specific Cloud Run service.
@@ -38,12 +106,13 @@ class GCPProvider:
                 "--region", region,
                 "--format=json"
             ]
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            result = run_subprocess(cmd, capture_output=True, text=True, check=True)
             return json.loads(result.stdout)
         except subprocess.CalledProcessError as e:
             console.print(f"[bold red]❌ Error describing service:[/bold red] {e.stderr}")
             return {}
 
+    @profiled()
     def extract_metadata(self, service_details: Dict[str, Any]) -> Dict[str, Any]:
         """
         Extracts image URL and other metadata from the service details.
@@ -57,6 +126,8 @@ class GCPProvider:
             container = containers[0]
             
             image = container.get("image", "")
+            ports = container.get("ports") or [{}]
+            port = ports[0].get("containerPort", 8080)
             env_vars = {}
             secrets = {}
             if "env" in container:
@@ -88,15 +159,22 @@ class GCPProvider:
                 "env_vars": env_vars,
                 "secrets": secrets,
                 "cloud_sql_instances": cloud_sql_list,
-                "labels": metadata.get("labels", {})
+                "labels": metadata.get("labels", {}),
+                "port": port,
+                "command": container.get("command", []),
+                "args": container.get("args", []),
+                "revision": serving_revision(service_details),
             }
         except Exception as e:
             console.print(f"[bold red]❌ Error parsing service details:[/bold red] {e}")
             return {}
 
+    @profiled()
     def get_commit_sha(self, image_url: str) -> Optional[str]:
         """
         Attempts to find the git commit SHA from the image metadata.
+        Definitive results (labels, or an image the registry does not have) are remembered in
+        the image cache, if one is set; transient failures are not.
         """
         try:
             # Check if image has a tag that looks like a sha
@@ -106,47 +184,173 @@ class GCPProvider:
                 if len(tag) >= 7 and all(c in "0123456789abcdef" for c in tag):
                     return tag
 
+            if self.image_cache:
+                cached = self.image_cache.lookup(image_url)
+                if cached is not None:
+                    if cached.get("labels") is None:
+                        console.print(f"[yellow]⚠️ Image {image_url} not found (cached)[/yellow]")
+                    return cached.get("sha")
+
             # If not in tag, try to describe the image
+            try:
+                labels = self.get_image_labels(image_url)
+                definitive = labels is not None
+            except ImageNotFound:
+                labels, definitive = None, True
+            sha = self.commit_from_labels(labels) if labels is not None else None
+            if self.image_cache and definitive:
+                self.image_cache.store(image_url, sha, labels)
+
+            if labels is None:
+                console.print(f"[yellow]⚠️ Could not describe image {image_url}[/yellow]")
+                return None
+            return sha
+
+        except Exception as e:
+            console.print(f"[bold red]❌ Error analyzing image:[/bold red] {e}")
+            return None
+
+    @profiled()
+    def poll_service(self, service_name: str, region: str, validator: Optional[str], etag: Optional[str] = None) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        Returns (details, etag): details only if the service changed since `validator`, else None.
+        gcloud cannot send conditional requests, so this describes the service every time.
+        """
+        from .cached import service_validator
+        details = self.get_service_details(service_name, region)
+        if not details or service_validator(details) == validator:
+            return None, etag
+        return details, etag
+
+    @profiled()
+    def get_image_digest(self, image_url: str, region: str, revision: Optional[str] = None) -> Optional[str]:
+        """
+        Returns the digest ('sha256:...') of the image the revision is serving, or None.
+        Cloud Run resolves tags at deploy time and records the result on the revision.
+        """
+        if "@" in image_url:
+            return image_url.split("@", 1)[1]
+        if not revision:
+            return None
+        try:
             cmd = [
-                "gcloud", "artifacts", "docker", "images", "describe", image_url,
-                "--format=json"
+                "gcloud", "run", "revisions", "describe", revision,
+                "--project", self.project_id,
+                "--region", region,
+                "--format=value(status.imageDigest)"
             ]
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            result = run_subprocess(cmd, capture_output=True, text=True, check=True)
+            resolved = result.stdout.strip()
+            return resolved.split("@", 1)[1] if "@" in resolved else None
+        except subprocess.CalledProcessError as e:
+            console.print(f"[yellow]⚠️ Could not resolve the image digest of {revision}: {e.stderr}[/yellow]")
+            return None
+
+    def commit_from_labels(self, labels: Dict[str, str]) -> Optional[str]:
+        """
+        Looks for a VCS ref in the image labels.
+        """
+        # Common label keys
+        validation_keys = [
+            "org.opencontainers.image.revision",
+            "org.label-schema.vcs-ref",
+            "gcb-build-id", # If we have build ID, we might need another call, but let's check config first
+        ]
+
+        for key in validation_keys:
+            if key in labels:
+                return labels[key]
+
+        # Check build info if available (image_summary.build_details) - specific to GCR/GAR
+        # This part is tricky as structure varies.
+        # Simplified flow: assume the tag IS the commit hash for this MVP or close enough.
+        return None
+
+    @profiled()
+    def get_image_labels(self, image_url: str) -> Optional[Dict[str, str]]:
+        """
+        Returns the config labels of the image, or None if it could not be described.
+        Raises ImageNotFound if every registry reports that the image does not exist.
+        All registry lookups run at the same time and the first successful answer wins.
+        """
+        lookups = self.image_lookups(image_url)
+        if len(lookups) == 1:
+            return lookups[0]()
+
+        pool = ThreadPoolExecutor(max_workers=len(lookups))
+        try:
+            futures = [pool.submit(lookup) for lookup in lookups]
+            not_found = 0
+            for future in as_completed(futures):
+                try:
+                    labels = future.result()
+                except ImageNotFound:
+                    not_found += 1
+                    continue
+                except Exception:
+                    continue
+                if labels is not None:
+                    return labels
+            if not_found == len(lookups):
+                raise ImageNotFound(image_url)
+            return None
+        finally:
+            # Do not wait for the slower registry once we have an answer.
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def image_lookups(self, image_url: str) -> List[Callable[[], Optional[Dict[str, str]]]]:
+        """
+        Returns the candidate label lookups for an image: Artifact Registry and Container Registry.
+        """
+        def describe(registry_cmd: List[str]) -> Optional[Dict[str, str]]:
+            cmd = ["gcloud"] + registry_cmd + [image_url, "--format=json"]
+            with profiler.span(f"gcloud {registry_cmd[0]} describe", "subprocess"):
+                result = run_subprocess(cmd, capture_output=True, text=True)
             if result.returncode != 0:
-                # Fallback to container registry if artifact registry fails
-                cmd = [
-                    "gcloud", "container", "images", "describe", image_url,
-                    "--format=json"
-                ]
-                result = subprocess.run(cmd, capture_output=True, text=True)
-                if result.returncode != 0:
-                    console.print(f"[yellow]⚠️ Could not describe image {image_url}[/yellow]")
-                    return None
-            
+                if any(marker in (result.stderr or "").lower() for marker in NOT_FOUND_MARKERS):
+                    raise ImageNotFound(image_url)
+                return None
             image_data = json.loads(result.stdout)
-            
-            # Look for VCS ref in labels
-            # Common label keys
-            validation_keys = [
-                "org.opencontainers.image.revision",
-                "org.label-schema.vcs-ref",
-                "gcb-build-id", # If we have build ID, we might need another call, but let's check config first
-            ]
-            
             # Check basic config labels
             config = image_data.get("config", {})
-            labels = config.get("config", {}).get("labels", {})
-            
-            for key in validation_keys:
-                if key in labels:
-                    return labels[key]
-            
-            # Check build info if available (image_summary.build_details) - specific to GCR/GAR
-            # This part is tricky as structure varies. 
-            # Simplified flow: assume the tag IS the commit hash for this MVP or close enough.
-            
-            return None
+            return config.get("config", {}).get("labels", {})
 
+        return [
+            lambda: describe(["artifacts", "docker", "images", "describe"]),
+            lambda: describe(["container", "images", "describe"]),
+        ]
+
+
+BACKENDS = ("api", "gcloud")
+
+def create_provider(project_id: str, backend: str = "api", cache: bool = True, refresh: bool = False):
+    """
+    Creates a provider for the requested backend.
+    'api' keeps one authenticated HTTP client for the whole run, 'gcloud' shells out per call.
+    Falls back to 'gcloud' if the API client cannot be set up (missing libraries or credentials).
+    With `cache`, listings, descriptions and image commits are served from the on-disk caches
+    (`refresh` bypasses them for this run).
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}'. Expected one of: {', '.join(BACKENDS)}")
+
+    image_cache = None
+    if cache:
+        from .cached import ImageCommitCache
+        image_cache = ImageCommitCache(refresh=refresh)
+
+    provider: Optional[GCPProvider] = None
+    if backend == "api":
+        try:
+            from .gcp_api import GCPApiProvider
+            provider = GCPApiProvider(project_id, image_cache=image_cache)
         except Exception as e:
-            console.print(f"[bold red]❌ Error analyzing image:[/bold red] {e}")
-            return None
+            console.print(f"[yellow]⚠️ API backend unavailable ({e}). Falling back to gcloud.[/yellow]")
+
+    if provider is None:
+        provider = GCPProvider(project_id, image_cache=image_cache)
+
+    if cache:
+        from .cached import CachedProvider
+        return CachedProvider(provider, refresh=refresh)
+    return provider
@@ -0,0 +1,302 @@
+from typing import Optional, List, Dict, Any, Callable, Tuple
+from urllib.parse import quote
+import urllib.request
+import urllib.error
+import json
+import os
+
+from .gcp import GCPProvider, ImageNotFound
+from ..profiling import profiled, profiler
+from ..console import console
+
+
+CLOUD_PLATFORM_SCOPE = "https://www.googleapis.com/auth/cloud-platform"
+
+# Accept both Docker and OCI manifests (and their multi-arch indexes) from the registry.
+MANIFEST_MEDIA_TYPES = ", ".join([
+    "application/vnd.docker.distribution.manifest.v2+json",
+    "application/vnd.docker.distribution.manifest.list.v2+json",
+    "application/vnd.oci.image.manifest.v1+json",
+    "application/vnd.oci.image.index.v1+json",
+])
+
+
+class TransportError(Exception):
+    """Raised when a request could not be sent or returned an error status."""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class HttpResponse:
+    def __init__(self, status: int, headers: Dict[str, str], body: bytes):
+        self.status = status
+        self.headers = {k.lower(): v for k, v in headers.items()}
+        self.body = body
+
+    def json(self) -> Any:
+        return json.loads(self.body) if self.body else {}
+
+
+class UrllibTransport:
+    """
+    Minimal stdlib HTTP transport.
+    Without a token provider it sends unauthenticated requests, which is what a local fake server needs.
+    """
+
+    def __init__(self, token_provider: Optional[Callable[[], str]] = None, timeout: float = 30.0):
+        self.token_provider = token_provider
+        self.timeout = timeout
+
+    def request(self, method: str, url: str, headers: Optional[Dict[str, str]] = None) -> HttpResponse:
+        headers = dict(headers or {})
+        if self.token_provider:
+            headers["Authorization"] = f"Bearer {self.token_provider()}"
+        req = urllib.request.Request(url, method=method, headers=headers)
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                return HttpResponse(resp.status, dict(resp.headers), resp.read())
+        except urllib.error.HTTPError as e:
+            return HttpResponse(e.code, dict(e.headers or {}), e.read())
+        except (urllib.error.URLError, OSError) as e:
+            raise TransportError(f"{method} {url} failed: {e}")
+
+
+class AuthorizedSessionTransport:
+    """
+    Transport backed by a single google-auth AuthorizedSession.
+    Credentials come from Application Default Credentials and are refreshed in-process,
+    and the underlying connection pool is reused for every call.
+    """
+
+    def __init__(self, timeout: float = 30.0):
+        import google.auth
+        from google.auth.transport.requests import AuthorizedSession
+
+        credentials, _ = google.auth.default(scopes=[CLOUD_PLATFORM_SCOPE])
+        self.session = AuthorizedSession(credentials)
+        self.timeout = timeout
+
+    def request(self, method: str, url: str, headers: Optional[Dict[str, str]] = None) -> HttpResponse:
+        try:
+            resp = self.session.request(method, url, headers=headers, timeout=self.timeout)
+        except Exception as e:
+            raise TransportError(f"{method} {url} failed: {e}")
+        return HttpResponse(resp.status_code, dict(resp.headers), resp.content)
+
+
+class GCPApiProvider(GCPProvider):
+    """
+    GCPProvider that talks to the Cloud Run Admin API (v1) and the container registry
+    over one in-process client instead of launching `gcloud` per call.
+    The v1 API returns the same Knative-style JSON as `gcloud ... --format=json`,
+    so `extract_metadata` works unchanged.
+
+    `endpoint` redirects every request (Cloud Run and registry) to another base URL,
+    e.g. a local fake server. It defaults to the AG_RUN_API_ENDPOINT environment variable.
+    """
+
+    RUN_ENDPOINT = "https://run.googleapis.com"
+    # A region costs one request on the shared client, so discovery fans out per region
+    REGIONAL_LISTING = True
+    REGIONAL_RUN_ENDPOINT = "https://{region}-run.googleapis.com"
+
+    def __init__(self, project_id: str, transport: Optional[Any] = None, endpoint: Optional[str] = None, image_cache: Optional[Any] = None):
+        super().__init__(project_id, image_cache=image_cache)
+        self.endpoint = (endpoint or os.environ.get("AG_RUN_API_ENDPOINT") or "").rstrip("/") or None
+        if transport is None:
+            # A custom endpoint is a local stand-in, so skip credential loading for it.
+            transport = UrllibTransport() if self.endpoint else AuthorizedSessionTransport()
+        self.transport = transport
+
+    # --- Helpers ---
+
+    def _run_url(self, region: Optional[str] = None) -> str:
+        if self.endpoint:
+            return f"{self.endpoint}/regions/{region}" if region else self.endpoint
+        if region:
+            return self.REGIONAL_RUN_ENDPOINT.format(region=region)
+        return self.RUN_ENDPOINT
+
+    def _registry_url(self, host: str) -> str:
+        if self.endpoint:
+            return f"{self.endpoint}/registry/{host}"
+        return f"https://{host}"
+
+    def _get(self, url: str, headers: Optional[Dict[str, str]] = None) -> HttpResponse:
+        resp = self.transport.request("GET", url, headers=headers)
+        profiler.count("rpcs", nbytes=len(resp.body))
+        if resp.status >= 400:
+            message = resp.body.decode("utf-8", errors="replace")[:500]
+            raise TransportError(f"GET {url} returned {resp.status}: {message}", status=resp.status)
+        return resp
+
+    def _namespace_url(self, region: Optional[str] = None) -> str:
+        return f"{self._run_url(region)}/apis/serving.knative.dev/v1/namespaces/{quote(self.project_id)}"
+
+    # --- Cloud Run ---
+
+    def _list_items(self, url: str) -> List[Dict[str, Any]]:
+        items: List[Dict[str, Any]] = []
+        continue_token = None
+        while True:
+            page_url = url + (f"?continue={quote(continue_token)}" if continue_token else "")
+            data = self._get(page_url).json()
+            items.extend(data.get("items", []))
+            continue_token = data.get("metadata", {}).get("continue")
+            if not continue_token:
+                return items
+
+    @profiled()
+    def list_services(self) -> List[Dict[str, Any]]:
+        """
+        Lists Cloud Run services in the project across all regions.
+        """
+        try:
+            return self._list_items(f"{self._namespace_url()}/services")
+        except TransportError as e:
+            console.print(f"[bold red]❌ Error listing services:[/bold red] {e}")
+            return []
+
+    @profiled()
+    def list_regions(self) -> List[str]:
+        """
+        Lists the regions where Cloud Run is available for the project.
+        """
+        try:
+            regions: List[str] = []
+            url = f"{self._run_url()}/v1/projects/{quote(self.project_id)}/locations"
+            page_token = None
+            while True:
+                page_url = url + (f"?pageToken={quote(page_token)}" if page_token else "")
+                data = self._get(page_url).json()
+                regions.extend(loc["locationId"] for loc in data.get("locations", []) if loc.get("locationId"))
+                page_token = data.get("nextPageToken")
+                if not page_token:
+                    return regions
+        except TransportError as e:
+            console.print(f"[bold red]❌ Error listing regions:[/bold red] {e}")
+            return []
+
+    @profiled()
+    def list_services_in_region(self, region: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Lists Cloud Run services deployed in a single region.
+        Returns None (rather than an empty list) if the region could not be listed.
+        """
+        try:
+            return self._list_items(f"{self._namespace_url(region)}/services")
+        except TransportError as e:
+            console.print(f"[bold red]❌ Error listing services in {region}:[/bold red] {e}")
+            return None
+
+    @profiled()
+    def get_service_details(self, service_name: str, region: str) -> Dict[str, Any]:
+        """
+        Gets details of a specific Cloud Run service.
+        """
+        try:
+            url = f"{self._namespace_url(region)}/services/{quote(service_name)}"
+            return self._get(url).json()
+        except TransportError as e:
+            console.print(f"[bold red]❌ Error describing service:[/bold red] {e}")
+            return {}
+
+    @profiled()
+    def poll_service(self, service_name: str, region: str, validator: Optional[str], etag: Optional[str] = None) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        Returns (details, etag): details only if the service changed since `validator`, else None.
+        With an ETag from the previous poll the request is conditional, and an unchanged service
+        costs a bodiless 304.
+        """
+        from .cached import service_validator
+        url = f"{self._namespace_url(region)}/services/{quote(service_name)}"
+        resp = self._get(url, headers={"If-None-Match": etag} if etag else None)
+        etag = resp.headers.get("etag") or etag
+        if resp.status == 304:
+            return None, etag
+        details = resp.json()
+        if service_validator(details) == validator:
+            return None, etag
+        return details, etag
+
+    @profiled()
+    def get_image_digest(self, image_url: str, region: str, revision: Optional[str] = None) -> Optional[str]:
+        """
+        Returns the digest ('sha256:...') of the image the revision is serving, or None.
+        Reads the revision's status.imageDigest, falling back to resolving the tag in the registry.
+        """
+        if "@" in image_url:
+            return image_url.split("@", 1)[1]
+        if revision:
+            try:
+                resolved = self._get(f"{self._namespace_url(region)}/revisions/{quote(revision)}").json()
+                resolved = resolved.get("status", {}).get("imageDigest", "")
+                if "@" in resolved:
+                    return resolved.split("@", 1)[1]
+            except (TransportError, ValueError):
+                pass
+        try:
+            host, path, ref = self._split_image(image_url)
+            resp = self._get(f"{self._registry_url(host)}/v2/{path}/manifests/{ref}", headers={"Accept": MANIFEST_MEDIA_TYPES})
+            return resp.headers.get("docker-content-digest")
+        except TransportError as e:
+            console.print(f"[yellow]⚠️ Could not resolve the image digest of {image_url}: {e}[/yellow]")
+            return None
+
+    # --- Registry ---
+
+    def _split_image(self, image_url: str):
+        """Splits 'host/path[:tag][@digest]' into (host, path, reference)."""
+        host, _, rest = image_url.partition("/")
+        if "@" in rest:
+            path, _, ref = rest.partition("@")
+            path = path.rsplit(":", 1)[0]
+        elif ":" in rest.rsplit("/", 1)[-1]:
+            path, _, ref = rest.rpartition(":")
+        else:
+            path, ref = rest, "latest"
+        return host, path, ref
+
+    def image_lookups(self, image_url: str) -> List[Callable[[], Optional[Dict[str, str]]]]:
+        """
+        The registry's Docker v2 API serves both Artifact Registry and Container Registry hosts,
+        so a single lookup is enough.
+        """
+        return [lambda: self._registry_labels(image_url)]
+
+    @profiled()
+    def _registry_labels(self, image_url: str) -> Optional[Dict[str, str]]:
+        """
+        Reads the image config labels through the registry's Docker v2 API.
+        Raises ImageNotFound on a 404; other failures (timeouts, 5xx, auth) return None.
+        """
+        try:
+            host, path, ref = self._split_image(image_url)
+            base = f"{self._registry_url(host)}/v2/{path}"
+            manifest = self._get(f"{base}/manifests/{ref}", headers={"Accept": MANIFEST_MEDIA_TYPES}).json()
+
+            if "manifests" in manifest:
+                # Multi-arch index: prefer linux/amd64, otherwise take the first entry
+                entries = manifest["manifests"]
+                chosen = next(
+                    (m for m in entries if m.get("platform", {}).get("os") == "linux"
+                     and m.get("platform", {}).get("architecture") == "amd64"),
+                    entries[0] if entries else None,
+                )
+                if not chosen:
+                    return {}
+                manifest = self._get(f"{base}/manifests/{chosen['digest']}", headers={"Accept": MANIFEST_MEDIA_TYPES}).json()
+
+            config_digest = manifest.get("config", {}).get("digest")
+            if not config_digest:
+                return {}
+            config = self._get(f"{base}/blobs/{config_digest}").json()
+            return config.get("config", {}).get("Labels") or {}
+        except TransportError as e:
+            if e.status == 404:
+                raise ImageNotFound(image_url) from e
+            return None
+        except ValueError:
+            return None
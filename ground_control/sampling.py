@@ -0,0 +1,194 @@
+"""
+Bounded-memory row sampling for the MCP server.
+
+Rows are read through a server-side (named) cursor in fixed-size pages, so at most one page is
+held at a time no matter how large the table is. Output stops at whichever of the row, byte or
+column limits is hit first, and large values are truncated.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+import datetime
+import decimal
+import json
+import uuid
+
+from .schema import SchemaError, SchemaIntrospector, _driver
+
+DEFAULT_ROW_LIMIT = 20
+MAX_ROW_LIMIT = 1000
+DEFAULT_BYTE_LIMIT = 16 * 1024
+MAX_BYTE_LIMIT = 256 * 1024
+DEFAULT_COLUMN_LIMIT = 24
+MAX_COLUMN_LIMIT = 200
+DEFAULT_VALUE_CHARS = 200
+MAX_VALUE_CHARS = 8 * 1024
+PAGE_SIZE = 100
+STATEMENT_TIMEOUT_MS = 15000
+WIDE_TYPES = ("text", "character varying", "json", "jsonb", "bytea", "xml", "tsvector")
+
+
+def quote_ident(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def quote_table(schema: str, table: str) -> str:
+    # Takes the catalog's parts as they are: re-splitting "schema.table" breaks on dotted names
+    return f"{quote_ident(schema)}.{quote_ident(table)}"
+
+
+def is_wide(type_name: str) -> bool:
+    """Column types whose values can be arbitrarily large."""
+    return type_name.endswith("[]") or type_name.split("(")[0] in WIDE_TYPES
+
+
+def truncate_value(value: Any, max_chars: int) -> Any:
+    """Makes a value JSON-safe and cuts long text/binary down to max_chars."""
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        data = bytes(value)
+        keep = max_chars // 2
+        preview = "\\x" + data[:keep].hex()
+        return preview if len(data) <= keep else f"{preview}…(+{len(data) - keep} bytes)"
+    if isinstance(value, (datetime.date, datetime.time, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    text = value if isinstance(value, str) else json.dumps(value, default=str, separators=(",", ":"))
+    if len(text) > max_chars:
+        return f"{text[:max_chars]}…(truncated)"
+    return text
+
+
+class TableSampler:
+    """
+    Reads sample rows or equality-filtered rows from one table.
+
+    Table, projected and filtered columns are checked against the catalog (via the introspector's
+    cache), so identifiers never come from the caller unvalidated; filter values are always bound
+    as parameters. Connections come from the introspector's pool and are read-only.
+    """
+
+    def __init__(self, introspector: SchemaIntrospector, page_size: int = PAGE_SIZE):
+        self.introspector = introspector
+        self.page_size = page_size
+
+    def _build_query(self, table: Dict[str, Any], columns: List[str], filters: Dict[str, Any], limit: int, value_chars: int) -> Tuple[str, List[Any]]:
+        types = {c["name"]: c["type"] for c in table["columns"]}
+        selects = []
+        for column in columns:
+            if is_wide(types[column]):
+                # Cut wide values on the server so a single huge cell never crosses the wire whole
+                selects.append(f"left({quote_ident(column)}::text, {int(value_chars) + 1})")
+            else:
+                selects.append(quote_ident(column))
+        sql = f"SELECT {', '.join(selects)} FROM {quote_table(table['schema'], table['table'])}"
+        params: List[Any] = []
+        clauses = []
+        for column, value in filters.items():
+            if value is None:
+                clauses.append(f"{quote_ident(column)} IS NULL")
+            else:
+                clauses.append(f"{quote_ident(column)} = %s")
+                params.append(value)
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " LIMIT %s"
+        params.append(limit + 1)  # one extra row tells us whether the output was cut short
+        return sql, params
+
+    def _read(self, sql: str, params: List[Any], accept) -> None:
+        """
+        Streams the query through a server-side cursor, one page at a time, passing each row to
+        `accept` until it returns False.
+        """
+        with self.introspector.pool.connection() as conn:
+            setup = conn.cursor()
+            setup.execute(f"SET LOCAL statement_timeout = {STATEMENT_TIMEOUT_MS}")
+            setup.close()
+            cur = conn.cursor(name=f"ag_sample_{uuid.uuid4().hex[:12]}")
+            cur.itersize = self.page_size
+            try:
+                cur.execute(sql, params)
+                while True:
+                    page = cur.fetchmany(self.page_size)
+                    if not page:
+                        return
+                    for row in page:
+                        if not accept(row):
+                            return
+            finally:
+                cur.close()
+
+    def sample(
+        self,
+        table_name: str,
+        columns: Optional[List[str]] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        row_limit: int = DEFAULT_ROW_LIMIT,
+        byte_limit: int = DEFAULT_BYTE_LIMIT,
+        column_limit: int = DEFAULT_COLUMN_LIMIT,
+        value_chars: int = DEFAULT_VALUE_CHARS,
+    ) -> Dict[str, Any]:
+        """
+        Returns {"table", "columns", "omitted_columns", "rows", "stopped"} where rows are lists in
+        column order and `stopped` says which limit ended the read (None if the table ran out).
+        Raises ValueError for unknown tables or columns, and SchemaError if the query fails.
+        """
+        table = self.introspector.table_schema(table_name)
+        if table is None:
+            raise ValueError(f"Unknown table '{table_name}'")
+        known = [c["name"] for c in table["columns"]]
+        filters = filters or {}
+        unknown = [c for c in list(columns or []) + list(filters) if c not in known]
+        if unknown:
+            raise ValueError(f"Unknown column(s) on {table['name']}: {', '.join(unknown)}")
+
+        row_limit = max(1, min(row_limit, MAX_ROW_LIMIT))
+        byte_limit = max(256, min(byte_limit, MAX_BYTE_LIMIT))
+        column_limit = max(1, min(column_limit, MAX_COLUMN_LIMIT))
+        value_chars = max(16, min(value_chars, MAX_VALUE_CHARS))
+        selected = list(columns) if columns else known
+        omitted = selected[column_limit:]
+        selected = selected[:column_limit]
+
+        sql, params = self._build_query(table, selected, filters, row_limit, value_chars)
+        rows: List[List[Any]] = []
+        state = {"bytes": 0, "stopped": None}
+
+        def accept(raw: Tuple) -> bool:
+            if len(rows) >= row_limit:
+                state["stopped"] = "rows"
+                return False
+            row = [truncate_value(v, value_chars) for v in raw]
+            row_bytes = len(json.dumps(row, ensure_ascii=False, separators=(",", ":")).encode("utf-8")) + 1
+            if state["bytes"] + row_bytes > byte_limit:
+                state["stopped"] = "bytes"
+                return False
+            rows.append(row)
+            state["bytes"] += row_bytes
+            return True
+
+        try:
+            self._read(sql, params, accept)
+        except _driver().Error as e:
+            # e.g. statement timeout, permission denied: report it instead of raising through the tool
+            raise SchemaError(f"Query failed: {str(e).strip()}") from e
+        return {"table": table["name"], "columns": selected, "omitted_columns": omitted, "rows": rows, "stopped": state["stopped"]}
+
+
+def format_sample(result: Dict[str, Any]) -> str:
+    """Renders a sample as a header line plus one compact JSON array per row."""
+    lines = [f"{result['table']} ({', '.join(result['columns'])})"]
+    lines += [json.dumps(row, ensure_ascii=False, separators=(",", ":")) for row in result["rows"]]
+    notes = []
+    if result["omitted_columns"]:
+        notes.append(f"{len(result['omitted_columns'])} column(s) omitted: {', '.join(result['omitted_columns'])}")
+    if result["stopped"] == "rows":
+        notes.append("more rows available (row limit reached)")
+    elif result["stopped"] == "bytes":
+        notes.append("output cut at the byte limit")
+    if not result["rows"]:
+        notes.append("no rows")
+    if notes:
+        lines.append("(" + "; ".join(notes) + ")")
+    return "\n".join(lines)
@@ -0,0 +1,414 @@
+"""
+Lazy PostgreSQL schema introspection for the MCP server.
+
+Connects through the local ports that ProxyManager maps Cloud SQL instances to. Table names are
+listed page by page; columns, indexes and foreign keys are loaded per table on demand and kept in
+an LRU cache that is invalidated when the table's catalog entries change (DDL).
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from collections import OrderedDict
+from contextlib import contextmanager
+import base64
+import binascii
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+
+from .ports import PortAllocator, _pid_alive
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_CACHE_SIZE = 256
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 1000
+# A cached table schema is trusted this long before its DDL fingerprint is checked again
+REVALIDATE_SECONDS = 5.0
+
+SYSTEM_SCHEMAS = ("pg_catalog", "information_schema")
+# Tables, partitioned tables, views, materialized views, foreign tables
+TABLE_KINDS = ("r", "p", "v", "m", "f")
+
+
+class SchemaError(Exception):
+    """Raised when no database is configured, the driver is missing, or a query fails."""
+
+
+def encode_page_token(schema: str, table: str) -> str:
+    # Schema and table names may contain any character, "." included
+    return base64.urlsafe_b64encode(json.dumps([schema, table]).encode("utf-8")).decode("ascii")
+
+
+def decode_page_token(token: str) -> Tuple[str, str]:
+    try:
+        schema, table = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+    except (binascii.Error, UnicodeError, ValueError, TypeError) as e:
+        raise SchemaError(f"Invalid page token '{token}'") from e
+    return str(schema), str(table)
+
+
+def _driver() -> Any:
+    try:
+        import psycopg
+        return psycopg
+    except ImportError:
+        pass
+    try:
+        import psycopg2
+        return psycopg2
+    except ImportError:
+        raise SchemaError("Schema introspection needs a PostgreSQL driver: pip install 'psycopg[binary]' (or psycopg2).")
+
+
+def published_env(instance: Optional[str] = None) -> Dict[str, str]:
+    """
+    Plain env vars of the pulled service that uses `instance` (else the first pulled service), as
+    published in the context snapshot. Secret values are never published, so a DB_PASSWORD held in
+    Secret Manager is not among them.
+    """
+    from .snapshot import SnapshotReader
+    published = SnapshotReader().sections(["service", "services"])
+    services = list((published.get("services") or {}).values()) or [published.get("service") or {}]
+    chosen = next((s for s in services if instance and instance in s.get("cloud_sql_instances", [])), services[0])
+    return {k: str(v) for k, v in (chosen.get("env_vars") or {}).items()}
+
+
+def proxy_ports() -> Dict[str, int]:
+    """
+    Returns instance -> local port for running proxies: as published by `ag pull` in the context
+    snapshot, else as leased by a live `ag` process, else the last known assignment of each instance.
+    """
+    from .snapshot import SnapshotReader
+    published = SnapshotReader().section("proxies") or {}
+    if published.get("ports") and _pid_alive(published.get("pid", 0)):
+        return {instance: int(port) for instance, port in published["ports"].items()}
+    allocator = PortAllocator()
+    return allocator.live_ports() or allocator.stable_ports()
+
+
+def connection_params(instance: Optional[str] = None, env: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """
+    Builds driver connection parameters from `env` (default: os.environ, falling back to the
+    pulled service's plain env vars from the context snapshot).
+
+    AG_DB_DSN is used verbatim when set. Otherwise the proxy port for `instance` (or AG_DB_INSTANCE,
+    or the only mapped instance) is combined with the service's DB_USER / DB_PASSWORD / DB_NAME.
+    AG_DB_PORT overrides the port lookup. The MCP server does not see the pull's secret values, so a
+    password kept in Secret Manager must be set in its own environment (DB_PASSWORD or AG_DB_DSN).
+    """
+    published = env is None
+    env = os.environ if env is None else env
+    dsn = env.get("AG_DB_DSN")
+    if dsn:
+        return {"conninfo": dsn}
+
+    port = env.get("AG_DB_PORT")
+    if not port:
+        ports = proxy_ports()
+        instance = instance or env.get("AG_DB_INSTANCE")
+        if instance:
+            port = ports.get(instance)
+            if port is None:
+                raise SchemaError(f"No local proxy port known for instance '{instance}'. Run 'ag pull' first.")
+        elif len(ports) == 1:
+            port = next(iter(ports.values()))
+        elif ports:
+            raise SchemaError(f"Several Cloud SQL proxies are mapped ({', '.join(sorted(ports))}); set AG_DB_INSTANCE.")
+        else:
+            raise SchemaError("No Cloud SQL proxy is running. Run 'ag pull' first, or set AG_DB_DSN.")
+
+    if published:
+        env = {**published_env(instance), **env}
+    params = {
+        "host": "127.0.0.1",
+        "port": int(port),
+        "user": env.get("DB_USER", "postgres"),
+        "dbname": env.get("DB_NAME", "postgres"),
+        "connect_timeout": 10,
+    }
+    password = env.get("DB_PASSWORD") or env.get("DB_PASS")
+    if password:
+        params["password"] = password
+    return params
+
+
+class ConnectionPool:
+    """
+    Small fixed-size pool of database connections, opened lazily.
+    Connections that raise are discarded rather than returned to the pool.
+    """
+
+    def __init__(self, connect: Callable[[], Any], size: int = DEFAULT_POOL_SIZE):
+        self._connect = connect
+        self.size = size
+        self._idle: "queue.LifoQueue[Any]" = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self, timeout: float = 30.0):
+        conn = self._acquire(timeout)
+        try:
+            yield conn
+            conn.rollback()  # end the read-only transaction, keep the connection clean
+        except Exception:
+            self._discard(conn)
+            raise
+        self._idle.put(conn)
+
+    def _acquire(self, timeout: float) -> Any:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_open = self._opened < self.size
+            if can_open:
+                self._opened += 1
+        if can_open:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise SchemaError(f"No database connection available after {timeout:.0f}s")
+
+    def _discard(self, conn: Any) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._opened -= 1
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+            except Exception:
+                pass
+        with self._lock:
+            self._opened = 0
+
+
+def connect_pool(instance: Optional[str] = None, size: int = DEFAULT_POOL_SIZE, env: Optional[Dict[str, str]] = None) -> ConnectionPool:
+    driver = _driver()
+    params = connection_params(instance, env)
+
+    def connect():
+        try:
+            if "conninfo" in params:
+                conn = driver.connect(params["conninfo"])
+            else:
+                conn = driver.connect(**params)
+        except driver.Error as e:
+            hint = "" if "conninfo" in params or "password" in params else (
+                " (no password: secret values are not published to the MCP server, set DB_PASSWORD or AG_DB_DSN in its environment)"
+            )
+            raise SchemaError(f"Could not connect to the database: {str(e).strip()}{hint}") from e
+        # Introspection and sampling never write
+        if hasattr(conn, "read_only"):
+            conn.read_only = True
+        else:
+            conn.set_session(readonly=True)
+        return conn
+
+    return ConnectionPool(connect, size)
+
+
+class SchemaIntrospector:
+    """
+    Answers table listings and per-table schemas from pg_catalog.
+
+    Listings are keyset-paginated ("schema.table" page tokens), so databases with thousands of
+    tables are never read in one go. Table schemas are cached (LRU, `cache_size` entries) together
+    with a fingerprint of the table's catalog rows; a cached entry older than `revalidate_after`
+    seconds is re-fingerprinted and reloaded only if the DDL changed.
+    """
+
+    def __init__(self, pool: ConnectionPool, cache_size: int = DEFAULT_CACHE_SIZE, revalidate_after: float = REVALIDATE_SECONDS):
+        self.pool = pool
+        self.cache_size = cache_size
+        self.revalidate_after = revalidate_after
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _query(self, sql: str, params: Tuple = ()) -> List[Tuple]:
+        """Runs one catalog query. Driver errors (proxy down, table dropped mid-call) raise SchemaError."""
+        try:
+            with self.pool.connection() as conn:
+                cur = conn.cursor()
+                try:
+                    cur.execute(sql, params)
+                    return cur.fetchall()
+                finally:
+                    cur.close()
+        except _driver().Error as e:
+            raise SchemaError(f"Query failed: {str(e).strip()}") from e
+
+    # --- Listing ---
+
+    def list_tables(self, schema: Optional[str] = None, page_token: Optional[str] = None, page_size: int = DEFAULT_PAGE_SIZE) -> Dict[str, Any]:
+        """
+        Returns {"tables": ["schema.table", ...], "next_page_token": str | None}.
+        Only names are read; pass next_page_token back to continue. Raises SchemaError for a
+        malformed token.
+        """
+        page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+        sql = (
+            "SELECT n.nspname, c.relname FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+            "WHERE c.relkind = ANY(%s) AND n.nspname <> ALL(%s) AND n.nspname NOT LIKE 'pg_toast%%' "
+            "AND n.nspname NOT LIKE 'pg_temp_%%'"
+        )
+        params: List[Any] = [list(TABLE_KINDS), list(SYSTEM_SCHEMAS)]
+        if schema:
+            sql += " AND n.nspname = %s"
+            params.append(schema)
+        if page_token:
+            after_schema, after_table = decode_page_token(page_token)
+            sql += " AND (n.nspname, c.relname) > (%s, %s)"
+            params += [after_schema, after_table]
+        sql += " ORDER BY n.nspname, c.relname LIMIT %s"
+        params.append(page_size + 1)
+
+        rows = self._query(sql, tuple(params))
+        names = [f"{nsp}.{rel}" for nsp, rel in rows[:page_size]]
+        next_token = encode_page_token(*rows[page_size - 1]) if len(rows) > page_size else None
+        return {"tables": names, "next_page_token": next_token}
+
+    # --- Per-table schema ---
+
+    def _resolve(self, table_name: str) -> Optional[Tuple[int, str, str]]:
+        """Returns (oid, schema, table) for a qualified or search_path-visible table name."""
+        schema, _, table = table_name.rpartition(".")
+        if schema:
+            rows = self._query(
+                "SELECT c.oid, n.nspname, c.relname FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+                "WHERE n.nspname = %s AND c.relname = %s AND c.relkind = ANY(%s)",
+                (schema, table, list(TABLE_KINDS)),
+            )
+        else:
+            rows = self._query(
+                "SELECT c.oid, n.nspname, c.relname FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+                "WHERE c.relname = %s AND c.relkind = ANY(%s) AND pg_table_is_visible(c.oid)",
+                (table, list(TABLE_KINDS)),
+            )
+        if not rows:
+            return None
+        oid, nsp, rel = rows[0]
+        return oid, nsp, rel
+
+    def _fingerprint(self, oid: int) -> Optional[str]:
+        """
+        Hash of the catalog rows describing a table. Any DDL on the table (columns, indexes,
+        constraints, renames) writes new versions of these rows and so changes their xmin.
+        """
+        rows = self._query(
+            "SELECT c.xmin::text, "
+            "(SELECT string_agg(a.xmin::text || ':' || a.attnum, ',' ORDER BY a.attnum) FROM pg_attribute a WHERE a.attrelid = c.oid), "
+            "(SELECT string_agg(i.indexrelid::text, ',' ORDER BY i.indexrelid) FROM pg_index i WHERE i.indrelid = c.oid), "
+            "(SELECT string_agg(k.oid::text || ':' || k.xmin::text, ',' ORDER BY k.oid) FROM pg_constraint k WHERE k.conrelid = c.oid) "
+            "FROM pg_class c WHERE c.oid = %s",
+            (oid,),
+        )
+        if not rows:
+            return None
+        return hashlib.sha256("|".join(str(part) for part in rows[0]).encode("utf-8")).hexdigest()
+
+    def _load(self, oid: int, schema: str, table: str) -> Dict[str, Any]:
+        columns = self._query(
+            "SELECT a.attname, format_type(a.atttypid, a.atttypmod), NOT a.attnotnull, pg_get_expr(d.adbin, d.adrelid) "
+            "FROM pg_attribute a LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum "
+            "WHERE a.attrelid = %s AND a.attnum > 0 AND NOT a.attisdropped ORDER BY a.attnum",
+            (oid,),
+        )
+        indexes = self._query(
+            "SELECT ic.relname, i.indisprimary, i.indisunique, pg_get_indexdef(i.indexrelid) "
+            "FROM pg_index i JOIN pg_class ic ON ic.oid = i.indexrelid WHERE i.indrelid = %s ORDER BY ic.relname",
+            (oid,),
+        )
+        foreign_keys = self._query(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s AND contype = 'f' ORDER BY conname",
+            (oid,),
+        )
+        return {
+            "name": f"{schema}.{table}",
+            # The parts are kept apart: either may contain "." (see sampling.quote_table)
+            "schema": schema,
+            "table": table,
+            "columns": [
+                {"name": name, "type": type_, "nullable": nullable, "default": default}
+                for name, type_, nullable, default in columns
+            ],
+            "indexes": [
+                {"name": name, "primary": primary, "unique": unique, "definition": definition}
+                for name, primary, unique, definition in indexes
+            ],
+            "foreign_keys": [{"name": name, "definition": definition} for name, definition in foreign_keys],
+        }
+
+    def table_schema(self, table_name: str) -> Optional[Dict[str, Any]]:
+        """Returns columns, indexes and foreign keys for one table, or None if it does not exist."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(table_name)
+            if entry:
+                self._cache.move_to_end(table_name)
+                if now - entry["checked_at"] < self.revalidate_after:
+                    return entry["schema"]
+
+        if entry:
+            fingerprint = self._fingerprint(entry["oid"])
+            if fingerprint == entry["fingerprint"]:
+                with self._lock:
+                    entry["checked_at"] = now
+                return entry["schema"]
+
+        resolved = self._resolve(table_name)
+        if resolved is None:
+            with self._lock:
+                self._cache.pop(table_name, None)
+            return None
+        oid, nsp, rel = resolved
+        fingerprint = self._fingerprint(oid)
+        schema = self._load(oid, nsp, rel)
+        with self._lock:
+            self._cache[table_name] = {"oid": oid, "fingerprint": fingerprint, "schema": schema, "checked_at": now}
+            self._cache.move_to_end(table_name)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return schema
+
+    def invalidate(self, table_name: Optional[str] = None) -> None:
+        with self._lock:
+            if table_name:
+                self._cache.pop(table_name, None)
+            else:
+                self._cache.clear()
+
+
+def summarize(ports: Dict[str, int], env: Dict[str, str], page_size: int = DEFAULT_PAGE_SIZE) -> Dict[str, Any]:
+    """
+    Lists the first page of table names behind each proxy, for the context snapshot.
+    Instances that cannot be reached (no driver, wrong credentials) are reported with an error.
+    """
+    summary: Dict[str, Any] = {}
+    for instance, port in ports.items():
+        pool = None
+        try:
+            pool = connect_pool(size=1, env={**env, "AG_DB_PORT": str(port)})
+            page = SchemaIntrospector(pool).list_tables(page_size=page_size)
+            summary[instance] = {"port": port, "tables": page["tables"], "truncated": bool(page["next_page_token"])}
+        except Exception as e:
+            summary[instance] = {"port": port, "error": str(e)}
+        finally:
+            if pool:
+                pool.close()
+    return summary
@@ -0,0 +1,286 @@
+"""
+Versioned, memory-mapped context snapshot shared between `ag pull` and the MCP server.
+
+Layout (little-endian):
+
+    header   magic "AGSNAP1\\0", format u32, reserved u32, generation u64, reserved u64
+    table    MAX_SECTIONS x (name 16s, generation u64, offset u64, length u64, capacity u64)
+    data     one slot per section, holding UTF-8 JSON
+
+Writers serialize on a file lock and follow a seqlock protocol: the header generation is odd
+while a write is in progress and even once it is complete. Each section records the generation
+that last wrote it, so readers decode only the sections that changed. The file only ever grows
+in place (readers' mappings stay valid); when too much space is dead it is compacted into a new
+file that replaces the old one atomically, which readers notice by inode.
+
+Secrets never go into the snapshot; `publish` rejects the reserved "secrets" section name.
+
+There is one snapshot per project directory, so pulls in different checkouts do not overwrite
+each other's context.
+"""
+from typing import Any, Dict, Iterable, Optional, Tuple
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+from .cache import runtime_dir
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-writer only
+    fcntl = None
+
+MAGIC = b"AGSNAP1\0"
+FORMAT_VERSION = 1
+MAX_SECTIONS = 8
+HEADER = struct.Struct("<8sIIQQ")
+ENTRY = struct.Struct("<16sQQQQ")
+GENERATION_OFFSET = 16
+DATA_START = 512
+MIN_CAPACITY = 4096
+COMPACT_MIN_BYTES = 1 << 20
+
+SECTIONS = ("service", "services", "proxies", "schema")
+FORBIDDEN_SECTIONS = ("secrets",)
+
+
+def default_snapshot_path(project_dir: Optional[str] = None) -> str:
+    """
+    Returns the snapshot path for a project directory (default: $AG_PROJECT_DIR, else the working
+    directory). $AG_SNAPSHOT_PATH overrides it.
+    """
+    override = os.environ.get("AG_SNAPSHOT_PATH")
+    if override:
+        return override
+    project_dir = os.path.realpath(project_dir or os.environ.get("AG_PROJECT_DIR") or os.getcwd())
+    key = hashlib.sha256(project_dir.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(runtime_dir(), f"context-{key}.snap")
+
+
+class SnapshotError(Exception):
+    """Raised for a corrupt snapshot or an invalid section."""
+
+
+def _read_table(buf: Any) -> Tuple[int, Dict[str, Tuple[int, int, int, int]]]:
+    """Returns (generation, {name: (generation, offset, length, capacity)}) without copying the data area."""
+    magic, version, _, generation, _ = HEADER.unpack_from(buf, 0)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise SnapshotError("Not a ground-control snapshot (or an incompatible version)")
+    sections = {}
+    for i in range(MAX_SECTIONS):
+        raw_name, gen, offset, length, capacity = ENTRY.unpack_from(buf, HEADER.size + i * ENTRY.size)
+        name = raw_name.rstrip(b"\0").decode("ascii")
+        if name:
+            sections[name] = (gen, offset, length, capacity)
+    return generation, sections
+
+
+class SnapshotWriter:
+    """
+    Publishes sections (service metadata, per-service summaries, proxy ports, schema summaries) into the snapshot.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or default_snapshot_path()
+
+    def publish(self, sections: Dict[str, Any]) -> int:
+        """Writes the given sections, leaving the others untouched. Returns the new generation."""
+        for name in sections:
+            if name in FORBIDDEN_SECTIONS:
+                raise SnapshotError(f"Section '{name}' must never be written to the snapshot")
+            if not name or len(name.encode("ascii")) > 16:
+                raise SnapshotError(f"Invalid section name '{name}'")
+        payloads = {name: json.dumps(value, separators=(",", ":"), sort_keys=True).encode("utf-8") for name, value in sections.items()}
+
+        os.makedirs(os.path.dirname(self.path), mode=0o700, exist_ok=True)
+        fd = self._open_locked()
+        try:
+            try:
+                if os.fstat(fd).st_size < DATA_START:
+                    self._initialize(fd)
+                generation = self._write(fd, payloads)
+                if self._should_compact(fd):
+                    self._compact(fd)
+                return generation
+            finally:
+                if fcntl:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+    def _open_locked(self) -> int:
+        """Opens and locks the snapshot, retrying if another writer compacted it into a new file meanwhile."""
+        while True:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            if not fcntl:
+                return fd
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                if os.stat(self.path).st_ino == os.fstat(fd).st_ino:
+                    return fd
+            except OSError:
+                pass
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def _initialize(self, fd: int) -> None:
+        os.ftruncate(fd, DATA_START)
+        os.pwrite(fd, HEADER.pack(MAGIC, FORMAT_VERSION, 0, 0, 0), 0)
+
+    def _write(self, fd: int, payloads: Dict[str, bytes]) -> int:
+        with mmap.mmap(fd, os.fstat(fd).st_size) as mm:
+            generation, table = _read_table(mm)
+        new_generation = generation + 2 - (generation & 1)
+        end = max(os.fstat(fd).st_size, DATA_START)
+
+        # Plan slots: reuse a section's slot when the payload fits, else append a bigger one
+        plan: Dict[str, Tuple[int, int]] = {}
+        for name, payload in payloads.items():
+            _, offset, _, capacity = table.get(name, (0, 0, 0, 0))
+            if offset and len(payload) <= capacity:
+                plan[name] = (offset, capacity)
+            else:
+                capacity = max(MIN_CAPACITY, len(payload) * 2)
+                plan[name] = (end, capacity)
+                end += capacity
+        if len(set(table) | set(plan)) > MAX_SECTIONS:
+            raise SnapshotError(f"A snapshot holds at most {MAX_SECTIONS} sections")
+        if end > os.fstat(fd).st_size:
+            os.ftruncate(fd, end)  # grow only; shrinking would fault readers' mappings
+
+        with mmap.mmap(fd, end) as mm:
+            struct.pack_into("<Q", mm, GENERATION_OFFSET, new_generation - 1)  # odd: write in progress
+            names = list(table)
+            for name, payload in payloads.items():
+                offset, capacity = plan[name]
+                mm[offset:offset + len(payload)] = payload
+                table[name] = (new_generation, offset, len(payload), capacity)
+                if name not in names:
+                    names.append(name)
+            for i, name in enumerate(names):
+                gen, offset, length, capacity = table[name]
+                ENTRY.pack_into(mm, HEADER.size + i * ENTRY.size, name.encode("ascii"), gen, offset, length, capacity)
+            struct.pack_into("<Q", mm, GENERATION_OFFSET, new_generation)
+            mm.flush()
+        return new_generation
+
+    def _should_compact(self, fd: int) -> bool:
+        size = os.fstat(fd).st_size
+        with mmap.mmap(fd, size, access=mmap.ACCESS_READ) as mm:
+            _, table = _read_table(mm)
+        live = sum(length for _, _, length, _ in table.values())
+        return size > COMPACT_MIN_BYTES and size > 4 * (live + DATA_START)
+
+    def _compact(self, fd: int) -> None:
+        """Rewrites live sections into a fresh file and swaps it in; readers remap on the new inode."""
+        with mmap.mmap(fd, os.fstat(fd).st_size, access=mmap.ACCESS_READ) as mm:
+            generation, table = _read_table(mm)
+            payloads = {name: bytes(mm[offset:offset + length]) for name, (_, offset, length, _) in table.items()}
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        tmp_fd = os.open(tmp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            self._initialize(tmp_fd)
+            os.pwrite(tmp_fd, struct.pack("<Q", generation), GENERATION_OFFSET)
+            self._write(tmp_fd, payloads)
+        finally:
+            os.close(tmp_fd)
+        os.replace(tmp_path, self.path)
+
+
+class SnapshotReader:
+    """
+    Reads the snapshot through a shared read-only mapping.
+
+    `refresh()` is cheap when nothing changed: one stat and one 8-byte read of the generation.
+    Only sections whose generation moved are decoded again; the rest are served from memory.
+    """
+
+    def __init__(self, path: Optional[str] = None, retries: int = 50):
+        self.path = path or default_snapshot_path()
+        self.retries = retries
+        self.generation = -1
+        self._mm: Optional[mmap.mmap] = None
+        self._inode: Optional[int] = None
+        self._sections: Dict[str, Tuple[int, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _map(self) -> bool:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            self._unmap()
+            return False
+        if self._mm is not None and stat.st_ino == self._inode and stat.st_size <= len(self._mm):
+            return True
+        if stat.st_size < DATA_START:
+            return False
+        self._unmap()
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), stat.st_size, access=mmap.ACCESS_READ)
+        if stat.st_ino != self._inode:
+            self.generation = -1
+            self._sections = {}
+        self._inode = stat.st_ino
+        return True
+
+    def _unmap(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+    def refresh(self) -> bool:
+        """Picks up a newer generation if there is one. Returns True if anything changed."""
+        with self._lock:
+            for _ in range(self.retries):
+                if not self._map():
+                    return False
+                mm = self._mm
+                (generation,) = struct.unpack_from("<Q", mm, GENERATION_OFFSET)
+                if generation == self.generation:
+                    return False
+                if generation & 1:
+                    time.sleep(0.001)  # a writer is mid-update
+                    continue
+                _, table = _read_table(mm)
+                if any(offset + length > len(mm) for _, offset, length, _ in table.values()):
+                    self._unmap()  # the file grew past our mapping
+                    continue
+                updated = {}
+                try:
+                    for name, (gen, offset, length, _) in table.items():
+                        cached = self._sections.get(name)
+                        if cached and cached[0] == gen:
+                            continue
+                        with memoryview(mm) as view:
+                            # Decode straight from the mapping, without an intermediate bytes copy
+                            updated[name] = (gen, json.loads(str(view[offset:offset + length], "utf-8")))
+                except ValueError:
+                    continue  # overwritten while decoding; the generation check below would fail too
+                (check,) = struct.unpack_from("<Q", mm, GENERATION_OFFSET)
+                if check != generation:
+                    continue  # torn read: a writer started meanwhile
+                self._sections.update(updated)
+                for name in set(self._sections) - set(table):
+                    del self._sections[name]
+                self.generation = generation
+                return True
+            return False
+
+    def section(self, name: str, default: Any = None) -> Any:
+        self.refresh()
+        with self._lock:
+            cached = self._sections.get(name)
+        return cached[1] if cached else default
+
+    def sections(self, names: Iterable[str] = SECTIONS) -> Dict[str, Any]:
+        self.refresh()
+        with self._lock:
+            return {name: self._sections[name][1] for name in names if name in self._sections}
+
+    def close(self) -> None:
+        with self._lock:
+            self._unmap()
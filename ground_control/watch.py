@@ -0,0 +1,273 @@
+"""
+`ag pull --watch`: keeps a pulled session in step with new Cloud Run revisions.
+
+A background thread polls each service with conditional requests (an unchanged service costs
+a bodiless 304 on the API backend). When a service changes, only the difference in its
+`extract_metadata` output is applied:
+
+- env vars are updated in place;
+- secrets are fetched only for references that are new or point at another secret/version;
+- proxies are started for newly referenced Cloud SQL instances and stopped for instances no
+  pulled service uses any more, and DB_HOST / DB_PORT follow the proxy as in `ag pull`.
+
+Each service's environment is kept in an env file (mode 0600) that the shell or the app can
+reload: `source "$AG_ENV_FILE"`. The file holds secret values, so it is only written when the
+runtime directory is memory-backed (XDG_RUNTIME_DIR on tmpfs) unless the caller opts in, and
+files left behind by sessions that were killed are removed when the next watch starts.
+"""
+from typing import Any, Callable, Dict, List, Optional
+import os
+import random
+import shlex
+import tempfile
+import threading
+import time
+
+from .cache import runtime_dir
+from .console import console
+from .ports import _pid_alive
+
+DEFAULT_INTERVAL = 30.0
+MAX_BACKOFF = 300.0
+MEMORY_FILESYSTEMS = {"tmpfs", "ramfs"}
+
+
+def env_dir() -> str:
+    return os.path.join(runtime_dir(), "env")
+
+
+def env_file_path(project_id: str, service: str) -> str:
+    return os.path.join(env_dir(), f"{project_id}.{service}.{os.getpid()}.env")
+
+
+def env_dir_in_memory() -> bool:
+    """True if env files would land on a memory-backed filesystem (read from /proc/mounts; False elsewhere)."""
+    path = os.path.realpath(env_dir())
+    best, fstype = "", None
+    try:
+        with open("/proc/mounts", "r", encoding="utf-8") as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                mount = fields[1].replace("\\040", " ")
+                if (path == mount or path.startswith(mount.rstrip("/") + "/")) and len(mount) > len(best):
+                    best, fstype = mount, fields[2]
+    except OSError:
+        return False
+    return fstype in MEMORY_FILESYSTEMS
+
+
+def clean_stale_env_files() -> List[str]:
+    """Removes env files (and temp files) of sessions whose process is gone. Returns the paths removed."""
+    try:
+        names = os.listdir(env_dir())
+    except OSError:
+        return []
+    removed = []
+    for name in names:
+        path = os.path.join(env_dir(), name)
+        stem, _, suffix = name.rpartition(".")
+        pid = stem.rpartition(".")[2]
+        try:
+            if suffix == "env":
+                stale = pid.isdigit() and not _pid_alive(int(pid))
+            else:
+                # A temp file only outlives a write that was interrupted
+                stale = suffix == "tmp" and time.time() - os.path.getmtime(path) > 60
+            if stale:
+                os.remove(path)
+                removed.append(path)
+        except OSError:
+            continue
+    return removed
+
+
+def write_env_file(path: str, env: Dict[str, str]) -> None:
+    """Atomically writes `export KEY='value'` lines, readable only by the current user."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")  # created 0600
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            for key, value in env.items():
+                f.write(f"export {key}={shlex.quote(str(value))}\n")
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def read_env_file(path: str) -> Dict[str, str]:
+    env = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            parts = shlex.split(line)
+            if parts[:1] == ["export"]:
+                parts = parts[1:]
+            for part in parts:
+                key, sep, value = part.partition("=")
+                if sep:
+                    env[key] = value
+    return env
+
+
+class ContextWatcher:
+    """
+    Polls the pulled services and applies changes to the live session.
+
+    `targets` are the pull's per-service records ({"name", "region", "summary", "metadata", "env"});
+    they are updated in place. `on_update(targets, ports)` is called after every applied change,
+    e.g. to republish the context snapshot.
+    """
+
+    def __init__(
+        self,
+        provider: Any,
+        targets: Dict[str, Dict[str, Any]],
+        proxy_manager: Any,
+        secret_manager: Any,
+        env_files: Dict[str, str],
+        proxies: Dict[str, int],
+        interval: float = DEFAULT_INTERVAL,
+        on_update: Optional[Callable[[Dict[str, Dict[str, Any]], Dict[str, int]], None]] = None,
+    ):
+        from .providers.cached import service_validator
+        self.provider = provider
+        self.targets = targets
+        self.proxy_manager = proxy_manager
+        self.secret_manager = secret_manager
+        self.env_files = env_files
+        self.proxies = dict(proxies)
+        self.interval = interval
+        self.on_update = on_update
+        self.validators = {name: service_validator(t["summary"]) for name, t in targets.items()}
+        self.etags: Dict[str, Optional[str]] = {name: None for name in targets}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def write_env_files(self) -> None:
+        for name, path in self.env_files.items():
+            write_env_file(path, self.targets[name]["env"])
+
+    def start(self) -> None:
+        clean_stale_env_files()
+        self.write_env_files()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5.0)
+        for path in self.env_files.values():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _run(self) -> None:
+        delay = self.interval
+        while not self._stop.wait(delay * random.uniform(0.9, 1.1)):
+            try:
+                self.poll_once()
+                delay = self.interval
+            except Exception as e:
+                # Flaky network: keep the session as it is and back off
+                delay = min(delay * 2, MAX_BACKOFF)
+                console.print(f"[gray]   watch: poll failed ({e}); retrying in {delay:.0f}s[/gray]")
+
+    # --- Polling ---
+
+    def poll_once(self) -> List[str]:
+        """Polls every service once and applies any changes. Returns the names of changed services."""
+        from .providers.cached import service_validator
+        changed = []
+        for name, target in self.targets.items():
+            details, self.etags[name] = self.provider.poll_service(name, target["region"], self.validators[name], self.etags[name])
+            if details is None:
+                continue
+            self.validators[name] = service_validator(details)
+            metadata = self.provider.extract_metadata(details)
+            if not metadata:
+                continue
+            notes = self._apply(target, metadata)
+            target["summary"] = details
+            changed.append(name)
+            revision = metadata.get("revision") or self.validators[name]
+            console.print(f"\n[bold blue]🔄[/bold blue] {name}: new revision [cyan]{revision}[/cyan] ({', '.join(notes) or 'no context changes'}).")
+        if changed:
+            notes = self._sync_proxies()
+            if notes:
+                console.print(f"[bold blue]🔄[/bold blue] Proxies: {', '.join(notes)}.")
+            from .connectivity import proxy_env
+            for name in changed:
+                target = self.targets[name]
+                target["env"].update(proxy_env(target["metadata"].get("cloud_sql_instances", []), self.proxies))
+            self.write_env_files()
+            reload_hint = " ".join(f'"{self.env_files[name]}"' for name in changed if name in self.env_files)
+            if reload_hint:
+                console.print(f"[gray]   Reload with: source {reload_hint}[/gray]")
+            else:
+                console.print("[gray]   Env changes were not written anywhere (no env file); restart the pull to apply them.[/gray]")
+            if self.on_update:
+                self.on_update(self.targets, self.proxies)
+        return changed
+
+    def _apply(self, target: Dict[str, Any], metadata: Dict[str, Any]) -> List[str]:
+        """Applies one service's metadata diff to its environment. Returns short notes."""
+        old = target["metadata"]
+        env = dict(target["env"])
+        notes = []
+
+        old_vars, new_vars = old.get("env_vars", {}), metadata.get("env_vars", {})
+        old_secrets, new_secrets = old.get("secrets", {}), metadata.get("secrets", {})
+        for key in set(old_vars) - set(new_vars) - set(new_secrets):
+            env.pop(key, None)
+        for key in set(old_secrets) - set(new_secrets) - set(new_vars):
+            env.pop(key, None)
+        changed_vars = {k: v for k, v in new_vars.items() if old_vars.get(k) != v}
+        env.update(changed_vars)
+        removed = len(set(old_vars) - set(new_vars)) + len(set(old_secrets) - set(new_secrets))
+        if changed_vars:
+            notes.append(f"{len(changed_vars)} env var(s) updated")
+        if removed:
+            notes.append(f"{removed} variable(s) removed")
+
+        # Only references that are new or point at another secret/version are fetched
+        to_fetch = {k: ref for k, ref in new_secrets.items() if old_secrets.get(k) != ref}
+        if to_fetch:
+            results = self.secret_manager.fetch_many(to_fetch)
+            for key, result in results.items():
+                if result["value"] is not None:
+                    env[key] = result["value"]
+                else:
+                    console.print(f"[red]   x Failed to fetch {target['name']}: {key}[/red]")
+            notes.append(f"{len(to_fetch)} secret(s) fetched")
+
+        if old.get("cloud_sql_instances", []) != metadata.get("cloud_sql_instances", []):
+            notes.append("Cloud SQL instances changed")
+        if old.get("image") != metadata.get("image"):
+            notes.append("new image")
+        target["metadata"] = metadata
+        target["env"] = env
+        return notes
+
+    def _sync_proxies(self) -> List[str]:
+        """Starts proxies for instances that became referenced; stops those nobody references."""
+        wanted = list(dict.fromkeys(i for t in self.targets.values() for i in t["metadata"].get("cloud_sql_instances", [])))
+        added = [i for i in wanted if i not in self.proxies]
+        dropped = [i for i in self.proxies if i not in wanted]
+        notes = []
+        for instance in dropped:
+            self.proxy_manager.stop_instance(instance)
+            self.proxies.pop(instance, None)
+            notes.append(f"stopped {instance}")
+        if added:
+            ports = self.proxy_manager.start_cloud_sql_proxy(added)
+            self.proxies.update(ports)
+            notes += [f"started {instance} -> {port}" for instance, port in ports.items()]
+        return notes
@@ -0,0 +1,49 @@
+"""On-disk cache writes, pruning and the cached provider's exit handling."""
+import os
+
+import pytest
+
+from ground_control.cache import PRUNE_EVERY, DiskCache
+from ground_control.providers import cached
+
+
+def test_round_trip_and_expiry(tmp_path):
+    store = DiskCache("ns", root=str(tmp_path))
+    store.set("a", {"x": 1}, validator="v1")
+    assert store.get("a") == {"x": 1}
+    assert store.get_entry("a")["validator"] == "v1"
+    store.set("b", 1, ttl=-1)
+    assert store.get("b") is None
+
+
+def test_prune_runs_every_n_writes(tmp_path, monkeypatch):
+    store = DiskCache("ns", max_bytes=10 ** 9, root=str(tmp_path))
+    calls = []
+    monkeypatch.setattr(store, "prune", lambda: calls.append(1))
+    for i in range(PRUNE_EVERY * 2 + 1):
+        store.set(f"k{i}", i)
+    assert len(calls) == 3
+
+
+def test_size_budget_evicts_oldest(tmp_path):
+    store = DiskCache("ns", max_bytes=1, root=str(tmp_path))
+    for i in range(PRUNE_EVERY + 1):
+        store.set(f"k{i}", "x" * 100)
+    # The last prune (on write PRUNE_EVERY + 1) leaves nothing over the budget
+    assert len(os.listdir(store.directory)) == 0
+
+
+def test_failed_write_leaves_no_temp_file(tmp_path):
+    store = DiskCache("ns", root=str(tmp_path))
+    with pytest.raises(TypeError):
+        store.set("a", object())
+    assert os.listdir(store.directory) == []
+
+
+def test_providers_share_one_exit_handler(monkeypatch):
+    registered = []
+    monkeypatch.setattr(cached.atexit, "register", registered.append)
+    store = DiskCache("unused", root="/nonexistent")
+    providers = [cached.CachedProvider(object(), cache=store) for _ in range(3)]
+    assert registered == []
+    assert all(p in cached._live_providers for p in providers)
@@ -0,0 +1,41 @@
+"""Writing generated compose files next to the user's own."""
+import os
+
+import pytest
+
+from ground_control.compose import COMPOSE_FILE, DOCKERFILE, ComposeError, render_compose, write_compose
+
+METADATA = {"image": "us-docker.pkg.dev/p/r/app:v1", "env_vars": {}, "secrets": {}, "cloud_sql_instances": []}
+
+
+def test_existing_compose_file_is_left_alone(tmp_path):
+    path = tmp_path / COMPOSE_FILE
+    path.write_text("services:\n  web:\n    image: mine\n")
+    with pytest.raises(ComposeError):
+        write_compose(str(tmp_path), render_compose("app", METADATA), dockerfile="FROM scratch\n")
+    assert path.read_text() == "services:\n  web:\n    image: mine\n"
+    # Nothing is written when any target is refused
+    assert not (tmp_path / DOCKERFILE).exists()
+
+
+def test_generated_compose_file_is_regenerated(tmp_path):
+    write_compose(str(tmp_path), render_compose("app", METADATA))
+    content = render_compose("app", dict(METADATA, image="us-docker.pkg.dev/p/r/app:v2"))
+    assert write_compose(str(tmp_path), content) == [os.path.join(str(tmp_path), COMPOSE_FILE)]
+    assert (tmp_path / COMPOSE_FILE).read_text() == content
+
+
+def test_force_overwrites(tmp_path):
+    (tmp_path / COMPOSE_FILE).write_text("services: {}\n")
+    content = render_compose("app", METADATA)
+    write_compose(str(tmp_path), content, force=True)
+    assert (tmp_path / COMPOSE_FILE).read_text() == content
+
+
+def test_app_starts_after_its_proxy():
+    content = render_compose("app", dict(METADATA, cloud_sql_instances=["p:r:db"]), proxies={"p:r:db": 5433})
+    app, _, sidecar = content.partition("  cloudsql:\n")
+    assert 'network_mode: "service:cloudsql"' in app and "depends_on:\n      - cloudsql" in app
+    assert '"p:r:db?port=5433"' in sidecar and "depends_on" not in sidecar
+    if hasattr(os, "getuid"):
+        assert f'user: "{os.getuid()}:{os.getgid()}"' in sidecar
@@ -0,0 +1,59 @@
+"""The .gitignore matcher used by monorepo runtime detection."""
+import pytest
+
+from ground_control.detector import GitIgnore
+
+
+def rules(text: str, base: str = "") -> GitIgnore:
+    return GitIgnore().extend(base, text)
+
+
+@pytest.mark.parametrize("path, is_dir, expected", [
+    ("build", True, True),
+    ("src/build", True, False),   # anchored to the .gitignore's directory
+    ("build", False, False),      # directory-only
+])
+def test_anchored_dir_only(path, is_dir, expected):
+    assert rules("/build/\n").ignored(path, is_dir) is expected
+
+
+@pytest.mark.parametrize("path, is_dir, expected", [
+    ("build", True, True),
+    ("src/build", True, True),    # unanchored: any depth
+    ("src/build", False, False),  # a file named build is kept
+])
+def test_unanchored_dir_only(path, is_dir, expected):
+    assert rules("build/\n").ignored(path, is_dir) is expected
+
+
+def test_middle_slash_anchors():
+    ignore = rules("docs/build\n")
+    assert ignore.ignored("docs/build", True)
+    assert not ignore.ignored("src/docs/build", True)
+
+
+def test_negation_reincludes():
+    ignore = rules("*.log\n!keep.log\n")
+    assert ignore.ignored("debug.log", False)
+    assert not ignore.ignored("keep.log", False)
+    assert not ignore.ignored("src/keep.log", False)
+
+
+@pytest.mark.parametrize("pattern, path, expected", [
+    ("**/node_modules/", "node_modules", True),
+    ("**/node_modules/", "a/b/node_modules", True),
+    ("vendor/**", "vendor/pkg/x", True),
+    ("vendor/**", "vendor", False),
+    ("a/**/z", "a/z", True),
+    ("a/**/z", "a/b/c/z", True),
+    ("a/**/z", "b/a/z", False),
+])
+def test_double_star(pattern, path, expected):
+    assert rules(pattern + "\n").ignored(path, True) is expected
+
+
+def test_nested_rules_apply_below_their_directory():
+    ignore = rules("/dist/\n", base="services/api")
+    assert ignore.ignored("services/api/dist", True)
+    assert not ignore.ignored("services/api/src/dist", True)
+    assert not ignore.ignored("dist", True)
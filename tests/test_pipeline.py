@@ -0,0 +1,41 @@
+"""Pipeline scheduling: dependencies, failure propagation and concurrency."""
+import threading
+import time
+
+from ground_control.pipeline import DONE, FAILED, SKIPPED, Pipeline
+
+
+def test_dependents_receive_results():
+    pipeline = Pipeline()
+    pipeline.add("a", lambda _: 1)
+    pipeline.add("b", lambda r: r["a"] + 1, deps=["a"])
+    pipeline.add("c", lambda r: r["a"] + r["b"], deps=["a", "b"])
+    tasks = pipeline.run(show_progress=False)
+    assert [tasks[n].result for n in "abc"] == [1, 2, 3]
+
+
+def test_failure_skips_dependents_only():
+    def boom(_):
+        raise RuntimeError("boom")
+
+    pipeline = Pipeline()
+    pipeline.add("bad", boom)
+    pipeline.add("after", lambda _: 1, deps=["bad"])
+    pipeline.add("later", lambda _: 2, deps=["after"])
+    pipeline.add("other", lambda _: 3)
+    tasks = pipeline.run(show_progress=False)
+    assert (tasks["bad"].status, tasks["after"].status, tasks["later"].status) == (FAILED, SKIPPED, SKIPPED)
+    assert tasks["other"].status == DONE and tasks["other"].result == 3
+
+
+def test_every_ready_task_runs_at_once():
+    # One task per pulled service plus the shared phases: none may queue behind the others
+    count = 8
+    barrier = threading.Barrier(count, timeout=5)
+    pipeline = Pipeline()
+    for i in range(count):
+        pipeline.add(f"t{i}", lambda _: barrier.wait())
+    started = time.perf_counter()
+    tasks = pipeline.run(show_progress=False)
+    assert all(t.status == DONE for t in tasks.values())
+    assert time.perf_counter() - started < 5
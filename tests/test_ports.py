@@ -0,0 +1,139 @@
+"""Port reservations, ports.json leases and moving a proxy off a port taken before it binds."""
+import os
+import socket
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from ground_control.connectivity import ProxyManager, proxy_env
+from ground_control.ports import PortAllocator, PortReservation
+
+FAKES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "fakes")
+
+
+def _allocator(tmp_path):
+    return PortAllocator(state_path=str(tmp_path / "ports.json"))
+
+
+def _bindable(port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        sock.bind(("127.0.0.1", port))
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+def _dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_allocate_holds_distinct_ports(tmp_path):
+    reservations = _allocator(tmp_path).allocate(["a", "b", "c"], 20000)
+    ports = [r.port for r in reservations.values()]
+    assert len(set(ports)) == 3
+    assert not any(_bindable(port) for port in ports)
+    for reservation in reservations.values():
+        reservation.release()
+    assert all(_bindable(port) for port in ports)
+
+
+def test_stable_port_is_reused_across_allocators(tmp_path):
+    first = _allocator(tmp_path)
+    reservations = first.allocate(["a", "b"], 20100)
+    port = reservations["b"].port
+    first.release(reservations)
+
+    again = _allocator(tmp_path).allocate(["b"], 20100)
+    assert again["b"].port == port
+    # "a" keeps its remembered port free, so a new instance does not take it
+    assert _allocator(tmp_path).allocate(["c"], 20100)["c"].port not in (port, reservations["a"].port)
+
+
+def test_release_drops_lease_and_keeps_stable_port(tmp_path):
+    allocator = _allocator(tmp_path)
+    reservations = allocator.allocate(["a"], 20200)
+    port = reservations["a"].port
+    assert allocator.live_ports() == {"a": port}
+
+    allocator.release(reservations)
+    assert allocator.live_ports() == {}
+    assert _allocator(tmp_path).allocate(["a"], 20300)["a"].port == port
+
+
+def test_live_leases_are_skipped_and_dead_ones_reclaimed(tmp_path):
+    allocator = _allocator(tmp_path)
+    with allocator._locked_state() as state:
+        state["leases"] = {"20400": os.getppid(), "20401": _dead_pid()}
+
+    reservations = allocator.allocate(["a", "b"], 20400)
+    assert sorted(r.port for r in reservations.values()) == [20401, 20402]
+    with allocator._locked_state() as state:
+        assert state["leases"] == {"20400": os.getppid(), "20401": os.getpid(), "20402": os.getpid()}
+
+
+def test_concurrent_allocators_never_share_a_port(tmp_path):
+    results = []
+
+    def allocate(i):
+        reservations = _allocator(tmp_path).allocate([f"inst-{i}"], 20500)
+        # Drop the socket but keep the lease, so only ports.json keeps the others off it
+        for reservation in reservations.values():
+            reservation.release()
+        results.append(reservations[f"inst-{i}"].port)
+
+    threads = [threading.Thread(target=allocate, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(results)) == 8
+
+
+def test_proxy_env_points_a_single_instance_service_at_its_proxy():
+    ports = {"p:r:a": 5433, "p:r:b": 5434}
+    assert proxy_env(["p:r:a"], ports) == {"DB_HOST": "127.0.0.1", "DB_PORT": "5433"}
+    assert proxy_env(["p:r:a", "p:r:a"], ports) == {"DB_HOST": "127.0.0.1", "DB_PORT": "5433"}
+    assert proxy_env(["p:r:a", "p:r:b"], ports) == {}
+    assert proxy_env(["p:r:c"], ports) == {}
+    assert proxy_env([], ports) == {}
+
+
+def test_proxy_moves_to_new_port_when_its_port_is_taken(tmp_path, monkeypatch):
+    if not os.path.exists(os.path.join(FAKES, "cloud-sql-proxy")):
+        pytest.skip("fake cloud-sql-proxy not available")
+    monkeypatch.setenv("PATH", FAKES + os.pathsep + os.environ["PATH"])
+    monkeypatch.setenv("FAKE_PROXY_LATENCY", "0")
+    monkeypatch.setenv("FAKE_PROXY_FAILURE_RATE", "0")
+
+    blockers = []
+    release = PortReservation.release
+
+    def release_then_steal(self):
+        port, held = self.port, self.held
+        release(self)
+        if held and not blockers:
+            # Another program grabs the port between the release and the proxy's bind
+            blocker = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            blocker.bind(("127.0.0.1", port))
+            blocker.listen()
+            blockers.append(blocker)
+
+    monkeypatch.setattr(PortReservation, "release", release_then_steal)
+    manager = ProxyManager(allocator=_allocator(tmp_path), ready_timeout=10)
+    try:
+        ports = manager.start_cloud_sql_proxy(["p:r:db"], 20600)
+        taken = blockers[0].getsockname()[1]
+        assert ports["p:r:db"] != taken
+        assert manager.proxies["p:r:db"].alive()
+        assert manager.allocator.stable_ports()["p:r:db"] == ports["p:r:db"]
+    finally:
+        manager.stop()
+        for blocker in blockers:
+            blocker.close()
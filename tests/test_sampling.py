@@ -0,0 +1,49 @@
+"""Sample queries are built from catalog names, never from re-parsed strings."""
+import types
+from contextlib import contextmanager
+
+from ground_control.sampling import TableSampler, quote_table
+from ground_control.schema import SchemaIntrospector
+
+
+class ScriptedPool:
+    """Answers each query with the next scripted result set."""
+
+    def __init__(self, results):
+        self.results = list(results)
+
+    @contextmanager
+    def connection(self):
+        pool = self
+
+        class Cursor:
+            def execute(self, sql, params):
+                pass
+
+            def fetchall(self):
+                return pool.results.pop(0)
+
+            def close(self):
+                pass
+
+        yield types.SimpleNamespace(cursor=Cursor)
+
+
+def test_quote_table_keeps_dotted_schema_whole():
+    assert quote_table("a.b", "t") == '"a.b"."t"'
+    assert quote_table("s", 'we"ird.t') == '"s"."we""ird.t"'
+
+
+def test_sample_query_for_a_schema_with_a_dot():
+    pool = ScriptedPool([
+        [(42, "a.b", "t")],                 # _resolve
+        [("1", "1:1", None, None)],         # _fingerprint
+        [("id", "integer", False, None)],   # columns
+        [],                                 # indexes
+        [],                                 # foreign keys
+    ])
+    table = SchemaIntrospector(pool).table_schema("a.b.t")
+    assert (table["name"], table["schema"], table["table"]) == ("a.b.t", "a.b", "t")
+    sql, params = TableSampler(SchemaIntrospector(pool))._build_query(table, ["id"], {}, 5, 100)
+    assert 'FROM "a.b"."t"' in sql
+    assert params == [6]
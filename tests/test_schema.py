@@ -0,0 +1,68 @@
+"""Schema introspection against a stand-in driver (no database needed)."""
+import sys
+import types
+from contextlib import contextmanager
+
+import pytest
+
+from ground_control import schema
+from ground_control.schema import SchemaError, SchemaIntrospector, decode_page_token, encode_page_token
+
+
+class FakeDriverError(Exception):
+    pass
+
+
+@pytest.fixture(autouse=True)
+def fake_driver(monkeypatch):
+    monkeypatch.setitem(sys.modules, "psycopg", types.SimpleNamespace(Error=FakeDriverError))
+
+
+class FakePool:
+    def __init__(self, rows=None, error=None):
+        self.rows, self.error, self.queries = rows or [], error, []
+
+    @contextmanager
+    def connection(self):
+        pool = self
+
+        class Cursor:
+            def execute(self, sql, params):
+                pool.queries.append(params)
+                if pool.error:
+                    raise pool.error
+
+            def fetchall(self):
+                return pool.rows
+
+            def close(self):
+                pass
+
+        yield types.SimpleNamespace(cursor=Cursor)
+
+
+def test_page_token_round_trips_dotted_names():
+    assert decode_page_token(encode_page_token("a.b", "t.1")) == ("a.b", "t.1")
+    with pytest.raises(SchemaError):
+        decode_page_token("a.b.t")
+
+
+def test_list_tables_pages_by_schema_and_table():
+    pool = FakePool(rows=[("a.b", "t1"), ("a.b", "t2"), ("c", "t")])
+    page = SchemaIntrospector(pool).list_tables(page_size=2)
+    assert page["tables"] == ["a.b.t1", "a.b.t2"]
+    SchemaIntrospector(pool).list_tables(page_token=page["next_page_token"], page_size=2)
+    assert pool.queries[-1][-3:-1] == ("a.b", "t2")
+
+
+def test_driver_errors_become_schema_errors():
+    pool = FakePool(error=FakeDriverError("relation \"t\" does not exist\n"))
+    with pytest.raises(SchemaError, match="Query failed: relation"):
+        SchemaIntrospector(pool).table_schema("public.t")
+
+
+def test_published_env_fills_in_missing_credentials(monkeypatch):
+    monkeypatch.setattr(schema, "published_env", lambda instance=None: {"DB_USER": "app", "DB_NAME": "orders"})
+    monkeypatch.setattr(schema.os, "environ", {"AG_DB_PORT": "6543", "DB_NAME": "override"})
+    params = schema.connection_params()
+    assert (params["user"], params["dbname"], params["port"]) == ("app", "override", 6543)
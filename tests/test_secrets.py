@@ -0,0 +1,66 @@
+"""Concurrent Secret Manager fetches: one request per distinct secret, errors kept per variable."""
+import threading
+from types import SimpleNamespace
+
+from ground_control.connectivity import SecretManager
+
+
+class FakeClient:
+    def __init__(self, values):
+        self.values = values
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def access_secret_version(self, request):
+        with self._lock:
+            self.requests.append(request["name"])
+        value = self.values[request["name"]]
+        if isinstance(value, Exception):
+            raise value
+        return SimpleNamespace(payload=SimpleNamespace(data=value.encode("utf-8")))
+
+
+def _manager(client):
+    manager = SecretManager("proj")
+    manager._client = client
+    return manager
+
+
+def test_fetch_many_dedups_and_keeps_order():
+    client = FakeClient({
+        "projects/proj/secrets/db/versions/latest": "pw",
+        "projects/proj/secrets/db/versions/3": "old",
+        "projects/proj/secrets/key/versions/latest": "k",
+    })
+    results = _manager(client).fetch_many({
+        "DB_PASSWORD": {"secret": "db", "version": "latest"},
+        "API_KEY": {"secret": "key"},
+        "DB_PASSWORD_COPY": {"secret": "db", "version": None},
+        "DB_PASSWORD_OLD": {"secret": "db", "version": "3"},
+    })
+    assert list(results) == ["DB_PASSWORD", "API_KEY", "DB_PASSWORD_COPY", "DB_PASSWORD_OLD"]
+    assert [r["value"] for r in results.values()] == ["pw", "k", "pw", "old"]
+    assert sorted(client.requests) == sorted(set(client.requests))
+    assert len(client.requests) == 3
+
+
+def test_fetch_many_reports_errors_per_secret():
+    client = FakeClient({
+        "projects/proj/secrets/ok/versions/latest": "v",
+        "projects/proj/secrets/denied/versions/latest": PermissionError("403 denied"),
+    })
+    results = _manager(client).fetch_many({"OK": {"secret": "ok"}, "DENIED": {"secret": "denied"}})
+    assert results["OK"] == {"value": "v", "error": None}
+    assert results["DENIED"] == {"value": None, "error": "403 denied"}
+
+
+def test_fetch_many_degrades_when_the_client_cannot_be_built(monkeypatch):
+    manager = SecretManager("proj")
+
+    def no_credentials():
+        raise RuntimeError("no credentials")
+
+    monkeypatch.setattr(manager, "_get_client", no_credentials)
+    results = manager.fetch_many({"A": {"secret": "a"}, "B": {"secret": "b"}})
+    assert results == {"A": {"value": None, "error": "no credentials"}, "B": {"value": None, "error": "no credentials"}}
+    assert manager.fetch_many({}) == {}
@@ -0,0 +1,101 @@
+"""Context snapshot round trips, per-project paths and the seqlock against torn reads."""
+import os
+import struct
+import threading
+
+import pytest
+
+from ground_control import snapshot as snapshot_module
+from ground_control.snapshot import (
+    GENERATION_OFFSET, SnapshotError, SnapshotReader, SnapshotWriter, default_snapshot_path,
+)
+
+
+def test_round_trip_and_partial_update(tmp_path):
+    path = str(tmp_path / "context.snap")
+    writer, reader = SnapshotWriter(path), SnapshotReader(path)
+    writer.publish({"service": {"name": "api"}, "proxies": {"ports": {"p:r:db": 5432}}})
+    assert reader.sections() == {"service": {"name": "api"}, "proxies": {"ports": {"p:r:db": 5432}}}
+
+    generation = writer.publish({"proxies": {"ports": {}}})
+    assert reader.section("proxies") == {"ports": {}}
+    assert reader.section("service") == {"name": "api"}
+    assert reader.generation == generation
+    assert not reader.refresh()
+
+
+def test_secrets_are_never_published(tmp_path):
+    with pytest.raises(SnapshotError):
+        SnapshotWriter(str(tmp_path / "context.snap")).publish({"secrets": {"DB_PASSWORD": "x"}})
+
+
+def test_compaction_swaps_the_file_under_a_reader(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot_module, "COMPACT_MIN_BYTES", 0)
+    path = str(tmp_path / "context.snap")
+    writer, reader = SnapshotWriter(path), SnapshotReader(path)
+    writer.publish({"schema": {"tables": []}})
+    assert reader.section("schema") == {"tables": []}
+    writer.publish({"schema": {"tables": ["t"] * 5000}})
+    assert reader.section("schema") == {"tables": ["t"] * 5000}
+
+
+def test_path_is_keyed_by_project_directory(tmp_path, monkeypatch):
+    monkeypatch.delenv("AG_SNAPSHOT_PATH", raising=False)
+    monkeypatch.delenv("AG_PROJECT_DIR", raising=False)
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path / "run"))
+    one, two = tmp_path / "one", tmp_path / "two"
+    one.mkdir()
+    two.mkdir()
+    assert default_snapshot_path(str(one)) != default_snapshot_path(str(two))
+    assert default_snapshot_path(str(one)) == default_snapshot_path(os.path.join(str(one), "."))
+
+    monkeypatch.chdir(two)
+    assert default_snapshot_path() == default_snapshot_path(str(two))
+    monkeypatch.setenv("AG_PROJECT_DIR", str(one))
+    assert default_snapshot_path() == default_snapshot_path(str(one))
+
+    SnapshotWriter(default_snapshot_path(str(one))).publish({"service": {"name": "one"}})
+    SnapshotWriter(default_snapshot_path(str(two))).publish({"service": {"name": "two"}})
+    assert SnapshotReader(default_snapshot_path(str(one))).section("service") == {"name": "one"}
+    assert SnapshotReader(default_snapshot_path(str(two))).section("service") == {"name": "two"}
+
+
+def test_reader_skips_a_write_in_progress(tmp_path):
+    path = str(tmp_path / "context.snap")
+    writer = SnapshotWriter(path)
+    generation = writer.publish({"service": {"name": "api"}})
+    reader = SnapshotReader(path, retries=3)
+    assert reader.section("service") == {"name": "api"}
+
+    # A writer that died mid-update leaves an odd generation and half-written data behind
+    writer.publish({"service": {"name": "new"}})
+    with open(path, "r+b") as f:
+        f.seek(GENERATION_OFFSET)
+        f.write(struct.pack("<Q", generation + 1))
+    assert not reader.refresh()
+    assert reader.section("service") == {"name": "api"}
+
+
+def test_concurrent_reads_are_never_torn(tmp_path):
+    path = str(tmp_path / "context.snap")
+    writer = SnapshotWriter(path)
+    writer.publish({"service": {"n": 0}, "proxies": {"n": 0}})
+    done = threading.Event()
+
+    def write():
+        for n in range(1, 300):
+            # Payload sizes change so slots are both reused and appended
+            writer.publish({"service": {"n": n, "pad": "x" * (n * 7 % 900)}, "proxies": {"n": n}})
+        done.set()
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    reader = SnapshotReader(path)
+    seen = set()
+    while not done.is_set():
+        sections = reader.sections(["service", "proxies"])
+        assert sections["service"]["n"] == sections["proxies"]["n"]
+        seen.add(sections["proxies"]["n"])
+    thread.join()
+    assert reader.section("proxies") == {"n": 299}
+    assert len(seen) > 1
@@ -0,0 +1,33 @@
+"""
+CLI startup-time budget (see benchmarks/startup.py).
+
+The import check is deterministic and always runs. The wall-clock budgets depend on the machine's
+load, so they are marked `slow` and only run when asked for: pytest -m slow.
+"""
+import sys
+
+import pytest
+
+from benchmarks.startup import IMPORT_BUDGET, VERSION_BUDGET, loaded_heavy_modules, timed
+
+REPEAT = 5
+
+
+def _bare() -> float:
+    return timed([sys.executable, "-c", "pass"], REPEAT)
+
+
+@pytest.mark.slow
+def test_version_within_budget():
+    elapsed = timed([sys.executable, "-m", "ground_control", "--version"], REPEAT) - _bare()
+    assert elapsed <= VERSION_BUDGET, f"`ag --version` took +{elapsed * 1000:.1f}ms (budget {VERSION_BUDGET * 1000:.0f}ms)"
+
+
+@pytest.mark.slow
+def test_cli_import_within_budget():
+    elapsed = timed([sys.executable, "-c", "import ground_control.cli"], REPEAT) - _bare()
+    assert elapsed <= IMPORT_BUDGET, f"`import ground_control.cli` took +{elapsed * 1000:.1f}ms (budget {IMPORT_BUDGET * 1000:.0f}ms)"
+
+
+def test_cli_import_skips_heavy_modules():
+    assert loaded_heavy_modules() == []